@@ -1,5 +1,5 @@
 import cv2
-import numpy as np
+from detection import PERSON_CLASS_ID, postprocess_detections
 
 # Load class names
 class_names = []
@@ -17,7 +17,7 @@ net.setPreferableBackend(cv2.dnn.DNN_BACKEND_DEFAULT)
 net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
 
 # Specify the target class index for 'person' in the model
-person_class_id = 15  # For MobileNet SSD, 'person' class ID is 15
+person_class_id = PERSON_CLASS_ID
 
 cv2.namedWindow("preview")
 vc = cv2.VideoCapture(0)
@@ -36,43 +36,31 @@ while rval:
 
     h, w = frame.shape[:2]
 
-    # Loop over the detections
-    for i in range(detections.shape[2]):
-        confidence = detections[0, 0, i, 2]
-        if confidence > 0.75:
-            class_id = int(detections[0, 0, i, 1])
-            if class_id == person_class_id:
-                # Compute bounding box coordinates
-                box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                (startX, startY, endX, endY) = box.astype("int")
+    targets = postprocess_detections(
+        detections, w, h, class_ids=(person_class_id,), confidence_threshold=0.75
+    )
 
-                # Ensure coordinates are within the frame dimensions
-                startX = max(0, min(startX, w - 1))
-                startY = max(0, min(startY, h - 1))
-                endX = max(0, min(endX, w - 1))
-                endY = max(0, min(endY, h - 1))
+    # Draw every target
+    for (startX, startY, endX, endY), (centerX, centerY), confidence, class_id in targets:
+        centerX, centerY = int(centerX), int(centerY)
 
-                # Calculate the center x-coordinate
-                centerX = int((startX + endX) / 2)
-                centerY = int((startY + endY) / 2)
+        # Draw the bounding box and center point
+        label = f"{class_names[class_id]}: {confidence:.2f}"
+        cv2.rectangle(frame, (startX, startY), (endX, endY), (0, 255, 0), 2)
+        cv2.circle(frame, (centerX, centerY), 5, (255, 0, 0), -1)
+        cv2.putText(
+            frame,
+            label,
+            (startX, startY - 10),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            (0, 255, 0),
+            2,
+        )
 
-                # Draw the bounding box and center point
-                label = f"{class_names[class_id]}: {confidence:.2f}"
-                cv2.rectangle(frame, (startX, startY), (endX, endY), (0, 255, 0), 2)
-                cv2.circle(frame, (centerX, centerY), 5, (255, 0, 0), -1)
-                cv2.putText(
-                    frame,
-                    label,
-                    (startX, startY - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    (0, 255, 0),
-                    2,
-                )
-
-                # Print the center x-coordinate
-                print(f"Center mass: X{centerX} Y{centerY}")
-                print(label)
+        # Print the center x-coordinate
+        print(f"Center mass: X{centerX} Y{centerY}")
+        print(label)
 
     cv2.imshow("preview", frame)
     rval, frame = vc.read()
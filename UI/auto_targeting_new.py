@@ -1,9 +1,15 @@
 import json
-import socket
 
 import cv2
-import numpy as np
 import targeting
+from detection import (
+    PERSON_CLASS_ID,
+    normalized_center,
+    postprocess_detections,
+    select_target,
+)
+from frame_grabber import FrameGrabber
+from turret_broker import connect_controller
 
 # Load class names for PASCAL VOC
 class_names = []
@@ -21,7 +27,7 @@ net.setPreferableBackend(cv2.dnn.DNN_BACKEND_DEFAULT)
 net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
 
 # Specify the target class index for 'person' in the model
-person_class_id = 15  # For MobileNet SSD, 'person' class ID is 15
+person_class_id = PERSON_CLASS_ID
 
 # Global calibration mesh
 calibration_mesh = {}
@@ -64,37 +70,28 @@ def map_to_servo_center(center_x, center_y):
 arduino_ip = "192.168.50.30"  # Replace with your Arduino's IP address
 arduino_port = 80  # Replace with your Arduino's port if different
 
-# Create a socket object
-client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-# Connect to the Arduino
-try:
-    client_socket.connect((arduino_ip, arduino_port))
-    print(f"Connected to Arduino at {arduino_ip}:{arduino_port}")
-except Exception as e:
-    print(f"Error connecting to Arduino: {e}")
-    client_socket.close()
+# Connect through the turret broker so other tools can share the connection. The
+# controller also reads the turret's replies and tracks round-trip times.
+controller = connect_controller(arduino_ip, arduino_port, verbose=False)
+if not controller.connected:
     exit(1)
+print(f"Connected to Arduino at {arduino_ip}:{arduino_port}")
 
 
 # Function to send commands to Arduino
 def send_command(command):
-    try:
-        # Add newline character as Arduino expects
-        client_socket.sendall((command + "\n").encode("utf-8"))
-    except Exception as e:
-        print(f"Error sending command: {e}")
+    controller.send_command(command)
 
 
 cv2.namedWindow("preview")
-vc = cv2.VideoCapture(0)
+grabber = FrameGrabber(0).start()
 
-if vc.isOpened():  # Try to get the first frame
-    rval, frame = vc.read()
-else:
-    rval = False
+# Always work on the newest frame, skipping any that arrived while processing
+frame_seq, _, frame = grabber.read()
 
-while rval:
+while frame is not None:
+    # The grabber shares its frame buffer, draw on a private copy
+    frame = frame.copy()
     frame_resized = cv2.resize(frame, (300, 300))
     blob = cv2.dnn.blobFromImage(frame_resized, 0.007843, (300, 300), 127.5)
     net.setInput(blob)
@@ -102,63 +99,47 @@ while rval:
 
     h, w = frame.shape[:2]
 
-    # Variables to store servo positions
-    servo_x, servo_y = None, None
-
-    for i in range(detections.shape[2]):
-        confidence = detections[0, 0, i, 2]
-        if confidence > 0.65:
-            class_id = int(detections[0, 0, i, 1])
-            if class_id == person_class_id:
-                box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                (startX, startY, endX, endY) = box.astype("int")
-
-                startX = max(0, min(startX, w - 1))
-                startY = max(0, min(startY, h - 1))
-                endX = max(0, min(endX, w - 1))
-                endY = max(0, min(endY, h - 1))
-
-                centerX = int((startX + endX) / 2)
-                centerY = int((startY + endY) / 2)
-
-                # Scale coordinates to 0-100
-                scaled_centerX = (centerX / w) * 100
-                scaled_centerY = (centerY / h) * 100
-
-                # Ensure coordinates are within 0-100
-                scaled_centerX = max(0, min(scaled_centerX, 100))
-                scaled_centerY = max(0, min(scaled_centerY, 100))
-
-                servo_x = targeting.map_video_x_to_servo(scaled_centerX)
-
-                if servo_x is not None:
-                    # Send servo positions to Arduino
-                    command = f"x={servo_x}&y=30"
-                    send_command(command)
-                    print(f"Sent command to Arduino: {command}")
-
-                label = f"{class_names[class_id]}: {confidence:.2f}"
-                cv2.rectangle(frame, (startX, startY), (endX, endY), (0, 255, 0), 2)
-                cv2.circle(frame, (centerX, centerY), 5, (255, 0, 0), -1)
-                cv2.putText(
-                    frame,
-                    label,
-                    (startX, startY - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    (0, 255, 0),
-                    2,
-                )
-                # Break after processing one person (optional)
-                # break
+    targets = postprocess_detections(detections, w, h, class_ids=(person_class_id,))
+
+    # Aim at one deliberately chosen target instead of whichever the SSD listed first
+    target = select_target(targets, "confidence")
+    if target is not None:
+        # Scale coordinates to 0-100
+        scaled_centerX, scaled_centerY = normalized_center(target, w, h)
+
+        servo_x, servo_y = targeting.map_video_to_servo(scaled_centerX, scaled_centerY)
+        if not targeting.calibration_model.is_2d:
+            servo_y = 30
+
+        if servo_x is not None:
+            # Send servo positions to Arduino
+            command = f"x={servo_x}&y={servo_y}"
+            send_command(command)
+            print(f"Sent command to Arduino: {command}")
+
+    # Draw every target
+    for (startX, startY, endX, endY), (centerX, centerY), confidence, class_id in targets:
+        label = f"{class_names[class_id]}: {confidence:.2f}"
+        cv2.rectangle(frame, (startX, startY), (endX, endY), (0, 255, 0), 2)
+        cv2.circle(frame, (int(centerX), int(centerY)), 5, (255, 0, 0), -1)
+        cv2.putText(
+            frame,
+            label,
+            (startX, startY - 10),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            (0, 255, 0),
+            2,
+        )
 
     cv2.imshow("preview", frame)
-    rval, frame = vc.read()
+    frame_seq, _, frame = grabber.read(frame_seq)
     key = cv2.waitKey(1)
     if key == 27:  # Exit on ESC
         break
 
 # Clean up
 cv2.destroyAllWindows()
-vc.release()
-client_socket.close()
+grabber.stop()
+print(controller.format_reply_stats())
+controller.close()
@@ -1,110 +1,264 @@
 import json
-import socket
+import time
 
 import cv2
+import detection
+import model_registry
 import numpy as np
+import prediction
 import targeting
+import tracking
+from frame_grabber import FrameGrabber
+from metrics import metrics
 
 
 class AutoTargeter:
-    def __init__(self):
-        # Load class names for PASCAL VOC
-        self.class_names = []
-        with open("UI/model_data/coco.names", "r") as f:
-            self.class_names = [line.strip() for line in f.readlines()]
-
-        # Load the DNN model
-        self.net = cv2.dnn.readNetFromCaffe(
-            "UI/model_data/MobileNetSSD_deploy.prototxt",
-            "UI/model_data/MobileNetSSD_deploy.caffemodel",
+    def __init__(
+        self,
+        model_name="mobilenet_ssd",
+        command_latency=0.02,
+        max_velocity=(300.0, 200.0),
+        max_acceleration=(1500.0, 1000.0),
+        servo_position=None,
+        shared_model=True,
+    ):
+        # The network is loaded once per process and shared through the registry.
+        # Shared instances run one forward pass at a time, so targeters that must
+        # run in parallel threads load their own with shared_model=False
+        self.model = model_registry.registry.get(model_name, shared=shared_model)
+        self.class_names = self.model.class_names
+
+        # Specify the target class index for 'person' in the model
+        self.person_class_id = detection.PERSON_CLASS_ID
+        self.confidence_threshold = 0.65
+        # How to choose between several people, see detection.select_target
+        self.target_policy = "confidence"
+        # Every tracked target in the last processed frame
+        self.last_targets = np.empty(0, dtype=tracking.TRACK_DTYPE)
+
+        # Run the network every `detect_every` frames, or sooner when the locked
+        # target's confidence decays below `confidence_threshold`
+        self.tracker = tracking.MultiObjectTracker()
+        self.detect_every = 5
+        self.frame_count = 0
+        self.locked_track_id = None
+
+        # Region-of-interest mode: while a target is locked, run the network on a
+        # padded native-resolution crop around it instead of the whole frame. A full
+        # frame pass still runs every `full_frame_interval` frames, and whenever the
+        # crop loses the target, so other people keep being tracked.
+        self.roi_mode = False
+        self.roi_padding = 1.0  # Box widths/heights added on every side
+        self.roi_min_size = 300  # Smallest crop side, the network input size
+        self.full_frame_interval = self.tracker.max_age
+        self.last_full_frame = 0
+
+        # Lead moving targets by the measured capture-to-actuation latency plus the
+        # servo travel time, see prediction.LeadPredictor. The travel is measured
+        # from `servo_position()`, e.g. ServoControlLoop.current_position, or from
+        # the last aim point if it is None
+        self.lead_targeting = True
+        self.lead_predictor = prediction.LeadPredictor(
+            command_latency=command_latency,
+            max_velocity=max_velocity,
+            max_acceleration=max_acceleration,
         )
+        self.servo_position = servo_position
+        self.last_servo = None
+        self.last_lead = 0.0
+        # (decision time, servo position the lead was measured from) of the last
+        # lead prediction, recorded so a replay can feed the same inputs back
+        self.last_lead_inputs = None
 
-        # Set preferable backend and target
-        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_DEFAULT)
-        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    def detect(self, frame, roi=None):
+        """
+        Runs the network on a frame, or on a region of it.
 
-        # Specify the target class index for 'person' in the model
-        self.person_class_id = 15  # For MobileNet SSD, 'person' class ID is 15
-
-        # Arduino connection parameters
-        self.arduino_ip = "192.168.50.30"  # Replace with your Arduino's IP address
-        self.arduino_port = 80  # Replace with your Arduino's port if different
-
-        # Create a socket object
-        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-        # Connect to the Arduino
-        try:
-            self.client_socket.connect((self.arduino_ip, self.arduino_port))
-            print(f"Connected to Arduino at {self.arduino_ip}:{self.arduino_port}")
-        except Exception as e:
-            print(f"Error connecting to Arduino: {e}")
-            self.client_socket.close()
-            exit(1)
-
-    def process_image(self, frame):
-        # frame_resized = cv2.resize(frame, (300, 300))
-        frame_resized = frame
-        blob = cv2.dnn.blobFromImage(frame_resized, 0.007843, (300, 300), 127.5)
-        self.net.setInput(blob)
-        detections = self.net.forward()
+        Args:
+            frame (np.ndarray): The full frame.
+            roi (tuple): Optional (startX, startY, endX, endY) crop to run on.
+
+        Returns:
+            np.ndarray: detection.TARGET_DTYPE array of every person found, in
+                full-frame coordinates.
+        """
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = roi if roi is not None else (0, 0, w, h)
+        frame_resized = frame[y1:y2, x1:x2]
+        with metrics.timer("preprocess"):
+            blob = cv2.dnn.blobFromImage(frame_resized, 0.007843, (300, 300), 127.5)
+        with metrics.timer("forward"):
+            detections = self.model.forward(blob)
 
+        with metrics.timer("postprocess"):
+            return detection.postprocess_detections(
+                detections,
+                x2 - x1,
+                y2 - y1,
+                class_ids=(self.person_class_id,),
+                confidence_threshold=self.confidence_threshold,
+                offset=(x1, y1),
+                frame_size=(w, h),
+            )
+
+    def roi_for(self, track, w, h):
+        """
+        Computes the padded crop around a track's box.
+
+        Returns:
+            tuple: (startX, startY, endX, endY) clamped to the frame.
+        """
+        x1, y1, x2, y2 = track.box
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        half_w = max((x2 - x1) * (0.5 + self.roi_padding), self.roi_min_size / 2)
+        half_h = max((y2 - y1) * (0.5 + self.roi_padding), self.roi_min_size / 2)
+        x1 = int(max(0, min(cx - half_w, w - 2 * half_w)))
+        y1 = int(max(0, min(cy - half_h, h - 2 * half_h)))
+        x2 = int(min(w, x1 + 2 * half_w))
+        y2 = int(min(h, y1 + 2 * half_h))
+        return x1, y1, x2, y2
+
+    def run_detection(self, frame):
+        """
+        Detects people, on the locked target's region when ROI mode allows it.
+
+        Returns:
+            np.ndarray: detection.TARGET_DTYPE array in full-frame coordinates.
+        """
         h, w = frame.shape[:2]
+        locked = self.tracker.get(self.locked_track_id)
+        if (
+            self.roi_mode
+            and locked is not None
+            and self.frame_count - self.last_full_frame < self.full_frame_interval
+        ):
+            targets = self.detect(frame, self.roi_for(locked, w, h))
+            if len(targets):
+                return targets
+        # Full frame pass, periodic or because the crop lost the target
+        self.last_full_frame = self.frame_count
+        return self.detect(frame)
 
-        for i in range(detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
-            if confidence > 0.65:
-                class_id = int(detections[0, 0, i, 1])
-                if class_id == self.person_class_id:
-                    box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                    (startX, startY, endX, endY) = box.astype("int")
+    def needs_detection(self):
+        """True if the tracker cannot carry the locked target through this frame."""
+        if self.frame_count % self.detect_every == 0:
+            return True
+        locked = self.tracker.get(self.locked_track_id)
+        return locked is None or locked.confidence < self.confidence_threshold
+
+    def process_image(self, frame, timestamp=None, now=None):
+        """
+        Finds the target in a frame and maps it to a servo position.
+
+        Args:
+            frame (np.ndarray): RGB frame.
+            timestamp (float): Capture time (time.monotonic), defaults to now.
+            now (float): Time the aim point is decided (time.monotonic), defaults to
+                the current time. Replays pass the recorded one.
+
+        Returns:
+            tuple: (servo_x, servo_y, video_x, video_y) of the aim point, Nones if
+                there is no target. servo_y is None without a 2D calibration.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        h, w = frame.shape[:2]
+        self.last_lead_inputs = None
 
-                    startX = max(0, min(startX, w - 1))
-                    startY = max(0, min(startY, h - 1))
-                    endX = max(0, min(endX, w - 1))
-                    endY = max(0, min(endY, h - 1))
+        self.frame_count += 1
+        self.tracker.predict()
+        if self.needs_detection():
+            targets = self.run_detection(frame)
+            with metrics.timer("tracking"):
+                self.tracker.update(targets)
+        self.last_targets = self.tracker.targets((w, h))
 
-                    centerX = int((startX + endX) / 2)
-                    centerY = int((startY + endY) / 2)
+        # Stay on the locked person while they are tracked, otherwise pick a new one
+        locked = self.last_targets[self.last_targets["track_id"] == self.locked_track_id]
+        if len(locked):
+            target = locked[0]
+        else:
+            target = detection.select_target(
+                self.last_targets, self.target_policy, frame_size=(w, h)
+            )
+        if target is None:
+            self.locked_track_id = None
+            return None, None, None, None
+        self.locked_track_id = int(target["track_id"])
 
-                    # Scale coordinates to 0-100
-                    scaled_centerX = (centerX / w) * 100
-                    scaled_centerY = (centerY / h) * 100
+        # Scale coordinates to 0-100
+        scaled_centerX, scaled_centerY = detection.normalized_center(target, w, h)
 
-                    # Ensure coordinates are within 0-100
-                    scaled_centerX = max(0, min(scaled_centerX, 100))
-                    scaled_centerY = max(0, min(scaled_centerY, 100))
+        with metrics.timer("mapping"):
+            if self.lead_targeting:
+                if now is None:
+                    now = time.monotonic()
+                self.lead_predictor.observe_frame(timestamp, now)
+                if self.servo_position is not None:
+                    servo_from = self.servo_position()
+                else:
+                    servo_from = self.last_servo
+                if servo_from is not None and not targeting.calibration_model.is_2d:
+                    # servo_y is not calibrated, only the x travel counts
+                    servo_from = (servo_from[0], None)
+                self.last_lead_inputs = (now, servo_from)
+                (
+                    scaled_centerX,
+                    scaled_centerY,
+                    servo_x,
+                    servo_y,
+                    self.last_lead,
+                ) = self.lead_predictor.predict(
+                    (scaled_centerX, scaled_centerY),
+                    self.tracker.get(self.locked_track_id),
+                    (w, h),
+                    targeting.lookup_video_to_servo,
+                    servo_from,
+                )
+            else:
+                servo_x, servo_y = targeting.lookup_video_to_servo(
+                    scaled_centerX, scaled_centerY
+                )
+        if not targeting.calibration_model.is_2d:
+            servo_y = None
+        self.last_servo = (servo_x, servo_y) if servo_x is not None else None
 
-                    servo_x = targeting.map_video_x_to_servo(scaled_centerX)
+        return servo_x, servo_y, scaled_centerX, scaled_centerY
 
-                    return servo_x, scaled_centerX, scaled_centerY
+    def process_image_with_targets(self, frame, timestamp=None):
+        """
+        Same as process_image, but also returns every tracked target in the frame
+        and the lead prediction inputs, e.g. for a DetectionWorker whose results are
+        recorded.
 
-        return None, None, None
+        Returns:
+            tuple: (process_image result, tracking.TRACK_DTYPE array,
+                last_lead_inputs).
+        """
+        result = self.process_image(frame, timestamp)
+        return result, self.last_targets, self.last_lead_inputs
 
 
 # Example usage
 if __name__ == "__main__":
     auto_targeter = AutoTargeter()
     cv2.namedWindow("preview")
-    vc = cv2.VideoCapture(0)
+    grabber = FrameGrabber(0).start()
 
-    if vc.isOpened():  # Try to get the first frame
-        rval, frame = vc.read()
-    else:
-        rval = False
+    # Always work on the newest frame, skipping any that arrived while processing
+    frame_seq, _, frame = grabber.read()
 
-    while rval:
+    while frame is not None:
         image_x = auto_targeter.process_image(frame)
         if image_x is not None:
             print(f"Image X: {image_x}")
 
         cv2.imshow("preview", frame)
-        rval, frame = vc.read()
+        frame_seq, _, frame = grabber.read(frame_seq)
         key = cv2.waitKey(1)
         if key == 27:  # Exit on ESC
             break
 
     # Clean up
     cv2.destroyAllWindows()
-    vc.release()
-    auto_targeter.client_socket.close()
+    grabber.stop()
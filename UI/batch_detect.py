@@ -0,0 +1,353 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+import cv2
+import detection
+import model_registry
+import numpy as np
+
+# One row per detection, tagged with the index of the frame it was found in
+FRAME_DETECTION_DTYPE = np.dtype([("frame", np.int32)] + detection.TARGET_DTYPE.descr)
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".m4v")
+
+# Model of the current worker process, loaded once by _init_worker
+_model = None
+
+
+def find_videos(paths):
+    """
+    Expands directories into the video files they contain.
+
+    Args:
+        paths (list): Video files and directories.
+
+    Returns:
+        list: Video file paths, sorted within each directory.
+    """
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in sorted(os.walk(path)):
+                videos.extend(
+                    os.path.join(root, name)
+                    for name in sorted(names)
+                    if name.lower().endswith(VIDEO_EXTENSIONS)
+                )
+        else:
+            videos.append(path)
+    return videos
+
+
+def output_names(videos):
+    """
+    Names the outputs of every video after its path relative to the directory the
+    videos have in common, so a/cam.mp4 and b/cam.mp4 do not overwrite each other.
+
+    Returns:
+        dict: video path -> output name without extension, or None if two videos
+            still map to the same name (e.g. cam.mp4 and cam.avi).
+    """
+    paths = [os.path.abspath(video) for video in videos]
+    common = os.path.commonpath([os.path.dirname(path) for path in paths])
+    names = {}
+    for video, path in zip(videos, paths):
+        relative = os.path.splitext(os.path.relpath(path, common))[0]
+        names[video] = relative.replace(os.sep, "_")
+    if len(set(names.values())) != len(names):
+        return None
+    return names
+
+
+def video_chunks(path, chunk_size):
+    """
+    Splits a video into frame ranges that can be decoded independently.
+
+    Returns:
+        list: (path, start_frame, frame_count) tuples; a single open-ended chunk if
+            the container does not report its length.
+    """
+    vc = cv2.VideoCapture(path)
+    total = int(vc.get(cv2.CAP_PROP_FRAME_COUNT))
+    vc.release()
+    if total <= 0:
+        return [(path, 0, None)]
+    return [
+        (path, start, min(chunk_size, total - start))
+        for start in range(0, total, chunk_size)
+    ]
+
+
+def _init_worker(model_name):
+    global _model
+    # Parallelism comes from the pool, one OpenCV thread per process avoids oversubscription
+    cv2.setNumThreads(1)
+    _model = model_registry.registry.get(model_name)
+
+
+def split_batch(detections, batch_size):
+    """
+    Splits the output of a batched SSD forward pass per image.
+
+    SSD puts the index of the image in the batch in the first column of every row.
+
+    Returns:
+        list: One (1, 1, N, 7) array per image.
+    """
+    rows = detections.reshape(-1, 7)
+    image_ids = rows[:, 0].astype(np.int32)
+    return [rows[image_ids == i].reshape(1, 1, -1, 7) for i in range(batch_size)]
+
+
+def detect_batch(model, frames, confidence_threshold):
+    """
+    Runs the detector on a list of frames in one forward pass.
+
+    Returns:
+        list: TARGET_DTYPE arrays, one per frame.
+    """
+    blob = cv2.dnn.blobFromImages(frames, 0.007843, (300, 300), 127.5)
+    per_image = split_batch(model.forward(blob), len(frames))
+    return [
+        detection.postprocess_detections(
+            detections,
+            frame.shape[1],
+            frame.shape[0],
+            confidence_threshold=confidence_threshold,
+        )
+        for frame, detections in zip(frames, per_image)
+    ]
+
+
+def seek_frame(vc, frame):
+    """
+    Moves a capture to `frame`.
+
+    With some codecs and variable frame rate files a seek lands on a nearby keyframe
+    instead, so the position is checked and the remaining frames are skipped with
+    grab() from the nearest earlier position.
+
+    Returns:
+        bool: False if the video ended before `frame`.
+    """
+    vc.set(cv2.CAP_PROP_POS_FRAMES, frame)
+    position = int(vc.get(cv2.CAP_PROP_POS_FRAMES))
+    if position == frame:
+        return True
+    if not 0 <= position < frame:
+        # Landed past the frame, start over from the beginning
+        vc.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        position = 0
+    for _ in range(frame - position):
+        if not vc.grab():
+            return False
+    return True
+
+
+def detect_chunk(task):
+    """
+    Decodes one chunk of a video and runs the detector over it in batches.
+
+    Args:
+        task (tuple): (path, start_frame, frame_count, batch_size, confidence_threshold).
+
+    Returns:
+        tuple: (path, start_frame, frames_read, FRAME_DETECTION_DTYPE array).
+    """
+    path, start, count, batch_size, confidence_threshold = task
+    vc = cv2.VideoCapture(path)
+    if start and not seek_frame(vc, start):
+        vc.release()
+        return path, start, 0, np.zeros(0, dtype=FRAME_DETECTION_DTYPE)
+
+    results = []
+    frames_read = 0
+    batch = []
+    while count is None or frames_read < count:
+        rval, frame = vc.read()
+        if rval:
+            batch.append(frame)
+            frames_read += 1
+        if batch and (len(batch) == batch_size or not rval or frames_read == count):
+            first = start + frames_read - len(batch)
+            for i, targets in enumerate(detect_batch(_model, batch, confidence_threshold)):
+                rows = np.zeros(len(targets), dtype=FRAME_DETECTION_DTYPE)
+                rows["frame"] = first + i
+                for name in detection.TARGET_DTYPE.names:
+                    rows[name] = targets[name]
+                results.append(rows)
+            batch = []
+        if not rval:
+            break
+    vc.release()
+
+    detections = (
+        np.concatenate(results) if results else np.zeros(0, dtype=FRAME_DETECTION_DTYPE)
+    )
+    return path, start, frames_read, detections
+
+
+def process_videos(
+    videos,
+    model_name="mobilenet_ssd",
+    workers=None,
+    chunk_size=256,
+    batch_size=16,
+    confidence_threshold=0.2,
+):
+    """
+    Runs the detector over whole videos on a pool of worker processes.
+
+    Every video is split into chunks of `chunk_size` frames that the workers decode
+    and detect independently, so even a single long video uses every core.
+
+    Args:
+        videos (list): Video file paths.
+        model_name (str): Registered detector model.
+        workers (int): Worker processes, defaults to the number of cores.
+        chunk_size (int): Frames decoded per task.
+        batch_size (int): Frames per forward pass.
+        confidence_threshold (float): Minimum confidence stored. Keep it low so
+            thresholds can be evaluated afterwards.
+
+    Returns:
+        dict: path -> (FRAME_DETECTION_DTYPE array sorted by frame, frames read).
+    """
+    tasks = [
+        chunk + (batch_size, confidence_threshold)
+        for path in videos
+        for chunk in video_chunks(path, chunk_size)
+    ]
+    results = {path: ([], 0) for path in videos}
+    with multiprocessing.Pool(workers, _init_worker, (model_name,)) as pool:
+        for path, start, frames_read, detections in pool.imap_unordered(
+            detect_chunk, tasks
+        ):
+            chunks, total = results[path]
+            chunks.append((start, detections))
+            results[path] = (chunks, total + frames_read)
+
+    output = {}
+    for path, (chunks, total) in results.items():
+        chunks.sort(key=lambda chunk: chunk[0])
+        detections = [d for _, d in chunks]
+        output[path] = (
+            np.concatenate(detections)
+            if detections
+            else np.zeros(0, dtype=FRAME_DETECTION_DTYPE),
+            total,
+        )
+    return output
+
+
+def save_detections(path, detections, frame_count, fps, confidence_threshold):
+    """Writes the detections of one video as a compressed npz file."""
+    np.savez_compressed(
+        path,
+        detections=detections,
+        frame_count=frame_count,
+        fps=fps,
+        confidence_threshold=confidence_threshold,
+    )
+
+
+def write_annotated_video(video_path, detections, output_path, confidence_threshold=0.65):
+    """
+    Draws the stored detections above `confidence_threshold` onto a copy of the video.
+    """
+    vc = cv2.VideoCapture(video_path)
+    fps = vc.get(cv2.CAP_PROP_FPS) or 30.0
+    writer = None
+    detections = detections[detections["confidence"] > confidence_threshold]
+    frames = detections["frame"]
+
+    index = 0
+    while True:
+        rval, frame = vc.read()
+        if not rval:
+            break
+        if writer is None:
+            h, w = frame.shape[:2]
+            writer = cv2.VideoWriter(
+                output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h)
+            )
+        # Detections are sorted by frame
+        first, last = np.searchsorted(frames, [index, index + 1])
+        for row in detections[first:last]:
+            startX, startY, endX, endY = (int(v) for v in row["box"])
+            cv2.rectangle(frame, (startX, startY), (endX, endY), (0, 255, 0), 2)
+            cv2.putText(
+                frame,
+                f"{row['confidence']:.2f}",
+                (startX, startY - 10),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 255, 0),
+                2,
+            )
+        writer.write(frame)
+        index += 1
+    vc.release()
+    if writer is not None:
+        writer.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the person detector over video files on every core"
+    )
+    parser.add_argument("inputs", nargs="+", help="Video files or directories")
+    parser.add_argument("--output-dir", default="UI/batch_results")
+    parser.add_argument("--model", default="mobilenet_ssd", help="Registered detector model")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=256, help="Frames per task")
+    parser.add_argument("--batch-size", type=int, default=16, help="Frames per forward pass")
+    parser.add_argument(
+        "--confidence", type=float, default=0.2, help="Minimum confidence stored"
+    )
+    parser.add_argument(
+        "--annotate",
+        type=float,
+        metavar="THRESHOLD",
+        help="Also write an annotated video with detections above THRESHOLD",
+    )
+    args = parser.parse_args()
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("Error: No videos found")
+        return
+    names = output_names(videos)
+    if names is None:
+        print("Error: Several videos would write to the same output name")
+        return
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.monotonic()
+    results = process_videos(
+        videos, args.model, args.workers, args.chunk_size, args.batch_size, args.confidence
+    )
+    elapsed = time.monotonic() - start
+    total_frames = sum(frame_count for _, frame_count in results.values())
+    print(
+        f"Processed {total_frames} frames from {len(videos)} videos in {elapsed:.1f}s"
+        f" ({total_frames / elapsed:.1f} fps)"
+    )
+
+    for video, (detections, frame_count) in results.items():
+        name = names[video]
+        vc = cv2.VideoCapture(video)
+        fps = vc.get(cv2.CAP_PROP_FPS)
+        vc.release()
+        output = os.path.join(args.output_dir, name + ".npz")
+        save_detections(output, detections, frame_count, fps, args.confidence)
+        print(f"{video}: {len(detections)} detections in {frame_count} frames -> {output}")
+        if args.annotate is not None:
+            annotated = os.path.join(args.output_dir, name + "_annotated.mp4")
+            write_annotated_video(video, detections, annotated, args.annotate)
+            print(f"Annotated video written to {annotated}")
+
+
+if __name__ == "__main__":
+    main()
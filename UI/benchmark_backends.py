@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import time
+
+import cv2
+import inference_backends
+import numpy as np
+
+
+def load_frames(path, limit):
+    """
+    Loads up to `limit` frames from a video file or a directory of images.
+
+    Args:
+        path (str): Video file or image directory.
+        limit (int): Maximum number of frames.
+
+    Returns:
+        list: BGR frames.
+    """
+    frames = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            frame = cv2.imread(os.path.join(path, name))
+            if frame is not None:
+                frames.append(frame)
+            if len(frames) >= limit:
+                break
+    else:
+        vc = cv2.VideoCapture(path)
+        while len(frames) < limit:
+            rval, frame = vc.read()
+            if not rval:
+                break
+            frames.append(frame)
+        vc.release()
+    return frames
+
+
+def benchmark_backend(backend, blobs, runs, warmup):
+    """
+    Times forward passes of one backend.
+
+    Args:
+        backend (inference_backends.InferenceBackend): The backend to time.
+        blobs (list): Preprocessed input blobs, cycled through.
+        runs (int): Number of timed forward passes.
+        warmup (int): Untimed forward passes run first.
+
+    Returns:
+        dict: Latency percentiles in milliseconds and throughput in frames per second.
+    """
+    for i in range(warmup):
+        backend.forward(blobs[i % len(blobs)])
+
+    latencies = np.empty(runs)
+    start = time.perf_counter()
+    for i in range(runs):
+        t0 = time.perf_counter()
+        backend.forward(blobs[i % len(blobs)])
+        latencies[i] = time.perf_counter() - t0
+    total = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+    return {
+        "runs": runs,
+        "mean_ms": float(latencies.mean() * 1000),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "fps": runs / total,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare detector inference backends on recorded frames"
+    )
+    parser.add_argument("frames", help="Video file or directory of images")
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=list(inference_backends.BACKENDS),
+        choices=list(inference_backends.BACKENDS),
+    )
+    parser.add_argument("--threads", type=int, nargs="+", default=[None])
+    parser.add_argument("--max-frames", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames, args.max_frames)
+    if not frames:
+        print(f"Error: No frames could be read from {args.frames}")
+        return
+    # Preprocess once so only the forward pass is timed
+    blobs = [
+        cv2.dnn.blobFromImage(frame, 0.007843, (300, 300), 127.5) for frame in frames
+    ]
+    print(f"Loaded {len(frames)} frames from {args.frames}")
+
+    results = []
+    # The OpenCV backend sets cv2.setNumThreads, which is process-wide. Restore the
+    # default after every run so later "default" runs really use it.
+    default_threads = cv2.getNumThreads()
+    for name in args.backends:
+        for threads in args.threads:
+            label = f"{name} (threads={threads or 'default'})"
+            try:
+                backend = inference_backends.make_backend(name, threads)
+            except Exception as e:
+                cv2.setNumThreads(default_threads)
+                print(f"{label}: skipped, {e}")
+                continue
+            try:
+                stats = benchmark_backend(backend, blobs, args.runs, args.warmup)
+            finally:
+                cv2.setNumThreads(default_threads)
+            stats.update(backend=name, threads=threads)
+            results.append(stats)
+            print(
+                f"{label}: p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms "
+                f"p99={stats['p99_ms']:.1f}ms throughput={stats['fps']:.1f} fps"
+            )
+
+    if results:
+        fastest = min(results, key=lambda r: r["p50_ms"])
+        print(f"Fastest: {fastest['backend']} (threads={fastest['threads'] or 'default'})")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
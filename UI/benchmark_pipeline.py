@@ -0,0 +1,303 @@
+import argparse
+import contextlib
+import json
+import sys
+import time
+
+import auto_targeting_ui
+import cv2
+import detection
+import model_registry
+import numpy as np
+import targeting
+from command_ui import ArduinoController
+from frame_grabber import FrameGrabber
+from inference_backends import InferenceBackend
+from turret_simulator import TurretSimulator
+
+SYNTHETIC_CLASS_NAMES = ["background"] * detection.PERSON_CLASS_ID + ["person"]
+
+
+class FramePacer:
+    """Releases frames in real time at a fixed frame rate, like a camera does."""
+
+    def __init__(self, fps):
+        self.frame_rate = fps
+        self._next_time = None
+
+    def wait(self):
+        """Blocks until the next frame is due."""
+        now = time.monotonic()
+        if self._next_time is None:
+            self._next_time = now
+        if self._next_time > now:
+            time.sleep(self._next_time - now)
+        self._next_time += 1.0 / self.frame_rate
+
+
+class PacedCapture:
+    """
+    Plays a video file through cv2.VideoCapture at its recorded frame rate.
+
+    Without pacing a file is decoded as fast as possible, so frame rate and dropped
+    frames would depend on the decoder instead of the pipeline. The time spent
+    decoding each frame is kept in `decode_times`.
+    """
+
+    def __init__(self, path, default_fps=30.0):
+        self.cap = cv2.VideoCapture(path)
+        self.frame_rate = self.cap.get(cv2.CAP_PROP_FPS) or default_fps
+        self.decode_times = []
+        self._pacer = FramePacer(self.frame_rate)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def read(self):
+        self._pacer.wait()
+        start = time.monotonic()
+        ret, frame = self.cap.read()
+        self.decode_times.append(time.monotonic() - start)
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class SyntheticCapture:
+    """
+    Stands in for cv2.VideoCapture with generated frames of a moving bright target.
+
+    Frames are produced in real time at `fps`, so a pipeline slower than the camera
+    drops frames exactly like it would with real hardware. The time spent generating
+    each frame is kept in `decode_times`.
+    """
+
+    def __init__(self, width=640, height=480, fps=30.0, frames=300, seed=0):
+        self.width = width
+        self.height = height
+        self.frame_rate = fps
+        self.frames = frames
+        self.index = 0
+        self.decode_times = []
+        self._rng = np.random.default_rng(seed)
+        self._pacer = FramePacer(fps)
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.frame_rate
+        return 0.0
+
+    def target_box(self, index):
+        """Ground-truth box of the target in frame `index`."""
+        w, h = self.width // 8, self.height // 3
+        cx = self.width / 2 + self.width * 0.35 * np.sin(index / self.frame_rate)
+        cy = self.height / 2
+        return int(cx - w / 2), int(cy - h / 2), int(cx + w / 2), int(cy + h / 2)
+
+    def read(self):
+        if not self._opened or self.index >= self.frames:
+            return False, None
+        self._pacer.wait()
+
+        start = time.monotonic()
+        frame = self._rng.integers(0, 80, (self.height, self.width, 3), dtype=np.uint8)
+        x1, y1, x2, y2 = self.target_box(self.index)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (240, 240, 240), -1)
+        self.decode_times.append(time.monotonic() - start)
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        self._opened = False
+
+
+class SyntheticTargetBackend(InferenceBackend):
+    """
+    Finds the bright synthetic target in the network input and reports it as an SSD
+    'person' detection, so the rest of the pipeline runs unchanged without a model.
+    """
+
+    name = "synthetic"
+
+    def forward(self, blob):
+        rows = []
+        for image_id, image in enumerate(blob):
+            # blobFromImage maps 0-255 to about -1..1, the target is brighter than 0.6
+            mask = (image > 0.6).all(axis=0)
+            ys, xs = np.nonzero(mask)
+            if not len(xs):
+                continue
+            h, w = mask.shape
+            box = [xs.min() / w, ys.min() / h, (xs.max() + 1) / w, (ys.max() + 1) / h]
+            rows.append([image_id, detection.PERSON_CLASS_ID, 0.99] + box)
+        return np.array(rows, dtype=np.float32).reshape(1, 1, -1, 7)
+
+
+def latency_summary(samples):
+    """
+    Returns:
+        dict: mean, p50, p95 and p99 in milliseconds, None values when there are no samples.
+    """
+    if not samples:
+        return {"mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    ms = np.array(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+def run_pipeline(grabber, targeter, controller, max_frames):
+    """
+    Pushes frames through capture, colour conversion, detection, calibration mapping
+    and the turret command, timing each stage. "capture" is the time the capture
+    spent producing each frame, on the grabber thread, and "wait" is how long the
+    pipeline blocked waiting for the next frame.
+
+    Returns:
+        dict: Benchmark results.
+    """
+    stages = {
+        name: [] for name in ("capture", "wait", "convert", "detect", "map", "send")
+    }
+    glass_to_command = []
+    processed = commands = dropped = 0
+    frame_seq = 0
+    start = time.monotonic()
+
+    while processed < max_frames:
+        t0 = time.monotonic()
+        seq, timestamp, frame = grabber.read(frame_seq, timeout=5.0)
+        if frame is None:
+            break
+        if frame_seq:
+            dropped += seq - frame_seq - 1
+        frame_seq = seq
+        t1 = time.monotonic()
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        t2 = time.monotonic()
+        servo_x, servo_y, video_x, video_y = targeter.process_image(frame, timestamp)
+        t3 = time.monotonic()
+        if video_x is not None:
+            # Timed on its own, process_image above already used the lookup table
+            servo_x, servo_y = targeting.map_video_to_servo(video_x, video_y)
+            if not targeting.calibration_model.is_2d:
+                servo_y = 30
+        t4 = time.monotonic()
+        if servo_x is not None:
+            controller.send_command(f"x={servo_x}&y={servo_y}")
+            commands += 1
+        t5 = time.monotonic()
+
+        stages["wait"].append(t1 - t0)
+        stages["convert"].append(t2 - t1)
+        stages["detect"].append(t3 - t2)
+        stages["map"].append(t4 - t3)
+        stages["send"].append(t5 - t4)
+        if servo_x is not None:
+            glass_to_command.append(t5 - timestamp)
+        processed += 1
+
+    elapsed = time.monotonic() - start
+    stages["capture"] = list(getattr(grabber.cap, "decode_times", []))
+    # Give the last replies a moment to arrive before reading the RTT figures
+    time.sleep(0.2)
+    return {
+        "frames_processed": processed,
+        "dropped_frames": int(dropped),
+        "elapsed_s": elapsed,
+        "fps": processed / elapsed if elapsed else 0.0,
+        "commands_per_second": commands / elapsed if elapsed else 0.0,
+        "stages": {name: latency_summary(samples) for name, samples in stages.items()},
+        "glass_to_command": latency_summary(glass_to_command),
+        "turret": controller.reply_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the full aiming pipeline against a simulated turret"
+    )
+    parser.add_argument("--video", help="Recorded video, synthetic frames if omitted")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=30.0,
+        help="Synthetic frame rate, and the video's if it does not report one",
+    )
+    parser.add_argument(
+        "--model",
+        help="Registered detector model, defaults to mobilenet_ssd for recorded video "
+        "and a synthetic target detector otherwise",
+    )
+    parser.add_argument("--protocol", choices=["auto", "text", "binary"], default="auto")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated network latency")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Simulated network jitter")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    model_registry.registry.register(
+        "synthetic_target",
+        lambda: model_registry.SsdModel(SyntheticTargetBackend(), SYNTHETIC_CLASS_NAMES),
+    )
+    # Keep stdout clean for the JSON results
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.video:
+            capture = PacedCapture(args.video, default_fps=args.fps)
+            grabber = FrameGrabber(capture=capture).start()
+            model = args.model or "mobilenet_ssd"
+        else:
+            capture = SyntheticCapture(fps=args.fps, frames=args.frames)
+            grabber = FrameGrabber(capture=capture).start()
+            model = args.model or "synthetic_target"
+        targeter = auto_targeting_ui.AutoTargeter(model_name=model)
+
+        simulator = TurretSimulator(
+            port=0, latency=args.latency, jitter=args.jitter
+        ).start()
+        controller = ArduinoController(
+            ip="127.0.0.1", port=simulator.port, protocol=args.protocol, verbose=False
+        )
+        controller.connect()
+
+    results = run_pipeline(grabber, targeter, controller, args.frames)
+    results["config"] = {
+        "source": args.video or "synthetic",
+        "model": model,
+        "protocol": controller.protocol,
+        "latency": args.latency,
+        "jitter": args.jitter,
+    }
+
+    grabber.stop()
+    controller.close()
+    simulator.stop()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,428 @@
+import collections
 import socket
+import threading
+import time
+
+import numpy as np
+import turret_protocol
+from metrics import metrics
+
+
+# Manual control keys shared by every front end, keyed by Tk keysym. Each entry is
+# (description, action(controller)).
+KEY_ACTIONS = {
+    "Up": ("Moved UP", lambda c: c.increment_position(0, c.step_size, "UP")),
+    "Down": ("Moved DOWN", lambda c: c.increment_position(0, -c.step_size, "DOWN")),
+    "Left": ("Moved LEFT", lambda c: c.increment_position(c.step_size, 0, "LEFT")),
+    "Right": ("Moved RIGHT", lambda c: c.increment_position(-c.step_size, 0, "RIGHT")),
+    "q": ("Moved UP-LEFT", lambda c: c.update_position(225, 45, "UP-LEFT")),
+    "e": ("Moved UP-RIGHT", lambda c: c.update_position(45, 45, "UP-RIGHT")),
+    "w": ("Moved UP-CENTER", lambda c: c.update_position(135, 45, "UP-CENTER")),
+    "a": ("Moved DOWN-LEFT", lambda c: c.update_position(225, 0, "DOWN-LEFT")),
+    "d": ("Moved DOWN-RIGHT", lambda c: c.update_position(45, 0, "DOWN-RIGHT")),
+    "s": ("Moved DOWN-CENTER", lambda c: c.update_position(135, 0, "DOWN-CENTER")),
+    "space": ("Toggled Solenoid", lambda c: c.toggle_solenoid()),
+}
+# Key names used by callers that predate KEY_ACTIONS
+KEY_ALIASES = {"UP": "Up", "DOWN": "Down", "LEFT": "Left", "RIGHT": "Right", " ": "space"}
+
+
+class RttStats:
+    """Rolling window of command round-trip times."""
+
+    def __init__(self, window=1000):
+        self.samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, rtt):
+        with self._lock:
+            self.samples.append(rtt)
+
+    def percentiles(self):
+        """
+        Returns:
+            dict: p50, p95 and p99 round-trip times in milliseconds, None if there are no samples yet.
+        """
+        with self._lock:
+            samples = np.array(self.samples)
+        if not len(samples):
+            return {"p50": None, "p95": None, "p99": None}
+        p50, p95, p99 = np.percentile(samples * 1000, [50, 95, 99])
+        return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
 
 
 class ArduinoController:
-    def __init__(self, spoof=False, ip="192.168.50.30", port=80):
+    def __init__(
+        self,
+        spoof=False,
+        ip="192.168.50.30",
+        port=80,
+        async_mode=False,
+        max_rate=30,
+        protocol="auto",
+        verbose=True,
+        reconnect=False,
+        min_backoff=0.5,
+        max_backoff=10.0,
+    ):
+        """
+        Args:
+            spoof (bool): Print commands instead of sending them.
+            ip (str): Turret address.
+            port (int): Turret port.
+            async_mode (bool): Send from a background thread. Position updates go into
+                a latest-value slot sent at most `max_rate` times per second, other
+                commands are sent ahead of any pending position. Callers never block.
+            max_rate (float): Maximum position updates per second in async mode.
+            protocol (str): "text", "binary" or "auto" to use the binary protocol
+                when the firmware accepts it and fall back to text otherwise.
+            verbose (bool): Print every command sent, turn off for curses front ends.
+            reconnect (bool): Reconnect with exponential backoff when the connection
+                drops, and replay the last position. Commands sent while
+                disconnected are dropped.
+            min_backoff (float): First reconnect delay in seconds.
+            max_backoff (float): Longest reconnect delay in seconds.
+        """
         self.spoof = spoof
+        self.verbose = verbose
         self.arduino_ip = ip
         self.arduino_port = port
         self.x_pos, self.x_min, self.x_max = 135, 0, 270
         self.y_pos, self.y_min, self.y_max = 30, 0, 75
         self.step_size = 5
+
+        # The protocol asked for, and the one negotiated on the current connection
+        self.requested_protocol = protocol
+        self.protocol = protocol
+        self._seq = 0
+
+        # Reply tracking, commands waiting for a reply are (seq, command, send time,
+        # on_reply). Text commands (seq None) and binary frames are answered
+        # independently, so they wait in separate queues.
+        self._send_lock = threading.Lock()
+        self._in_flight_text = collections.deque(maxlen=1000)
+        self._in_flight_binary = collections.deque(maxlen=1000)
+        self._reader_thread = None
+        self.rtt = RttStats()
+        self.counters = {"sent": 0, "replies": 0, "rejected": 0, "unmatched": 0}
+        self.last_reply = None
+        # Optional session_recorder.SessionRecorder, logs every command sent
+        self.recorder = None
+        # servo_control.ServoControlLoop while one is attached, position updates then
+        # only move its setpoint
+        self.control_loop = None
+
+        self.async_mode = async_mode
+        self.max_rate = max_rate
+        self._condition = threading.Condition()
+        self._pending_position = None
+        self._pending_commands = collections.deque()
+        self._last_sent_position = None
+        self._sender_thread = None
+        self._running = False
+        if async_mode:
+            self._running = True
+            self._sender_thread = threading.Thread(
+                target=self._sender_loop, name="ArduinoSender", daemon=True
+            )
+            self._sender_thread.start()
+
+        self.reconnect = reconnect
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.reconnects = 0
+        self.last_position = None
+        self._reconnect_thread = None
+
+        self.connected = False
+        self.client_socket = None
         if spoof:
             print("Spoofing Arduino Controller")
-        else:
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
     def connect(self):
         if self.spoof:
             return True
         else:
-            try:
-                self.client_socket.connect((self.arduino_ip, self.arduino_port))
+            connected = self._open_connection()
+            if self.reconnect and self._reconnect_thread is None:
+                # Watches the connection from now on, also retries a failed first try
+                self._reconnect_thread = threading.Thread(
+                    target=self._reconnect_loop, name="ArduinoReconnect", daemon=True
+                )
+                self._reconnect_thread.start()
+            return connected
+
+    def _open_connection(self):
+        # A fresh socket every time, so a dropped connection can be reopened
+        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Commands are tiny writes, don't let Nagle hold them back waiting for ACKs
+        self.client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            self.client_socket.connect((self.arduino_ip, self.arduino_port))
+            if self.verbose:
                 print(f"Connected to Arduino at {self.arduino_ip}:{self.arduino_port}")
-            except Exception as e:
-                print(f"Error connecting to Arduino: {e}")
-                self.client_socket.close()
-                return False
+        except Exception as e:
+            print(f"Error connecting to Arduino: {e}")
+            self.client_socket.close()
+            return False
+        # Negotiated again on every connection, a failed attempt must not stick
+        if self.requested_protocol != "text":
+            self.negotiate_protocol()
+        self._in_flight_text.clear()
+        self._in_flight_binary.clear()
+        self.connected = True
+        self._reader_thread = threading.Thread(
+            target=self._reader_loop, name="ArduinoReader", daemon=True
+        )
+        self._reader_thread.start()
+        return True
+
+    def _reconnect_loop(self):
+        backoff = self.min_backoff
+        was_connected = self.connected
+        while self._reconnect_thread is not None:
+            if self.connected:
+                was_connected = True
+                time.sleep(0.2)
+                continue
+            if was_connected:
+                print(
+                    f"Connection to {self.arduino_ip}:{self.arduino_port} lost,"
+                    f" reconnecting in {backoff:.1f}s"
+                )
+            time.sleep(backoff)
+            if self._reconnect_thread is None:
+                return
+            if self._open_connection():
+                self.reconnects += 1
+                backoff = self.min_backoff
+                if self.last_position is not None:
+                    self.send_command(self.last_position)
+            else:
+                was_connected = False
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def negotiate_protocol(self, timeout=3.0):
+        """
+        Asks the firmware for the binary protocol, falling back to text if it refuses.
+
+        Args:
+            timeout (float): Seconds to wait for the answer. The firmware runs its
+                servo greeting before it reads the first command.
+
+        Returns:
+            str: The protocol in use, "binary" or "text".
+        """
+        reply = b""
+        try:
+            self.client_socket.sendall(
+                (turret_protocol.NEGOTIATE_REQUEST + "\n").encode("utf-8")
+            )
+            self.client_socket.settimeout(timeout)
+            while not reply.endswith(b"\n"):
+                chunk = self.client_socket.recv(64)
+                if not chunk:
+                    break
+                reply += chunk
+        except (socket.timeout, OSError) as e:
+            print(f"No protocol negotiation reply: {e}")
+        finally:
+            self.client_socket.settimeout(None)
+
+        accepted = reply.decode("utf-8", "replace").strip() == turret_protocol.NEGOTIATE_REPLY
+        self.protocol = "binary" if accepted else "text"
+        if self.verbose:
+            print(f"Using {self.protocol} turret protocol")
+        return self.protocol
+
+    def send_command(self, command, on_reply=None):
+        """
+        Sends a command to the turret.
+
+        Args:
+            command (str): Text protocol command, e.g. "solenoid=toggle".
+            on_reply (callable): Optional callback(reply, rejected) called from the
+                reader thread when the turret answers this command.
+
+        Returns:
+            bool: False if the command could not be written to the connection.
+        """
+        if self.async_mode:
+            # Jump ahead of any pending aim update
+            with self._condition:
+                self._pending_commands.append((command, on_reply))
+                self._condition.notify()
             return True
+        return self._send_now(command, on_reply)
 
-    def send_command(self, command):
+    def _send_now(self, command, on_reply=None):
+        if self.recorder is not None:
+            self.recorder.record_command(command)
         if self.spoof:
             print(f"Sent spoof command: {command}")
-            return
+            return True
         else:
+            parsed = turret_protocol.parse_text_command(command)
+            if parsed is not None and parsed[0] == turret_protocol.OP_MOVE:
+                # Remembered so it can be replayed after a reconnect
+                self.last_position = command
+            if self.reconnect and not self.connected:
+                return False
+            with self._send_lock:
+                data = None
+                self._seq = (self._seq + 1) & 0xFFFF
+                if self.protocol == "binary":
+                    data = turret_protocol.encode_command(command, self._seq)
+                seq = self._seq if data is not None else None
+                if data is None:
+                    data = (command + "\n").encode("utf-8")
+                if seq is None:
+                    in_flight = self._in_flight_text
+                else:
+                    in_flight = self._in_flight_binary
+                try:
+                    in_flight.append((seq, command, time.monotonic(), on_reply))
+                    with metrics.timer("send"):
+                        self.client_socket.sendall(data)
+                    metrics.increment("commands_sent")
+                    self.counters["sent"] += 1
+                except Exception as e:
+                    in_flight.pop()
+                    self.connected = False
+                    print(f"Error sending command: {e}")
+                    return False
+            return True
+
+    def _reader_loop(self):
+        client_socket = self.client_socket
+        buffer = b""
+        while True:
             try:
-                self.client_socket.sendall((command + "\n").encode("utf-8"))
-            except Exception as e:
-                print(f"Error sending command: {e}")
+                chunk = client_socket.recv(4096)
+            except OSError:
+                chunk = b""
+            if not chunk:
+                if client_socket is self.client_socket:
+                    self.connected = False
+                return
+            buffer += chunk
+            while buffer:
+                if buffer[0] == turret_protocol.MAGIC:
+                    if len(buffer) < turret_protocol.ACK_SIZE:
+                        break
+                    ack = turret_protocol.decode_ack(buffer[: turret_protocol.ACK_SIZE])
+                    buffer = buffer[turret_protocol.ACK_SIZE :]
+                    if ack is None:
+                        self.counters["unmatched"] += 1
+                        continue
+                    _, seq, status = ack
+                    self._handle_reply(seq, status != turret_protocol.STATUS_OK, ack)
+                else:
+                    line, newline, rest = buffer.partition(b"\n")
+                    if not newline:
+                        break
+                    buffer = rest
+                    reply = line.decode("utf-8", "replace").strip()
+                    self._handle_reply(None, "Invalid" in reply, reply)
+
+    def _handle_reply(self, seq, rejected, reply):
+        now = time.monotonic()
+        with self._send_lock:
+            match = None
+            if seq is None:
+                # Text replies come back one per command, in order
+                if self._in_flight_text:
+                    match = self._in_flight_text.popleft()
+            elif any(entry[0] == seq for entry in self._in_flight_binary):
+                # Binary acks echo the sequence number, older entries were lost
+                while match is None:
+                    entry = self._in_flight_binary.popleft()
+                    if entry[0] == seq:
+                        match = entry
+            self.counters["replies"] += 1
+            if rejected:
+                self.counters["rejected"] += 1
+            if match is None:
+                self.counters["unmatched"] += 1
+        self.last_reply = reply
+        if match is not None:
+            self.rtt.add(now - match[2])
+            if match[3] is not None:
+                match[3](reply, rejected)
+
+    def reply_stats(self):
+        """
+        Returns:
+            dict: Rolling RTT percentiles in milliseconds plus sent, reply, rejected,
+                unmatched and in-flight command counts.
+        """
+        stats = dict(self.rtt.percentiles())
+        stats.update(self.counters)
+        stats["in_flight"] = len(self._in_flight_text) + len(self._in_flight_binary)
+        return stats
+
+    def format_reply_stats(self):
+        stats = self.reply_stats()
+        if stats["p50"] is None:
+            rtt = "RTT: n/a"
+        else:
+            rtt = (
+                f"RTT p50={stats['p50']:.0f}ms p95={stats['p95']:.0f}ms "
+                f"p99={stats['p99']:.0f}ms"
+            )
+        return f"{rtt} | rejected={stats['rejected']} in flight={stats['in_flight']}"
+
+    def _sender_loop(self):
+        next_position_time = 0.0
+        while True:
+            with self._condition:
+                while True:
+                    if not self._running:
+                        return
+                    if self._pending_commands:
+                        command, on_reply = self._pending_commands.popleft()
+                        break
+                    if self._pending_position is not None:
+                        wait = next_position_time - time.monotonic()
+                        if wait <= 0:
+                            position = self._pending_position
+                            self._pending_position = None
+                            if position == self._last_sent_position:
+                                continue
+                            self._last_sent_position = position
+                            command = f"x={position[0]}&y={position[1]}"
+                            on_reply = None
+                            # An attached control loop already paces the
+                            # positions, limiting again would drop its steps
+                            if self.max_rate and self.control_loop is None:
+                                min_interval = 1.0 / self.max_rate
+                            else:
+                                min_interval = 0.0
+                            next_position_time = time.monotonic() + min_interval
+                            break
+                        self._condition.wait(wait)
+                    else:
+                        self._condition.wait()
+            self._send_now(command, on_reply)
+
+    def close(self):
+        """Stops the control loop and background threads and closes the connection."""
+        if self.control_loop is not None:
+            self.control_loop.stop()
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._sender_thread is not None:
+            self._sender_thread.join(timeout=1.0)
+        self._reconnect_thread = None
+        self.connected = False
+        if self.client_socket is not None:
+            # shutdown() wakes the reader thread blocked in recv()
+            try:
+                self.client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.client_socket.close()
 
     def increment_position(self, x_delta, y_delta, action_name="Manual Positioning"):
         new_x = self.x_pos + x_delta
@@ -45,38 +432,43 @@ class ArduinoController:
     def update_position(self, new_x, new_y, action_name, spoof=False):
         self.x_pos = max(self.x_min, min(self.x_max, new_x))
         self.y_pos = max(self.y_min, min(self.y_max, new_y))
-        self.send_command(f"x={self.x_pos}&y={self.y_pos}")
-        print(f"Sent command: {action_name} (x={self.x_pos}, y={self.y_pos})")
+        if self.control_loop is not None:
+            # The control loop sends the intermediate positions at its own rate
+            self.control_loop.set_target(self.x_pos, self.y_pos)
+        else:
+            self.send_position(self.x_pos, self.y_pos)
+        if self.verbose:
+            print(f"Sent command: {action_name} (x={self.x_pos}, y={self.y_pos})")
+
+    def send_position(self, x, y):
+        """Sends a move command for (x, y) as is, without clamping or the control loop."""
+        if self.async_mode:
+            # Latest value wins, the sender thread drops superseded positions
+            with self._condition:
+                self._pending_position = (x, y)
+                self._condition.notify()
+        else:
+            self.send_command(f"x={x}&y={y}")
 
     def toggle_solenoid(self):
         self.send_command("solenoid=toggle")
-        print("Sent command: TOGGLE SOLENOID")
+        if self.verbose:
+            print("Sent command: TOGGLE SOLENOID")
 
     def handle_key(self, key):
-        actions = {
-            "UP": lambda: self.update_position(
-                self.x_pos, self.y_pos + self.step_size, "UP"
-            ),
-            "DOWN": lambda: self.update_position(
-                self.x_pos, self.y_pos - self.step_size, "DOWN"
-            ),
-            "LEFT": lambda: self.update_position(
-                self.x_pos + self.step_size, self.y_pos, "LEFT"
-            ),
-            "RIGHT": lambda: self.update_position(
-                self.x_pos - self.step_size, self.y_pos, "RIGHT"
-            ),
-            "q": lambda: self.update_position(225, 45, "UP-LEFT"),
-            "e": lambda: self.update_position(45, 45, "UP-RIGHT"),
-            "w": lambda: self.update_position(135, 45, "UP-CENTER"),
-            "a": lambda: self.update_position(225, 0, "DOWN-LEFT"),
-            "d": lambda: self.update_position(45, 0, "DOWN-RIGHT"),
-            "s": lambda: self.update_position(135, 0, "DOWN-CENTER"),
-            " ": self.toggle_solenoid,
-        }
-
-        action = actions.get(key)
-        if action:
-            action()
-        else:
+        """
+        Runs the action bound to a key in KEY_ACTIONS.
+
+        Args:
+            key (str): Tk keysym, or one of the older names in KEY_ALIASES.
+
+        Returns:
+            str: Description of the action, or None if the key is not mapped.
+        """
+        entry = KEY_ACTIONS.get(KEY_ALIASES.get(key, key))
+        if entry is None:
             print(f"Unmapped key pressed: {key}")
+            return None
+        description, action = entry
+        action(self)
+        return description
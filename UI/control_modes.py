@@ -0,0 +1,84 @@
+MODES = ("idle", "manual", "mouse", "auto", "calibrating")
+
+
+class ControlModes:
+    """
+    State machine for the UI control modes.
+
+    Exactly one mode is active at a time. Each mode registers its key handlers, its
+    widget bindings and enter/exit callbacks once. Widget bindings are installed when
+    the mode is entered and removed when it is left, and key presses are routed
+    through the active mode's key table, so nothing has to be rebound per frame.
+    """
+
+    def __init__(self, mode="idle", on_change=None):
+        """
+        Args:
+            mode (str): Starting mode.
+            on_change (callable): Optional callback(old_mode, new_mode) after a transition.
+        """
+        self.mode = mode
+        self.on_change = on_change
+        self._modes = {
+            name: {"keys": {}, "bindings": [], "on_enter": None, "on_exit": None}
+            for name in MODES
+        }
+        self._installed = []  # (widget, sequence, funcid) of the active mode
+
+    def register(self, mode, keys=None, bindings=None, on_enter=None, on_exit=None):
+        """
+        Configures a mode.
+
+        Args:
+            mode (str): One of MODES.
+            keys (dict): Tk keysym -> handler(event), used while the mode is active.
+            bindings (list): (widget, sequence, handler) installed while the mode is active.
+            on_enter (callable): Called after entering the mode.
+            on_exit (callable): Called before leaving the mode.
+        """
+        if mode not in self._modes:
+            raise ValueError(f"Unknown control mode: {mode}")
+        self._modes[mode].update(
+            keys=dict(keys or {}),
+            bindings=list(bindings or []),
+            on_enter=on_enter,
+            on_exit=on_exit,
+        )
+
+    def set_mode(self, mode):
+        """Leaves the current mode and enters `mode`, doing nothing if it is already active."""
+        if mode not in self._modes:
+            raise ValueError(f"Unknown control mode: {mode}")
+        if mode == self.mode:
+            return
+        old = self.mode
+        if self._modes[old]["on_exit"] is not None:
+            self._modes[old]["on_exit"]()
+        for widget, sequence, funcid in self._installed:
+            widget.unbind(sequence, funcid)
+        self._installed = [
+            (widget, sequence, widget.bind(sequence, handler, add="+"))
+            for widget, sequence, handler in self._modes[mode]["bindings"]
+        ]
+        self.mode = mode
+        if self._modes[mode]["on_enter"] is not None:
+            self._modes[mode]["on_enter"]()
+        if self.on_change is not None:
+            self.on_change(old, mode)
+
+    def toggle(self, mode):
+        """Enters `mode`, or goes back to idle if it is already active."""
+        self.set_mode("idle" if self.mode == mode else mode)
+
+    def handle_key(self, event):
+        """
+        Runs the active mode's handler for a key press.
+
+        Returns:
+            bool: True if the key is mapped in the active mode.
+        """
+        handler = self._modes[self.mode]["keys"].get(event.keysym)
+        if handler is None:
+            return False
+        handler(event)
+        return True
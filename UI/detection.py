@@ -0,0 +1,143 @@
+import numpy as np
+
+# For MobileNet SSD, 'person' class ID is 15
+PERSON_CLASS_ID = 15
+
+# One row per detected target. box is (startX, startY, endX, endY) and center is
+# (x, y), both in pixels of the frame the detections were scaled to.
+TARGET_DTYPE = np.dtype(
+    [
+        ("box", np.int32, (4,)),
+        ("center", np.float32, (2,)),
+        ("confidence", np.float32),
+        ("class_id", np.int32),
+    ]
+)
+
+
+def non_max_suppression(boxes, scores, iou_threshold):
+    """
+    Greedy non-max suppression.
+
+    Args:
+        boxes (np.ndarray): (N, 4) boxes as (startX, startY, endX, endY).
+        scores (np.ndarray): (N,) confidence of each box.
+        iou_threshold (float): Boxes overlapping a better box by more than this are removed.
+
+    Returns:
+        np.ndarray: Indices of the kept boxes, best first.
+    """
+    boxes = boxes.astype(np.float32)
+    x1, y1, x2, y2 = boxes.T
+    areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.maximum(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0)
+        inter_h = np.maximum(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0)
+        inter = inter_w * inter_h
+        union = areas[i] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.intp)
+
+
+def postprocess_detections(
+    detections,
+    width,
+    height,
+    class_ids=(PERSON_CLASS_ID,),
+    confidence_threshold=0.65,
+    nms_threshold=0.45,
+    offset=(0, 0),
+    frame_size=None,
+):
+    """
+    Filters, scales and clamps the raw output of an SSD network in one pass.
+
+    Args:
+        detections (np.ndarray): Network output of shape (1, 1, N, 7).
+        width (int): Width of the image the network was run on.
+        height (int): Height of the image the network was run on.
+        class_ids (tuple): Class IDs to keep.
+        confidence_threshold (float): Minimum confidence to keep.
+        nms_threshold (float): IoU above which overlapping boxes of the same class are
+            suppressed, None to skip NMS.
+        offset (tuple or np.ndarray): (x, y) added to the boxes, for detections run
+            on a crop.
+        frame_size (tuple): (width, height) to clamp to, defaults to (width, height).
+
+    Returns:
+        np.ndarray: TARGET_DTYPE array of every target, highest confidence first.
+    """
+    rows = detections.reshape(-1, 7)
+    confidence = rows[:, 2]
+    class_id = rows[:, 1].astype(np.int32)
+    mask = (confidence > confidence_threshold) & np.isin(class_id, class_ids)
+    rows, confidence, class_id = rows[mask], confidence[mask], class_id[mask]
+
+    frame_w, frame_h = frame_size if frame_size is not None else (width, height)
+    boxes = rows[:, 3:7] * np.array([width, height, width, height], dtype=np.float32)
+    # Offsets may be tuples or numpy arrays
+    offset = np.tile(np.asarray(offset, dtype=float), 2).astype(np.int32)
+    boxes = boxes.astype(np.int32) + offset
+    np.clip(boxes[:, 0::2], 0, frame_w - 1, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, frame_h - 1, out=boxes[:, 1::2])
+
+    if nms_threshold is not None and len(boxes) > 1:
+        # Shift each class into its own coordinate range so NMS never mixes classes
+        shift = (class_id * (max(frame_w, frame_h) + 1))[:, None]
+        keep = non_max_suppression(boxes + shift, confidence, nms_threshold)
+    else:
+        keep = np.argsort(-confidence, kind="stable")
+
+    targets = np.empty(len(keep), dtype=TARGET_DTYPE)
+    targets["box"] = boxes[keep]
+    targets["center"][:, 0] = (boxes[keep, 0] + boxes[keep, 2]) // 2
+    targets["center"][:, 1] = (boxes[keep, 1] + boxes[keep, 3]) // 2
+    targets["confidence"] = confidence[keep]
+    targets["class_id"] = class_id[keep]
+    return targets
+
+
+def select_target(targets, policy="confidence", frame_size=None):
+    """
+    Picks the target to aim at.
+
+    Args:
+        targets (np.ndarray): TARGET_DTYPE array.
+        policy (str): "confidence" for the most confident target, "largest" for the
+            biggest box, or "center" for the target closest to the frame center.
+        frame_size (tuple): (width, height), required for the "center" policy.
+
+    Returns:
+        np.void: The chosen target row, or None if there are no targets.
+    """
+    if len(targets) == 0:
+        return None
+    if policy == "confidence":
+        index = np.argmax(targets["confidence"])
+    elif policy == "largest":
+        box = targets["box"]
+        index = np.argmax((box[:, 2] - box[:, 0]) * (box[:, 3] - box[:, 1]))
+    elif policy == "center":
+        middle = np.array(frame_size, dtype=np.float32) / 2
+        index = np.argmin(((targets["center"] - middle) ** 2).sum(axis=1))
+    else:
+        raise ValueError(f"Unknown target policy: {policy}")
+    return targets[index]
+
+
+def normalized_center(target, width, height):
+    """
+    Scales a target center to the 0-100 video space used by the calibration mesh.
+
+    Returns:
+        tuple: (x, y) in 0-100.
+    """
+    x = min(max(float(target["center"][0]) / width * 100, 0), 100)
+    y = min(max(float(target["center"][1]) / height * 100, 0), 100)
+    return x, y
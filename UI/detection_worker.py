@@ -0,0 +1,225 @@
+import multiprocessing
+import threading
+import time
+
+
+class DetectionWorker:
+    """
+    Runs a detector off the UI thread with a drop-stale-frame policy.
+
+    Frames are submitted into a single latest-frame slot, so a frame that is replaced
+    before a worker picks it up is dropped. Each worker always takes the newest
+    pending frame, and a result is only published if it belongs to a newer frame than
+    the last published one. Results are tagged with the sequence number of the frame
+    they were computed from.
+
+    With `mode="thread"` every worker thread builds its own detector. Detectors that
+    share one registry model still run their forward passes one at a time behind
+    the model's lock, so for `workers > 1` the factory must give each detector its
+    own model (e.g. AutoTargeter(shared_model=False)) to overlap inference. With
+    `mode="process"` every worker is a child process and `detector_factory` must be
+    picklable (a module-level function, class or functools.partial).
+    """
+
+    def __init__(
+        self,
+        detector_factory,
+        mode="thread",
+        workers=1,
+        method="process_image",
+        on_result=None,
+        pass_timestamp=False,
+    ):
+        """
+        Args:
+            detector_factory (callable): Builds a detector object.
+            mode (str): "thread" or "process".
+            workers (int): Number of worker threads or processes, i.e. frames that may
+                be in flight at once. See the class docstring for thread mode.
+            method (str): Name of the detector method called with each frame.
+            on_result (callable): Optional callback(seq, timestamp, result), called from the worker.
+            pass_timestamp (bool): Call the detector method with (frame, timestamp)
+                instead of (frame), e.g. to measure latency from capture.
+        """
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown detection worker mode: {mode}")
+        self.detector_factory = detector_factory
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.method = method
+        self.on_result = on_result
+        self.pass_timestamp = pass_timestamp
+
+        self._condition = threading.Condition()
+        self._pending = None  # (seq, timestamp, frame)
+        self._result = (0, None, None)  # (seq, timestamp, result)
+        self._running = False
+        self._threads = []
+        self._processes = []
+
+        # Counters
+        self.submitted = 0
+        self.dropped = 0
+        self.stale = 0
+        self.completed = 0
+
+    def start(self):
+        """
+        Starts the worker threads or processes.
+
+        Returns:
+            DetectionWorker: self.
+        """
+        self._running = True
+        for i in range(self.workers):
+            if self.mode == "thread":
+                target, args = self._thread_loop, ()
+            else:
+                parent_conn, child_conn = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=_process_main,
+                    args=(
+                        self.detector_factory,
+                        self.method,
+                        self.pass_timestamp,
+                        child_conn,
+                    ),
+                    name=f"DetectionWorker-{i}",
+                    daemon=True,
+                )
+                process.start()
+                self._processes.append((process, parent_conn))
+                target, args = self._dispatch_loop, (parent_conn,)
+            thread = threading.Thread(
+                target=target, args=args, name=f"DetectionWorker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, seq, frame, timestamp=None):
+        """
+        Offers a frame to the workers, replacing any frame still waiting.
+
+        Args:
+            seq (int): Sequence number of the frame.
+            frame (np.ndarray): The frame, treated as read-only.
+            timestamp (float): Capture time (time.monotonic), defaults to now.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        with self._condition:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (seq, timestamp, frame)
+            self.submitted += 1
+            self._condition.notify()
+
+    def latest_result(self):
+        """
+        Returns the newest published result without blocking.
+
+        Returns:
+            tuple: (seq, timestamp, result); seq is 0 until the first result.
+        """
+        with self._condition:
+            return self._result
+
+    def _take_frame(self):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._pending is not None or not self._running
+            )
+            if not self._running:
+                return None
+            pending, self._pending = self._pending, None
+            if pending[0] <= self._result[0]:
+                # A newer frame has already been published
+                self.stale += 1
+                return False
+            return pending
+
+    def _publish(self, seq, timestamp, result):
+        with self._condition:
+            if seq <= self._result[0]:
+                self.stale += 1
+                return
+            self._result = (seq, timestamp, result)
+            self.completed += 1
+        if self.on_result is not None:
+            self.on_result(seq, timestamp, result)
+
+    def _thread_loop(self):
+        detect = getattr(self.detector_factory(), self.method)
+        while True:
+            pending = self._take_frame()
+            if pending is None:
+                return
+            if pending is False:
+                continue
+            seq, timestamp, frame = pending
+            try:
+                if self.pass_timestamp:
+                    result = detect(frame, timestamp)
+                else:
+                    result = detect(frame)
+            except Exception as e:
+                print(f"Error during detection: {e}")
+                continue
+            self._publish(seq, timestamp, result)
+
+    def _dispatch_loop(self, conn):
+        while True:
+            pending = self._take_frame()
+            if pending is None:
+                return
+            if pending is False:
+                continue
+            seq, timestamp, frame = pending
+            try:
+                conn.send((seq, timestamp, frame))
+                seq, result = conn.recv()
+            except (EOFError, OSError) as e:
+                print(f"Detection process stopped: {e}")
+                return
+            if result is not None:
+                self._publish(seq, timestamp, result)
+
+    def stop(self):
+        """Stops all workers."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        for process, conn in self._processes:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        for process, conn in self._processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self._threads = []
+        self._processes = []
+
+
+def _process_main(detector_factory, method, pass_timestamp, conn):
+    detect = getattr(detector_factory(), method)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        # time.monotonic is system-wide, so capture times stay valid in the child
+        seq, timestamp, frame = message
+        try:
+            result = detect(frame, timestamp) if pass_timestamp else detect(frame)
+        except Exception as e:
+            print(f"Error during detection: {e}")
+            result = None
+        conn.send((seq, result))
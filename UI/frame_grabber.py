@@ -0,0 +1,120 @@
+import threading
+import time
+
+import cv2
+
+
+class FrameGrabber:
+    """
+    Reads frames from a cv2.VideoCapture on a background thread.
+
+    Only the newest frame is kept, together with its capture timestamp
+    (time.monotonic) and a sequence number, so consumers never block on the camera
+    and never work through stale buffered frames. Frames are shared between
+    consumers and must be treated as read-only.
+    """
+
+    def __init__(self, source=0, capture=None):
+        """
+        Args:
+            source (int or str): Camera index or video path passed to cv2.VideoCapture.
+            capture (cv2.VideoCapture): Already opened capture to read from instead of `source`.
+        """
+        self.source = source
+        self.cap = capture
+        self.ended = False
+        self._frame = None
+        self._timestamp = None
+        self._seq = 0
+        self._running = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def start(self):
+        """
+        Opens the capture if needed and starts the reader thread.
+
+        Returns:
+            FrameGrabber: self, so the grabber can be created and started in one line.
+        """
+        if self.cap is None:
+            self.cap = cv2.VideoCapture(self.source)
+            # Keep the driver queue as short as possible, we only want the newest frame
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if not self.cap.isOpened():
+            print(f"Error: Could not open video source {self.source}")
+            self.ended = True
+            return self
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="FrameGrabber", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            timestamp = time.monotonic()
+            with self._condition:
+                if not ret:
+                    # End of a video file or camera disconnected
+                    self.ended = True
+                    self._condition.notify_all()
+                    break
+                self._frame = frame
+                self._timestamp = timestamp
+                self._seq += 1
+                self._condition.notify_all()
+        self._running = False
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened() and not self.ended
+
+    @property
+    def fps(self):
+        """Frame rate reported by the capture device, or None if unknown."""
+        if self.cap is None:
+            return None
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        return fps if fps and fps > 0 else None
+
+    def latest(self):
+        """
+        Returns the newest frame without blocking.
+
+        Returns:
+            tuple: (seq, timestamp, frame); frame is None until the first frame arrives.
+        """
+        with self._condition:
+            return self._seq, self._timestamp, self._frame
+
+    def read(self, last_seq=0, timeout=None):
+        """
+        Waits for a frame newer than `last_seq`.
+
+        Args:
+            last_seq (int): Sequence number of the last frame the caller processed.
+            timeout (float): Maximum seconds to wait, None waits indefinitely.
+
+        Returns:
+            tuple: (seq, timestamp, frame); frame is None on timeout or end of stream.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._seq > last_seq or self.ended, timeout=timeout
+            )
+            if self._seq > last_seq:
+                return self._seq, self._timestamp, self._frame
+            return self._seq, None, None
+
+    def stop(self):
+        """Stops the reader thread and releases the capture."""
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        if self.cap is not None and self.cap.isOpened():
+            self.cap.release()
+        with self._condition:
+            self.ended = True
+            self._condition.notify_all()
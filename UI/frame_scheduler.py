@@ -0,0 +1,132 @@
+import time
+
+from metrics import metrics
+
+
+class FrameScheduler:
+    """
+    Runs a per-frame callback on the Tk event loop at the camera's frame rate.
+
+    Each tick is scheduled against a deadline one frame period after the start of
+    the previous one, so the time spent in the tick is subtracted from the wait
+    instead of added on top of it. A tick that finds no new frame polls again after
+    a few milliseconds, which keeps the loop aligned with frame arrivals. When the
+    loop falls behind, because the previous tick overran the budget or the frame
+    being handled was captured more than a period ago, should_render() tells the
+    callback to skip display-only work for that frame, so aiming keeps up with the
+    camera and only the picture is thinned out. Waiting for a camera that is slower
+    than the target rate never counts as being behind.
+    """
+
+    def __init__(
+        self,
+        root,
+        tick,
+        fps=None,
+        budget=None,
+        default_fps=30.0,
+        max_skipped_renders=2,
+        poll_interval=2,
+    ):
+        """
+        Args:
+            root (tk.Tk): Root window, used to schedule ticks.
+            tick (callable): Called every tick, returns True if it handled a new frame.
+            fps (float): Target frame rate, typically the camera's. Defaults to `default_fps`.
+            budget (float): Seconds a tick may take before the loop counts as behind,
+                defaults to one frame period.
+            default_fps (float): Frame rate used when `fps` is unknown.
+            max_skipped_renders (int): Consecutive frames that may skip rendering,
+                so the picture never freezes completely.
+            poll_interval (int): Milliseconds to wait before polling again when
+                there was no new frame.
+        """
+        self.root = root
+        self.tick = tick
+        self.fps = fps or default_fps
+        self.period = 1.0 / self.fps
+        self.budget = budget or self.period
+        self.max_skipped_renders = max_skipped_renders
+        self.poll_interval = poll_interval
+
+        self.behind = False
+        self.last_duration = 0.0
+        self.frames_handled = 0
+        self.frames_dropped = 0
+        self.renders_skipped = 0
+        self._consecutive_skips = 0
+        self._last_seq = None
+        self._deadline = None
+        self._after_id = None
+
+    def start(self):
+        """
+        Runs the first tick immediately.
+
+        Returns:
+            FrameScheduler: self.
+        """
+        self._deadline = time.perf_counter()
+        self._run()
+        return self
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def frame_seen(self, seq, timestamp=None):
+        """
+        Records the frame being handled and decides whether the loop is behind.
+
+        Gaps in the sequence are frames the camera delivered that this loop never
+        got to, they are counted as dropped.
+
+        Args:
+            seq (int): Frame sequence number.
+            timestamp (float): Capture time (time.monotonic), None to judge only by
+                the previous tick's duration.
+        """
+        late = timestamp is not None and time.monotonic() - timestamp > self.period
+        self.behind = late or self.last_duration > self.budget
+        if self._last_seq is not None and seq > self._last_seq + 1:
+            dropped = seq - self._last_seq - 1
+            self.frames_dropped += dropped
+            metrics.increment("frames_dropped", dropped)
+        self._last_seq = seq
+
+    def should_render(self):
+        """
+        Returns:
+            bool: False if display-only work should be skipped for the current frame.
+        """
+        if self.behind and self._consecutive_skips < self.max_skipped_renders:
+            self._consecutive_skips += 1
+            self.renders_skipped += 1
+            metrics.increment("renders_skipped")
+            return False
+        self._consecutive_skips = 0
+        return True
+
+    def _run(self):
+        start = time.perf_counter()
+        handled = self.tick()
+        end = time.perf_counter()
+
+        if handled:
+            self.last_duration = end - start
+            self.frames_handled += 1
+            metrics.observe("tick", self.last_duration)
+            self._deadline = start + self.period
+            delay = max(1, int((self._deadline - end) * 1000))
+        else:
+            # Nothing new yet, keep the deadline and check back shortly
+            delay = self.poll_interval
+        self._after_id = self.root.after(delay, self._run)
+
+    def format_stats(self):
+        """Formats the frame counters for display."""
+        return (
+            f"target {self.fps:.0f} fps, dropped {self.frames_dropped},"
+            f" renders skipped {self.renders_skipped}"
+        )
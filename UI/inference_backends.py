@@ -0,0 +1,147 @@
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+CAFFE_PROTOTXT = "UI/model_data/MobileNetSSD_deploy.prototxt"
+CAFFE_WEIGHTS = "UI/model_data/MobileNetSSD_deploy.caffemodel"
+# ONNX exports of the same network. They are not shipped, and this repository
+# cannot produce them: the Caffe model ends in an SSD DetectionOutput layer, which
+# the usual Caffe -> ONNX converters do not export, so a plain conversion only
+# yields the raw box and class tensors. Supply an export that already includes the
+# box decoding and NMS and outputs the Caffe (1, 1, N, 7) rows, e.g. one made from
+# the framework the network was trained in, as ONNX_MODEL. The INT8 model is then
+# made from it with `python UI/inference_backends.py quantize`.
+ONNX_MODEL = "UI/model_data/MobileNetSSD_deploy.onnx"
+INT8_MODEL = "UI/model_data/MobileNetSSD_deploy.int8.onnx"
+
+
+class InferenceBackend:
+    """
+    Runs the detector network on a preprocessed blob.
+
+    Every backend takes the (1, 3, 300, 300) float32 blob built by
+    cv2.dnn.blobFromImage and returns SSD detections shaped (1, 1, N, 7), so
+    detection.postprocess_detections works unchanged on any of them.
+    """
+
+    name = "base"
+
+    def forward(self, blob):
+        raise NotImplementedError
+
+
+class OpenCVBackend(InferenceBackend):
+    """The Caffe model through OpenCV DNN on the CPU."""
+
+    name = "opencv"
+
+    def __init__(self, prototxt=CAFFE_PROTOTXT, weights=CAFFE_WEIGHTS, threads=None):
+        """
+        Args:
+            prototxt (str): Caffe network definition.
+            weights (str): Caffe weights.
+            threads (int): OpenCV worker threads. This setting is process-wide.
+        """
+        if threads is not None:
+            cv2.setNumThreads(threads)
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, weights)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_DEFAULT)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def forward(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward()
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """An ONNX export of the model through ONNX Runtime on the CPU."""
+
+    name = "onnx"
+
+    def __init__(self, model_path=ONNX_MODEL, threads=None):
+        """
+        Args:
+            model_path (str): ONNX model, float or INT8-quantized.
+            threads (int): Intra-op threads for this session, None lets ONNX Runtime decide.
+        """
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"{model_path} not found, see the note on ONNX_MODEL in"
+                " inference_backends.py"
+            )
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError(
+                "The onnx backends need onnxruntime, install it with `pip install onnxruntime`"
+            )
+        options = onnxruntime.SessionOptions()
+        if threads is not None:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def forward(self, blob):
+        detections = self.session.run(None, {self.input_name: blob})[0]
+        return np.asarray(detections).reshape(1, 1, -1, 7)
+
+
+class Int8Backend(OnnxRuntimeBackend):
+    """The INT8-quantized ONNX export through ONNX Runtime."""
+
+    name = "int8"
+
+    def __init__(self, model_path=INT8_MODEL, threads=None):
+        super().__init__(model_path, threads)
+
+
+BACKENDS = {
+    backend.name: backend for backend in (OpenCVBackend, OnnxRuntimeBackend, Int8Backend)
+}
+
+
+def make_backend(name, threads=None):
+    """
+    Builds an inference backend by name.
+
+    Args:
+        name (str): One of BACKENDS.
+        threads (int): Thread count passed to the backend.
+
+    Returns:
+        InferenceBackend: The backend.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name}")
+    return BACKENDS[name](threads=threads)
+
+
+def quantize_onnx_model(source=ONNX_MODEL, destination=INT8_MODEL):
+    """
+    Writes an INT8 dynamically quantized copy of an ONNX model.
+
+    Args:
+        source (str): Float ONNX model.
+        destination (str): Path of the quantized model.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(source, destination, weight_type=QuantType.QInt8)
+    print(f"Saved quantized model to {destination}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inference backend utilities")
+    parser.add_argument("command", choices=["quantize"])
+    parser.add_argument("--source", default=ONNX_MODEL)
+    parser.add_argument("--destination", default=INT8_MODEL)
+    args = parser.parse_args()
+    quantize_onnx_model(args.source, args.destination)
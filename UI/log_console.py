@@ -0,0 +1,153 @@
+import collections
+import queue
+import threading
+import time
+import tkinter as tk
+
+
+class LogConsole:
+    """
+    Bounded, batched log sink for a Tk text widget.
+
+    Messages are collected in a fixed-size ring buffer and written to the widget in
+    one insert a few times per second, and the widget is trimmed to `max_lines`, so
+    logging costs the same at the end of an all-day session as at the start.
+    Consecutive identical messages are collapsed into one line with a count, and
+    messages logged with a `key` replace the pending message with the same key, so
+    a 30 Hz status message shows up at most once per flush. log() is thread-safe.
+    Every message can also be mirrored to a file from a background thread.
+    """
+
+    def __init__(
+        self,
+        root,
+        widget,
+        capacity=1000,
+        max_lines=500,
+        flush_interval=250,
+        mirror_path=None,
+    ):
+        """
+        Args:
+            root (tk.Tk): Root window, used to schedule flushes.
+            widget (tk.Text): Text widget the messages are shown in.
+            capacity (int): Messages buffered between flushes, older ones are dropped.
+            max_lines (int): Lines kept in the widget.
+            flush_interval (int): Milliseconds between flushes.
+            mirror_path (str): Optional file every message is appended to.
+        """
+        self.root = root
+        self.widget = widget
+        self.max_lines = max_lines
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pending = collections.deque(maxlen=capacity)  # [message, count, key]
+        self._keyed = {}
+        self._dropped_pending = 0
+        self._after_id = None
+
+        self._mirror_queue = None
+        self._mirror_thread = None
+        if mirror_path is not None:
+            self._mirror_queue = queue.Queue()
+            self._mirror_thread = threading.Thread(
+                target=self._mirror_loop,
+                args=(mirror_path,),
+                name="LogConsoleMirror",
+                daemon=True,
+            )
+            self._mirror_thread.start()
+
+    def start(self):
+        """
+        Starts the periodic flush.
+
+        Returns:
+            LogConsole: self.
+        """
+        self._after_id = self.root.after(self.flush_interval, self._flush_loop)
+        return self
+
+    def log(self, message, key=None):
+        """
+        Queues a message for the widget.
+
+        Args:
+            message (str): One line of text, without a trailing newline.
+            key (str): Optional key; a newer message with the same key replaces this
+                one if it has not been shown yet.
+        """
+        if self._mirror_queue is not None:
+            self._mirror_queue.put((time.time(), message))
+        with self._lock:
+            if key is not None and key in self._keyed:
+                entry = self._keyed[key]
+                entry[0] = message
+                entry[1] += 1
+                return
+            if key is None and self._pending:
+                last = self._pending[-1]
+                if last[2] is None and last[0] == message:
+                    last[1] += 1
+                    return
+            if len(self._pending) == self._pending.maxlen:
+                evicted = self._pending[0]
+                if evicted[2] is not None:
+                    del self._keyed[evicted[2]]
+                self._dropped_pending += 1
+                self.dropped += 1
+            entry = [message, 1, key]
+            self._pending.append(entry)
+            if key is not None:
+                self._keyed[key] = entry
+
+    def _flush_loop(self):
+        self.flush()
+        self._after_id = self.root.after(self.flush_interval, self._flush_loop)
+
+    def flush(self):
+        """Writes the pending messages to the widget. Must run on the Tk thread."""
+        with self._lock:
+            entries = list(self._pending)
+            self._pending.clear()
+            self._keyed.clear()
+            dropped, self._dropped_pending = self._dropped_pending, 0
+        if not entries and not dropped:
+            return
+
+        lines = [f"... {dropped} messages dropped"] if dropped else []
+        for message, count, key in entries:
+            # Keyed messages only show the latest value
+            if count > 1 and key is None:
+                message = f"{message} (x{count})"
+            lines.append(message)
+        self.widget.insert(tk.END, "\n".join(lines) + "\n")
+
+        # The text always ends with a newline, so the last line is empty
+        line_count = int(self.widget.index("end-1c").split(".")[0]) - 1
+        if line_count > self.max_lines:
+            self.widget.delete("1.0", f"{line_count - self.max_lines + 1}.0")
+        self.widget.see(tk.END)
+
+    def _mirror_loop(self, path):
+        with open(path, "a") as f:
+            while True:
+                item = self._mirror_queue.get()
+                if item is None:
+                    break
+                timestamp, message = item
+                stamp = time.strftime("%H:%M:%S", time.localtime(timestamp))
+                f.write(f"{stamp} {message}\n")
+                if self._mirror_queue.empty():
+                    f.flush()
+
+    def stop(self):
+        """Stops flushing and closes the mirror file."""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        if self._mirror_thread is not None:
+            self._mirror_queue.put(None)
+            self._mirror_thread.join(timeout=1.0)
+            self._mirror_thread = None
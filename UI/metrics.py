@@ -0,0 +1,199 @@
+import collections
+import http.server
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class _NullTimer:
+    # Shared do-nothing timer handed out while metrics are disabled
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """Rolling window of durations, plus lifetime count and sum."""
+
+    def __init__(self, window=500):
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def percentiles(self, quantiles=(50, 95, 99)):
+        """
+        Returns:
+            list: Percentiles of the rolling window in milliseconds, None if it is empty.
+        """
+        if not self.samples:
+            return [None] * len(quantiles)
+        return list(np.percentile(np.array(self.samples) * 1000, quantiles))
+
+
+class Metrics:
+    """
+    Monotonic stage timers, counters and rolling histograms.
+
+    Stages are timed with `with metrics.timer("forward"):` and events counted with
+    increment(). While disabled, timer() returns a shared no-op context manager and
+    observe()/increment() return immediately, so instrumented code costs almost
+    nothing. Metrics are per process; detection workers in process mode keep their
+    own.
+    """
+
+    def __init__(self, enabled=False, window=500):
+        """
+        Args:
+            enabled (bool): Record anything at all.
+            window (int): Samples kept per histogram for the percentiles.
+        """
+        self.enabled = enabled
+        self.window = window
+        self.histograms = {}
+        self.counters = collections.Counter()
+        self._lock = threading.Lock()
+        self._export_thread = None
+        self._stop_export = threading.Event()
+        self._http_server = None
+
+    def timer(self, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.window)
+            histogram.observe(seconds)
+
+    def increment(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += value
+
+    def summary(self, name):
+        """
+        Returns:
+            list: [p50, p95, p99] in milliseconds for a stage, Nones if it has no samples.
+        """
+        with self._lock:
+            histogram = self.histograms.get(name)
+            return histogram.percentiles() if histogram is not None else [None] * 3
+
+    def prometheus_text(self):
+        """Renders every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE turret_{name}_total counter")
+                lines.append(f"turret_{name}_total {value}")
+            for name, histogram in sorted(self.histograms.items()):
+                metric = f"turret_{name}_seconds"
+                lines.append(f"# TYPE {metric} summary")
+                for quantile, value in zip(
+                    ("0.5", "0.95", "0.99"), histogram.percentiles()
+                ):
+                    if value is not None:
+                        lines.append(
+                            f'{metric}{{quantile="{quantile}"}} {value / 1000:.6f}'
+                        )
+                lines.append(f"{metric}_sum {histogram.total:.6f}")
+                lines.append(f"{metric}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes prometheus_text() to a file atomically, e.g. for a textfile collector."""
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def start_export(self, path=None, interval=5.0, port=None):
+        """
+        Starts exporting the metrics.
+
+        Args:
+            path (str): Text file rewritten every `interval` seconds.
+            interval (float): Seconds between file exports.
+            port (int): Serve /metrics over HTTP on 127.0.0.1 on this port.
+        """
+        if path is not None and self._export_thread is None:
+
+            def export_loop():
+                while not self._stop_export.wait(interval):
+                    try:
+                        self.write_prometheus(path)
+                    except OSError as e:
+                        print(f"Error writing metrics to {path}: {e}")
+
+            self._export_thread = threading.Thread(
+                target=export_loop, name="MetricsExport", daemon=True
+            )
+            self._export_thread.start()
+
+        if port is not None and self._http_server is None:
+            metrics = self
+
+            class Handler(http.server.BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = metrics.prometheus_text().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self._http_server = http.server.ThreadingHTTPServer(
+                ("127.0.0.1", port), Handler
+            )
+            threading.Thread(
+                target=self._http_server.serve_forever, name="MetricsHTTP", daemon=True
+            ).start()
+            port = self._http_server.server_address[1]
+            print(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+
+    def stop_export(self):
+        self._stop_export.set()
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+
+
+# Process-wide metrics, enabled by the UI
+metrics = Metrics()
@@ -0,0 +1,206 @@
+import functools
+import threading
+import time
+
+import cv2
+import inference_backends
+import numpy as np
+
+
+class SsdModel:
+    """A loaded MobileNet-SSD inference backend with its class names."""
+
+    def __init__(self, backend, class_names):
+        self.backend = backend
+        self.class_names = class_names
+        # Inference sessions are not safe for concurrent forward passes, consumers
+        # sharing this instance go through forward(), which holds the lock
+        self.lock = threading.Lock()
+
+    def forward(self, blob):
+        with self.lock:
+            return self.backend.forward(blob)
+
+
+def load_mobilenet_ssd(backend="opencv", threads=None):
+    """
+    Loads MobileNet-SSD on an inference backend, with its class names.
+
+    Args:
+        backend (str): Backend name, see inference_backends.BACKENDS.
+        threads (int): Thread count for the backend.
+
+    Returns:
+        SsdModel: The loaded model.
+    """
+    # Load class names for PASCAL VOC
+    with open("UI/model_data/coco.names", "r") as f:
+        class_names = [line.strip() for line in f.readlines()]
+
+    return SsdModel(inference_backends.make_backend(backend, threads), class_names)
+
+
+def warm_up_ssd(model, runs=3):
+    """
+    Runs a few inferences so the first real frame does not pay for lazy allocations.
+
+    Args:
+        model (SsdModel): The model to warm up.
+        runs (int): Number of forward passes.
+    """
+    frame = np.zeros((300, 300, 3), dtype=np.uint8)
+    blob = cv2.dnn.blobFromImage(frame, 0.007843, (300, 300), 127.5)
+    for _ in range(runs):
+        model.forward(blob)
+
+
+class ModelRegistry:
+    """
+    Process-wide registry that loads each model once and shares it.
+
+    Models are registered with a loader and an optional warm-up function. They are
+    loaded on first use, or ahead of time in the background with preload(), and
+    every consumer gets the same instance. Consumers that need to run forward
+    passes in parallel ask for a private instance with get(name, shared=False).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def register(self, name, loader, warmup=None):
+        """
+        Registers a model.
+
+        Args:
+            name (str): Name consumers use to get the model.
+            loader (callable): Returns the loaded model.
+            warmup (callable): Optional function called with the loaded model.
+        """
+        with self._lock:
+            self._entries[name] = {
+                "loader": loader,
+                "warmup": warmup,
+                "model": None,
+                "error": None,
+                "ready": threading.Event(),
+                "loading": False,
+            }
+
+    def _load(self, name):
+        entry = self._entries[name]
+        start = time.monotonic()
+        try:
+            model = entry["loader"]()
+            if entry["warmup"] is not None:
+                entry["warmup"](model)
+            entry["model"] = model
+            print(f"Loaded model {name} in {time.monotonic() - start:.2f}s")
+        except Exception as e:
+            print(f"Error loading model {name}: {e}")
+            entry["error"] = e
+        finally:
+            entry["ready"].set()
+
+    def _claim(self, name):
+        # Returns True if the caller should load the model itself
+        with self._lock:
+            if name not in self._entries:
+                raise KeyError(f"Unknown model: {name}")
+            entry = self._entries[name]
+            if entry["loading"] and entry["error"] is None:
+                return False
+            # First load, or a retry after a failed one
+            entry["loading"] = True
+            entry["error"] = None
+            entry["ready"].clear()
+            return True
+
+    def preload(self, names=None):
+        """
+        Loads and warms up models on a background thread.
+
+        Args:
+            names (list): Models to load, defaults to every registered model.
+
+        Returns:
+            threading.Thread: The loading thread.
+        """
+        names = list(self._entries) if names is None else names
+        names = [name for name in names if self._claim(name)]
+        thread = threading.Thread(
+            target=lambda: [self._load(name) for name in names],
+            name="ModelRegistry",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def is_ready(self, name):
+        entry = self._entries.get(name)
+        return entry is not None and entry["ready"].is_set()
+
+    def get(self, name, timeout=None, shared=True):
+        """
+        Returns the shared instance of a model, loading it if needed.
+
+        Args:
+            name (str): Registered model name.
+            timeout (float): Maximum seconds to wait for a background load.
+            shared (bool): False loads and warms up a new instance for the caller
+                alone, so its forward passes do not wait on other consumers' lock.
+
+        Returns:
+            The loaded model.
+
+        Raises:
+            KeyError: If the model is not registered.
+            TimeoutError: If the model is still loading after `timeout`.
+            RuntimeError: If the model failed to load.
+        """
+        if not shared:
+            with self._lock:
+                if name not in self._entries:
+                    raise KeyError(f"Unknown model: {name}")
+                entry = self._entries[name]
+            try:
+                model = entry["loader"]()
+                if entry["warmup"] is not None:
+                    entry["warmup"](model)
+            except Exception as e:
+                raise RuntimeError(f"Model {name} failed to load: {e}")
+            return model
+        if self._claim(name):
+            self._load(name)
+        entry = self._entries[name]
+        if not entry["ready"].wait(timeout):
+            raise TimeoutError(f"Model {name} is still loading")
+        if entry["error"] is not None:
+            raise RuntimeError(f"Model {name} failed to load: {entry['error']}")
+        return entry["model"]
+
+
+def register_ssd_models(registry, threads=None):
+    """
+    Registers MobileNet-SSD on every inference backend.
+
+    Call it again with a thread count before the models are first loaded to
+    configure them, e.g. from the UI settings.
+
+    Args:
+        registry (ModelRegistry): Registry to add the models to.
+        threads (int): Thread count for the backends, None for their default.
+    """
+    for name, backend in (
+        ("mobilenet_ssd", "opencv"),
+        ("mobilenet_ssd_onnx", "onnx"),
+        ("mobilenet_ssd_int8", "int8"),
+    ):
+        registry.register(
+            name, functools.partial(load_mobilenet_ssd, backend, threads), warm_up_ssd
+        )
+
+
+# Shared registry, every consumer in the process gets its models from here
+registry = ModelRegistry()
+register_ssd_models(registry)
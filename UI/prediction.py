@@ -0,0 +1,139 @@
+import numpy as np
+
+
+class LeadPredictor:
+    """
+    Aims ahead of a moving target to make up for the pipeline and servo latency.
+
+    The tracker's velocity is in pixels per processed frame; it is turned into a
+    rate per second with the measured interval between processed frames. The
+    lead time is the measured capture-to-decision latency plus the command latency
+    plus the time the servo needs to slew to the aim point, on the same velocity and
+    acceleration limited profile the servo control loop follows. Since the slew time
+    depends on the aim point, the two are refined together for a few iterations.
+    """
+
+    def __init__(
+        self,
+        command_latency=0.02,
+        max_velocity=(300.0, 200.0),
+        max_acceleration=(1500.0, 1000.0),
+        max_lead=0.5,
+        min_hits=3,
+        smoothing=0.2,
+        iterations=2,
+    ):
+        """
+        Args:
+            command_latency (float): Seconds from sending a command until the servo
+                starts moving, about half the command round-trip time.
+            max_velocity (tuple): (x, y) servo velocity limits in degrees per second.
+            max_acceleration (tuple): (x, y) servo acceleration limits in degrees
+                per second squared.
+            max_lead (float): Longest lead in seconds, guards against bad velocities.
+            min_hits (int): Detections a track needs before its velocity is trusted.
+            smoothing (float): Weight of the newest sample in the latency and frame
+                interval moving averages.
+            iterations (int): Refinements of the lead time for the slew time.
+        """
+        self.command_latency = command_latency
+        self.max_velocity = np.array(max_velocity, dtype=float)
+        self.max_acceleration = np.array(max_acceleration, dtype=float)
+        self.max_lead = max_lead
+        self.min_hits = min_hits
+        self.smoothing = smoothing
+        self.iterations = iterations
+
+        # Moving averages in seconds, None until measured
+        self.pipeline_latency = None
+        self.frame_interval = None
+        self._last_capture_time = None
+
+    def _average(self, average, sample):
+        if average is None:
+            return sample
+        return average + self.smoothing * (sample - average)
+
+    def observe_frame(self, capture_time, now):
+        """
+        Updates the timing estimates with one processed frame.
+
+        Args:
+            capture_time (float): When the frame was captured (time.monotonic).
+            now (float): When the aim point is being decided (time.monotonic).
+        """
+        self.pipeline_latency = self._average(self.pipeline_latency, now - capture_time)
+        if self._last_capture_time is not None:
+            interval = capture_time - self._last_capture_time
+            # A long pause (auto targeting idle, stream hiccup) says nothing about
+            # the frame rate
+            if 0 < interval < 1.0:
+                self.frame_interval = self._average(self.frame_interval, interval)
+        self._last_capture_time = capture_time
+
+    def travel_time(self, servo_from, servo_to):
+        """
+        Seconds the servo needs to slew between two (x, y) positions from rest, with
+        a trapezoidal velocity profile per axis. Axes with a None value are ignored.
+        """
+        if servo_from is None or servo_to[0] is None:
+            return 0.0
+        longest = 0.0
+        for axis in (0, 1):
+            if servo_from[axis] is None or servo_to[axis] is None:
+                continue
+            distance = abs(servo_to[axis] - servo_from[axis])
+            velocity = self.max_velocity[axis]
+            acceleration = self.max_acceleration[axis]
+            if distance < velocity**2 / acceleration:
+                # Triangular profile, never reaches the velocity limit
+                axis_time = 2 * np.sqrt(distance / acceleration)
+            else:
+                axis_time = distance / velocity + velocity / acceleration
+            longest = max(longest, axis_time)
+        return float(longest)
+
+    def predict(self, video_xy, track, frame_size, to_servo, servo_position=None):
+        """
+        Computes the aim point for a target.
+
+        Args:
+            video_xy (tuple): Target center normalized to 0-100.
+            track (tracking.KalmanBoxTrack): The target's track, None if unknown.
+            frame_size (tuple): (width, height) of the frame in pixels.
+            to_servo (callable): Maps a normalized video point to servo (x, y).
+            servo_position (tuple): Current commanded servo (x, y), None if unknown.
+
+        Returns:
+            tuple: (video_x, video_y, servo_x, servo_y, lead) with the video point
+                normalized to 0-100 and the lead in seconds. Without a usable
+                velocity this is the target center with no lead.
+        """
+        video_x, video_y = video_xy
+        servo_x, servo_y = to_servo(video_x, video_y)
+        if (
+            track is None
+            or track.hits < self.min_hits
+            or self.frame_interval is None
+            or self.pipeline_latency is None
+        ):
+            return video_x, video_y, servo_x, servo_y, 0.0
+
+        # Normalized units per second
+        w, h = frame_size
+        velocity = track.velocity / self.frame_interval / (w, h) * 100
+        aim, lead = (video_x, video_y, servo_x, servo_y), 0.0
+        for _ in range(self.iterations):
+            candidate_lead = min(
+                self.pipeline_latency
+                + self.command_latency
+                + self.travel_time(servo_position, aim[2:]),
+                self.max_lead,
+            )
+            x, y = np.clip(np.array(video_xy) + velocity * candidate_lead, 0, 100)
+            servo = to_servo(x, y)
+            if servo[0] is None:
+                # Leading off the calibrated area, keep the last usable aim point
+                break
+            aim, lead = (float(x), float(y)) + tuple(servo), candidate_lead
+        return aim + (lead,)
@@ -0,0 +1,152 @@
+import threading
+import time
+
+import numpy as np
+
+
+class ServoControlLoop:
+    """
+    Fixed-rate control loop between aim producers and the turret.
+
+    Producers (auto targeting, mouse, keyboard) only move the setpoint, through
+    ArduinoController.update_position while the loop is attached. The loop thread
+    runs at `rate` Hz and moves the commanded position towards the setpoint with a
+    trapezoidal profile, limiting velocity and acceleration per axis, and sends the
+    intermediate positions through the controller. Command traffic is therefore at
+    most `rate` positions per second however often the setpoint changes, nothing is
+    sent once the turret has settled, and the servos never jump across the range in
+    one step.
+    """
+
+    def __init__(
+        self,
+        controller,
+        rate=None,
+        max_velocity=(300.0, 200.0),
+        max_acceleration=(1500.0, 1000.0),
+        resolution=0.1,
+    ):
+        """
+        Args:
+            controller (command_ui.ArduinoController): Controller the positions are sent through.
+            rate (float): Loop frequency in Hz, defaults to the controller's max_rate or 50.
+            max_velocity (tuple): (x, y) velocity limits in degrees per second.
+            max_acceleration (tuple): (x, y) acceleration limits in degrees per second squared.
+            resolution (float): Positions are rounded to this many degrees, and only
+                sent when the rounded value changes.
+        """
+        self.controller = controller
+        self.rate = rate or controller.max_rate or 50
+        self.period = 1.0 / self.rate
+        self.max_velocity = np.array(max_velocity, dtype=float)
+        self.max_acceleration = np.array(max_acceleration, dtype=float)
+        self.resolution = resolution
+
+        # Start from the position the controller last commanded
+        self.position = np.array([controller.x_pos, controller.y_pos], dtype=float)
+        self.lower = np.array([controller.x_min, controller.y_min], dtype=float)
+        self.upper = np.array([controller.x_max, controller.y_max], dtype=float)
+        self.velocity = np.zeros(2)
+        self.target = self.position.copy()
+        self.commands_sent = 0
+        self.overruns = 0
+        self._last_sent = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Attaches the loop to the controller and starts the loop thread.
+
+        Returns:
+            ServoControlLoop: self.
+        """
+        self.controller.control_loop = self
+        self._thread = threading.Thread(
+            target=self._run, name="ServoControlLoop", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def set_target(self, x, y):
+        """Moves the setpoint, thread-safe. The latest setpoint wins."""
+        with self._lock:
+            self.target = np.clip(np.array([x, y], dtype=float), self.lower, self.upper)
+
+    def current_position(self):
+        """
+        Returns:
+            tuple: The commanded (x, y) position, thread-safe.
+        """
+        with self._lock:
+            return float(self.position[0]), float(self.position[1])
+
+    @property
+    def settled(self):
+        """True once the commanded position has reached the setpoint."""
+        with self._lock:
+            return bool(
+                np.array_equal(self.position, self.target) and not self.velocity.any()
+            )
+
+    def step(self, dt):
+        """
+        Advances the trajectory by `dt` seconds.
+
+        Returns:
+            np.ndarray: The new commanded (x, y) position.
+        """
+        with self._lock:
+            target = self.target
+        error = target - self.position
+        max_change = self.max_acceleration * dt
+        # Close and slow enough to stop on the target within this step
+        arrived = (np.abs(error) <= max_change * dt) & (
+            np.abs(self.velocity) <= max_change
+        )
+        # Fastest speed from which the axis can still stop at the target, braking by
+        # max_change every step
+        stopping_speed = max_change * (
+            np.sqrt(0.25 + 2 * np.abs(error) / (max_change * dt)) - 0.5
+        )
+        desired = np.sign(error) * np.minimum(stopping_speed, self.max_velocity)
+        self.velocity += np.clip(desired - self.velocity, -max_change, max_change)
+        position = self.position + self.velocity * dt
+        # Never pass the target in the direction of travel, the float braking
+        # profile can leave a fraction of a degree of overshoot on the last step
+        passed = arrived | (np.sign(target - position) == -np.sign(error))
+        position[passed] = target[passed]
+        self.velocity[passed] = 0.0
+        # Nor leave the servo range, even in between
+        limited = (position < self.lower) | (position > self.upper)
+        position = np.clip(position, self.lower, self.upper)
+        self.velocity[limited] = 0.0
+        with self._lock:
+            self.position = position
+        return position
+
+    def _run(self):
+        next_time = time.monotonic()
+        while not self._stop.wait(max(0.0, next_time - time.monotonic())):
+            next_time += self.period
+            now = time.monotonic()
+            if now - next_time > self.period:
+                # Fell more than a tick behind, skip ahead instead of bursting
+                self.overruns += 1
+                next_time = now + self.period
+            x, y = np.round(self.step(self.period) / self.resolution) * self.resolution
+            position = (round(float(x), 2), round(float(y), 2))
+            if position != self._last_sent:
+                self._last_sent = position
+                self.controller.send_position(*position)
+                self.commands_sent += 1
+
+    def stop(self):
+        """Stops the loop thread and detaches it from the controller."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if self.controller.control_loop is self:
+            self.controller.control_loop = None
@@ -0,0 +1,361 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+import auto_targeting_ui
+import cv2
+import detection
+import numpy as np
+import tracking
+
+SESSIONS_DIR = "UI/sessions"
+VIDEO_NAME = "frames.avi"
+EVENTS_NAME = "events.jsonl"
+
+
+def _to_json(value):
+    # Structured target arrays and numpy scalars become plain lists and numbers
+    if isinstance(value, np.ndarray):
+        if value.dtype.names:
+            return [
+                {name: _to_json(row[name]) for name in value.dtype.names}
+                for row in value
+            ]
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: _to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    return value
+
+
+class SessionRecorder:
+    """
+    Records a targeting session to disk from a background writer thread.
+
+    Frames go into a video file and everything else (frame index, detections,
+    calibration mapping outputs and turret commands) into a JSON lines event log.
+    Every event carries `t`, seconds on the time.monotonic clock relative to the start
+    of the recording, so frames and commands can be lined up exactly. The record_*
+    methods only enqueue and never block the caller; if the writer falls behind,
+    frames are dropped and counted rather than stalling the UI.
+    """
+
+    def __init__(self, path=None, fps=30.0, fourcc="MJPG", max_pending_frames=60):
+        """
+        Args:
+            path (str): Session directory, a timestamped one in SESSIONS_DIR if None.
+            fps (float): Nominal frame rate stored in the video header.
+            fourcc (str): Video codec, "FFV1" stores frames losslessly for exact replays.
+            max_pending_frames (int): Frames that may wait for the writer before new
+                ones are dropped. Other events are small and never dropped.
+        """
+        if path is None:
+            path = os.path.join(SESSIONS_DIR, time.strftime("%Y%m%d-%H%M%S"))
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.start_time = None
+        self.frames_written = 0
+        self.dropped_frames = 0
+        self._frame_slots = threading.BoundedSemaphore(max_pending_frames)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._writer = None
+        self._events = None
+
+    def start(self):
+        """
+        Creates the session directory and starts the writer thread.
+
+        Returns:
+            SessionRecorder: self.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        self._events = open(os.path.join(self.path, EVENTS_NAME), "w")
+        self.start_time = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._write_loop, name="SessionRecorder", daemon=True
+        )
+        self._thread.start()
+        self._put(
+            {"type": "session", "t": 0.0, "fps": self.fps, "wall_time": time.time()}
+        )
+        print(f"Recording session to {self.path}")
+        return self
+
+    @property
+    def recording(self):
+        return self._thread is not None
+
+    def _t(self, timestamp=None):
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        return timestamp - self.start_time
+
+    def _put(self, item):
+        if self.recording:
+            self._queue.put(item)
+
+    def record_frame(self, seq, frame, timestamp=None):
+        """
+        Args:
+            seq (int): Frame sequence number, used to match detections to frames.
+            frame (numpy.ndarray): BGR frame. It is written later and must not be
+                modified afterwards; FrameGrabber frames never are.
+            timestamp (float): Capture time from time.monotonic, now if None.
+        """
+        if not self.recording:
+            return
+        if not self._frame_slots.acquire(blocking=False):
+            self.dropped_frames += 1
+            return
+        self._put(("frame", self._t(timestamp), seq, frame))
+
+    def record_detections(
+        self, seq, targets, timestamp=None, decision_time=None, servo_from=None
+    ):
+        """
+        Records the result of one frame the detector processed.
+
+        Args:
+            seq (int): Sequence number of the frame the detections came from.
+            targets (numpy.ndarray): detection.TARGET_DTYPE or tracking.TRACK_DTYPE rows.
+            timestamp (float): Time from time.monotonic, now if None.
+            decision_time (float): When the aim point was decided (time.monotonic),
+                None if there was no lead prediction.
+            servo_from (tuple): Servo position the lead was measured from.
+        """
+        self._put(
+            {
+                "type": "detections",
+                "t": self._t(timestamp),
+                "seq": seq,
+                "targets": targets,
+                "decided": None if decision_time is None else self._t(decision_time),
+                "servo_from": servo_from,
+            }
+        )
+
+    def record_mapping(self, seq, video_xy, servo_xy, timestamp=None):
+        """
+        Args:
+            seq (int): Sequence number of the frame the target came from.
+            video_xy (tuple): Target position on the 0-100 video scale.
+            servo_xy (tuple): Servo positions the calibration mapped it to.
+            timestamp (float): Time from time.monotonic, now if None.
+        """
+        self._put(
+            {
+                "type": "mapping",
+                "t": self._t(timestamp),
+                "seq": seq,
+                "video": video_xy,
+                "servo": servo_xy,
+            }
+        )
+
+    def record_command(self, command, timestamp=None):
+        self._put({"type": "command", "t": self._t(timestamp), "command": command})
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if isinstance(item, tuple):
+                _, t, seq, frame = item
+                self._write_frame(frame)
+                self._frame_slots.release()
+                item = {"type": "frame", "t": t, "seq": seq, "index": self.frames_written}
+                self.frames_written += 1
+            self._events.write(json.dumps(_to_json(item)) + "\n")
+            if self._queue.empty():
+                self._events.flush()
+
+    def _write_frame(self, frame):
+        if self._writer is None:
+            h, w = frame.shape[:2]
+            self._writer = cv2.VideoWriter(
+                os.path.join(self.path, VIDEO_NAME),
+                cv2.VideoWriter_fourcc(*self.fourcc),
+                self.fps,
+                (w, h),
+            )
+        self._writer.write(frame)
+
+    def stop(self):
+        """Writes everything still queued and closes the files."""
+        if not self.recording:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._writer is not None:
+            self._writer.release()
+        self._events.close()
+        print(
+            f"Recorded {self.frames_written} frames to {self.path}"
+            f" ({self.dropped_frames} dropped)"
+        )
+
+
+class SessionReader:
+    """Reads a session written by SessionRecorder."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, EVENTS_NAME)) as f:
+            self.events = [json.loads(line) for line in f if line.strip()]
+
+    def of_type(self, event_type):
+        return [e for e in self.events if e["type"] == event_type]
+
+    def detections(self):
+        """
+        Returns:
+            dict: Frame seq -> recorded targets as a tracking.TRACK_DTYPE array, or
+                detection.TARGET_DTYPE if they were recorded without track IDs.
+        """
+        detections = {}
+        for event in self.of_type("detections"):
+            rows = event["targets"]
+            tracked = not rows or "track_id" in rows[0]
+            dtype = tracking.TRACK_DTYPE if tracked else detection.TARGET_DTYPE
+            targets = np.zeros(len(rows), dtype=dtype)
+            for i, row in enumerate(rows):
+                for name in dtype.names:
+                    targets[i][name] = row[name]
+            detections[event["seq"]] = targets
+        return detections
+
+    def frames(self):
+        """
+        Yields:
+            tuple: (event, frame) for every recorded frame, in order.
+        """
+        frame_events = self.of_type("frame")
+        if not frame_events:
+            return
+        vc = cv2.VideoCapture(os.path.join(self.path, VIDEO_NAME))
+        for event in frame_events:
+            rval, frame = vc.read()
+            if not rval:
+                break
+            yield event, frame
+        vc.release()
+
+
+def replay(path, targeter=None, realtime=True, on_result=None):
+    """
+    Feeds a recorded session back through the AutoTargeter.
+
+    Only the frames the live detector processed are replayed, with their recorded
+    capture time, decision time and starting servo position, so the tracker and the
+    lead prediction see the same inputs as in the live run. Sessions recorded with
+    several detection workers ran one tracker per worker and do not replay exactly.
+
+    Args:
+        path (str): Session directory.
+        targeter (AutoTargeter): Detector to use, a new default one if None.
+        realtime (bool): Keep the recorded frame timing, False runs as fast as possible.
+        on_result (callable): Optional callback(seq, result, recorded_mapping).
+
+    Returns:
+        dict: Frame count, processing latency, how far the replayed servo x
+            positions are from the recorded ones, and how the replayed targets
+            compare to the recorded detections. `missing_frames` counts processed
+            frames the recorder dropped, the replay diverges after the first one.
+    """
+    if targeter is None:
+        targeter = auto_targeting_ui.AutoTargeter()
+    session = SessionReader(path)
+    recorded = {e["seq"]: e for e in session.of_type("mapping")}
+    recorded_detections = session.detections()
+    # Inputs of the lead prediction, and the frames the detector processed
+    lead_inputs = {e["seq"]: e for e in session.of_type("detections")}
+    servo_position = targeter.servo_position
+    recorded_seqs = {e["seq"] for e in session.of_type("frame")}
+    missing_frames = len(set(lead_inputs) - recorded_seqs)
+
+    latencies = []
+    differences = []
+    box_differences = []
+    detections_compared = count_mismatches = 0
+    start = time.monotonic()
+    for event, frame in session.frames():
+        inputs = lead_inputs.get(event["seq"])
+        if lead_inputs and inputs is None:
+            # The live detector never got to this frame
+            continue
+        # Recorded times are relative to the recording start, any common base works
+        timestamp = start + event["t"]
+        now = None
+        if inputs is not None and inputs.get("decided") is not None:
+            now = start + inputs["decided"]
+            recorded_from = inputs.get("servo_from")
+            targeter.servo_position = lambda: recorded_from
+        if realtime:
+            delay = event["t"] - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+        # Frames are recorded as captured, the live pipeline works on RGB
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        t0 = time.perf_counter()
+        result = targeter.process_image(frame, timestamp, now)
+        targeter.servo_position = servo_position
+        latencies.append(time.perf_counter() - t0)
+
+        mapping = recorded.get(event["seq"])
+        if mapping is not None and result[0] is not None and mapping["servo"][0] is not None:
+            differences.append(abs(result[0] - mapping["servo"][0]))
+        targets = recorded_detections.get(event["seq"])
+        if targets is not None:
+            detections_compared += 1
+            replayed = targeter.last_targets
+            if len(replayed) != len(targets):
+                count_mismatches += 1
+            elif len(targets):
+                # Both are sorted by confidence
+                box_differences.append(
+                    np.abs(replayed["box"] - targets["box"]).max()
+                )
+        if on_result is not None:
+            on_result(event["seq"], result, mapping)
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "frames": len(latencies),
+        "missing_frames": missing_frames,
+        "elapsed_s": time.monotonic() - start,
+        "mean_ms": float(latencies.mean()) if len(latencies) else None,
+        "p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else None,
+        "compared": len(differences),
+        "mean_servo_x_difference": float(np.mean(differences)) if differences else None,
+        "detections_compared": detections_compared,
+        "detection_count_mismatches": count_mismatches,
+        "max_box_difference": (
+            int(np.max(box_differences)) if box_differences else None
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded targeting session")
+    parser.add_argument("session", help="Session directory")
+    parser.add_argument(
+        "--max-speed", action="store_true", help="Ignore the recorded frame timing"
+    )
+    parser.add_argument("--model", default="mobilenet_ssd", help="Registered detector model")
+    args = parser.parse_args()
+
+    summary = replay(
+        args.session,
+        auto_targeting_ui.AutoTargeter(model_name=args.model),
+        realtime=not args.max_speed,
+    )
+    print(json.dumps(summary, indent=2))
@@ -1,54 +1,396 @@
+import hashlib
 import json
-import tkinter as tk
+import os
+import time
 
 import numpy as np
-from scipy.interpolate import griddata
+from scipy.spatial import Delaunay, QhullError, cKDTree
 
-# Global variable to store the calibration mesh
-calibration_mesh = {}
+# Default location of the calibration mesh, relative to the repository root
+CALIBRATION_MESH_PATH = "UI/calibration_mesh.json"
 
 
-def map_video_x_to_servo(video_x):
+class TriangulatedMesh:
     """
-    Maps the video x-coordinate to servo positions.
+    Piecewise-linear 2D interpolator over a precomputed Delaunay triangulation.
 
-    Args:
-        video_x (float): x coordinate on the video stream (0 to 100).
+    The triangulation, its per-simplex barycentric transforms and a KD-tree for the
+    nearest-neighbour fallback are built once, so mapping N points is a vectorized
+    simplex lookup plus one weighted sum. Points outside the convex hull take the
+    value of the nearest mesh point.
+    """
 
-    Returns:
-        float: servo_x position for the servo motor.
+    def __init__(self, points, values):
+        """
+        Args:
+            points (array-like): (N, 2) mesh coordinates.
+            values (array-like): (N, K) values to interpolate at each mesh point.
+        """
+        self.points = np.asarray(points, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float64)
+        self._tree = cKDTree(self.points)
+        try:
+            self.tri = Delaunay(self.points)
+        except (QhullError, ValueError):
+            # Collinear or too few points, only the nearest-neighbour fallback is available
+            self.tri = None
+
+    @property
+    def is_2d(self):
+        return self.tri is not None
+
+    def __call__(self, xy):
+        """
+        Interpolates the mesh values at the given points.
+
+        Args:
+            xy (array-like): (2,) point or (M, 2) array of points.
+
+        Returns:
+            np.ndarray: (K,) or (M, K) interpolated values.
+        """
+        xy = np.asarray(xy, dtype=np.float64)
+        single = xy.ndim == 1
+        xy = np.atleast_2d(xy)
+        out = np.empty((xy.shape[0], self.values.shape[1]))
+
+        if self.tri is not None:
+            simplex = self.tri.find_simplex(xy)
+            inside = simplex >= 0
+        else:
+            inside = np.zeros(xy.shape[0], dtype=bool)
+
+        if inside.any():
+            s = simplex[inside]
+            transform = self.tri.transform[s]
+            b = np.einsum("nij,nj->ni", transform[:, :2], xy[inside] - transform[:, 2])
+            weights = np.column_stack((b, 1.0 - b.sum(axis=1)))
+            corners = self.values[self.tri.simplices[s]]
+            out[inside] = np.einsum("nj,njk->nk", weights, corners)
+
+        outside = ~inside
+        if outside.any():
+            _, nearest = self._tree.query(xy[outside])
+            out[outside] = self.values[nearest]
+
+        return out[0] if single else out
+
+
+def file_signature(path):
+    """
+    Cheap change marker for a file: (mtime_ns, size, inode).
+
+    The inode changes whenever the file is replaced atomically, which catches most
+    edits that land within the filesystem's timestamp resolution.
+    """
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class CalibrationModel:
     """
-    global calibration_mesh
+    Precompiled video_x <-> servo_x mapping built from a calibration mesh file.
+
+    The mesh is parsed once into sorted NumPy arrays that stay in memory, so a
+    lookup is a single np.interp. The file's signature (see file_signature) is
+    checked at most every `check_interval` seconds; when it changes the file is
+    hashed and the arrays are rebuilt if the content changed.
+    """
+
+    def __init__(self, path=CALIBRATION_MESH_PATH, check_interval=0.5):
+        self.path = path
+        self.check_interval = check_interval
+        self._signature = None
+        self._next_check = 0.0
+        # SHA-256 of the mesh file the arrays were compiled from
+        self.mesh_hash = None
+        # Forward mapping, sorted by video_x
+        self.video_x = None
+        self.servo_x = None
+        # Inverse mapping, sorted by servo_x
+        self._inverse_servo_x = None
+        self._inverse_video_x = None
+        # Full (video_x, video_y) -> (servo_x, servo_y) mesh
+        self.servo_y = None
+        self.mesh_2d = None
+        self._is_2d = False
+
+    @property
+    def loaded(self):
+        return self.video_x is not None
+
+    @property
+    def is_2d(self):
+        """
+        True if the mesh spans both axes and calibrates servo_y, so it can map
+        video_y as well as video_x. An x-axis calibration clicked at varied heights
+        triangulates too, but holds a placeholder servo_y that must not be used.
+        """
+        return self.refresh() and self._is_2d
+
+    def load_mesh(self, mesh):
+        """
+        Compiles a calibration mesh dictionary into the lookup arrays.
+
+        Args:
+            mesh (dict): Mapping of "video_x,video_y" keys to (servo_x, servo_y) values.
+        """
+        if not mesh:
+            raise ValueError("calibration mesh is empty")
+        video_xy = np.array([[float(c) for c in k.split(",")] for k in mesh.keys()])
+        servo_xy = np.array([[float(v[0]), float(v[1])] for v in mesh.values()])
+        video_x, servo_x = video_xy[:, 0], servo_xy[:, 0]
+
+        order = np.argsort(video_x, kind="stable")
+        self.video_x = video_x[order]
+        self.servo_x = servo_x[order]
+        self.servo_y = servo_xy[order, 1]
+        self.mesh_2d = TriangulatedMesh(video_xy, servo_xy)
+        self._is_2d = self.mesh_2d.is_2d and np.ptp(servo_xy[:, 1]) > 0
+
+        inverse_order = np.argsort(servo_x, kind="stable")
+        self._inverse_servo_x = servo_x[inverse_order]
+        self._inverse_video_x = video_x[inverse_order]
+
+    def refresh(self, force=False):
+        """
+        Reloads the mesh file if it changed since it was last compiled.
+
+        Args:
+            force (bool): Skip the check interval and stat the file now.
+
+        Returns:
+            bool: True if the model holds a usable mapping.
+        """
+        now = time.monotonic()
+        if not force and self.loaded and now < self._next_check:
+            return True
+        self._next_check = now + self.check_interval
 
-    if not calibration_mesh:
         try:
-            # Load the calibration mesh from the JSON file
-            with open("UI/calibration_mesh.json", "r") as f:
-                calibration_mesh = json.load(f)
+            signature = file_signature(self.path)
+            if signature == self._signature:
+                return self.loaded
+            with open(self.path, "rb") as f:
+                data = f.read()
         except FileNotFoundError:
-            print("Error: calibration_mesh.json file not found.")
-            return None
+            print(f"Error: {self.path} file not found.")
+            return self.loaded
+        mesh_hash = hashlib.sha256(data).hexdigest()
+        if mesh_hash == self.mesh_hash:
+            self._signature = signature
+            return True
+
+        try:
+            self.load_mesh(json.loads(data))
         except json.JSONDecodeError:
-            print("Error: Failed to decode JSON from calibration_mesh.json.")
+            print(f"Error: Failed to decode JSON from {self.path}.")
+            return self.loaded
+        except (ValueError, TypeError, IndexError) as e:
+            print(f"Error compiling calibration mesh: {e}")
+            return self.loaded
+        self._signature = signature
+        self.mesh_hash = mesh_hash
+        return True
+
+    def to_servo(self, video_x):
+        """
+        Maps video x-coordinates to servo_x positions.
+
+        Args:
+            video_x (float or array-like): x coordinate(s) on the video stream (0 to 100).
+
+        Returns:
+            float or np.ndarray: servo_x position(s), or None if no mesh is available.
+        """
+        if not self.refresh():
             return None
+        return np.interp(video_x, self.video_x, self.servo_x)
 
-    try:
-        # Extract x points and corresponding servo values from the calibration mesh
-        x_points = np.array([float(k.split(",")[0]) for k in calibration_mesh.keys()])
-        servo_x_values = np.array([v[0] for v in calibration_mesh.values()])
+    def to_video(self, servo_x):
+        """
+        Maps servo_x positions back to video x-coordinates.
 
-        # Sort the x points and corresponding servo values in ascending order
-        sorted_indices = np.argsort(x_points)
-        x_points = x_points[sorted_indices]
-        servo_x_values = servo_x_values[sorted_indices]
+        Args:
+            servo_x (float or array-like): servo_x position(s).
 
-        # Perform linear interpolation on the x-axis
-        servo_x = np.interp(video_x, x_points, servo_x_values)
-    except Exception as e:
-        print(f"Error during interpolation: {e}")
-        return None
+        Returns:
+            float or np.ndarray: x coordinate(s) on the video stream, or None if no mesh is available.
+        """
+        if not self.refresh():
+            return None
+        return np.interp(servo_x, self._inverse_servo_x, self._inverse_video_x)
+
+    def to_servo_xy(self, video_x, video_y):
+        """
+        Maps video coordinates to (servo_x, servo_y) using the 2D mesh.
+
+        An x-only mesh (all points on one row, or a constant servo_y) falls back to
+        interpolating both servo values along video_x.
+
+        Args:
+            video_x (float or array-like): x coordinate(s) on the video stream (0 to 100).
+            video_y (float or array-like): y coordinate(s) on the video stream (0 to 100).
+
+        Returns:
+            tuple: (servo_x, servo_y) as floats or arrays, or (None, None) if no mesh is available.
+        """
+        if not self.refresh():
+            return None, None
+        if not self._is_2d:
+            return (
+                np.interp(video_x, self.video_x, self.servo_x),
+                np.interp(video_x, self.video_x, self.servo_y),
+            )
+        xy = np.stack(np.broadcast_arrays(video_x, video_y), axis=-1)
+        servo = self.mesh_2d(xy.reshape(-1, 2))
+        shape = xy.shape[:-1]
+        if not shape:
+            return float(servo[0, 0]), float(servo[0, 1])
+        return servo[:, 0].reshape(shape), servo[:, 1].reshape(shape)
+
+
+class CalibrationLUT:
+    """
+    Dense video -> servo lookup table precomputed from a CalibrationModel.
+
+    The table samples the 0-100 video space every 1/`resolution` units on both axes
+    and stores (servo_x, servo_y) per cell as float32. It is saved as an .npy file
+    next to the mesh and memory-mapped, so a lookup is a single array index. The
+    .npy header has no room for metadata, so the hash of the mesh the table was
+    generated from is kept in a small .lut.json file next to it. The table is
+    regenerated whenever that hash differs from the mesh the model compiled.
+    """
+
+    def __init__(self, model, resolution=10, check_interval=0.5):
+        """
+        Args:
+            model (CalibrationModel): Model the table is generated from.
+            resolution (int): Table cells per video unit, 10 gives 0.1% steps.
+            check_interval (float): Minimum seconds between mesh checks.
+        """
+        self.model = model
+        self.resolution = resolution
+        self.check_interval = check_interval
+        self.path = os.path.splitext(model.path)[0] + ".lut.npy"
+        self.meta_path = os.path.splitext(model.path)[0] + ".lut.json"
+        self.size = 100 * resolution + 1
+        self.table = None
+        self._mesh_hash = None
+        self._next_check = 0.0
+
+    def refresh(self, force=False):
+        """
+        Memory-maps the table, regenerating it first if the mesh has changed.
+
+        Returns:
+            bool: True if a table is available.
+        """
+        now = time.monotonic()
+        if not force and self.table is not None and now < self._next_check:
+            return True
+        self._next_check = now + self.check_interval
+
+        if not self.model.refresh(force=True):
+            return self.table is not None
+        mesh_hash = self.model.mesh_hash
+        if mesh_hash == self._mesh_hash and self.table is not None:
+            return True
+
+        stale = self._saved_meta() != {
+            "mesh_sha256": mesh_hash,
+            "resolution": self.resolution,
+        }
+        if not stale:
+            try:
+                table = np.load(self.path, mmap_mode="r")
+                stale = table.shape != (self.size, self.size, 2)
+            except (FileNotFoundError, ValueError):
+                stale = True
+        if stale:
+            if not self.generate():
+                return self.table is not None
+            table = np.load(self.path, mmap_mode="r")
+
+        self.table = table
+        self._mesh_hash = mesh_hash
+        return True
+
+    def _saved_meta(self):
+        try:
+            with open(self.meta_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def generate(self):
+        """
+        Samples the calibration model over the full grid and saves the table.
+
+        Returns:
+            bool: True if the table was written.
+        """
+        if not self.model.refresh(force=True):
+            return False
+        axis = np.linspace(0, 100, self.size)
+        video_x, video_y = np.meshgrid(axis, axis)
+        servo_x, servo_y = self.model.to_servo_xy(video_x, video_y)
+        table = np.stack((servo_x, servo_y), axis=-1).astype(np.float32)
+
+        # Release the old mapping and swap the files in atomically. The metadata
+        # goes last, a crash in between leaves a mismatch and a regeneration
+        self.table = None
+        tmp_path = self.path + ".tmp.npy"
+        np.save(tmp_path, table)
+        os.replace(tmp_path, self.path)
+        meta = {"mesh_sha256": self.model.mesh_hash, "resolution": self.resolution}
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+        print(f"Generated calibration lookup table {self.path}")
+        return True
+
+    def lookup(self, video_x, video_y):
+        """
+        Looks up servo positions for video coordinates.
+
+        Args:
+            video_x (float or array-like): x coordinate(s) on the video stream (0 to 100).
+            video_y (float or array-like): y coordinate(s) on the video stream (0 to 100).
+
+        Returns:
+            tuple: (servo_x, servo_y) as floats or arrays, or (None, None) if no table is available.
+        """
+        if not self.refresh():
+            return None, None
+        if np.ndim(video_x) == 0 and np.ndim(video_y) == 0:
+            col = min(max(int(video_x * self.resolution + 0.5), 0), self.size - 1)
+            row = min(max(int(video_y * self.resolution + 0.5), 0), self.size - 1)
+            servo_x, servo_y = self.table[row, col]
+            return float(servo_x), float(servo_y)
+        col = np.clip(np.rint(np.asarray(video_x) * self.resolution), 0, self.size - 1)
+        row = np.clip(np.rint(np.asarray(video_y) * self.resolution), 0, self.size - 1)
+        servo = self.table[row.astype(np.intp), col.astype(np.intp)]
+        return servo[..., 0], servo[..., 1]
+
+
+# Shared calibration model and lookup table used by the mapping helpers below
+calibration_model = CalibrationModel()
+calibration_lut = CalibrationLUT(calibration_model)
+
+
+def map_video_x_to_servo(video_x):
+    """
+    Maps the video x-coordinate to servo positions.
+
+    Args:
+        video_x (float or array-like): x coordinate on the video stream (0 to 100).
 
-    return servo_x
+    Returns:
+        float: servo_x position for the servo motor.
+    """
+    return calibration_model.to_servo(video_x)
 
 
 def map_servo_x_to_video_x(servo_x):
@@ -56,42 +398,40 @@ def map_servo_x_to_video_x(servo_x):
     Maps the servo positions to coordinates on the video stream.
 
     Args:
-        servo_x (float): The servo_x position.
+        servo_x (float or array-like): The servo_x position.
 
     Returns:
         float: x coordinate on the video stream.
     """
-    global calibration_mesh
+    return calibration_model.to_video(servo_x)
 
-    if not calibration_mesh:
-        try:
-            # Load the calibration mesh from the JSON file
-            with open("UI/calibration_mesh.json", "r") as f:
-                calibration_mesh = json.load(f)
-        except FileNotFoundError:
-            print("Error: calibration_mesh.json file not found.")
-            return None
-        except json.JSONDecodeError:
-            print("Error: Failed to decode JSON from calibration_mesh.json.")
-            return None
 
-    try:
-        # Extract x points and corresponding servo values from the calibration mesh
-        x_points = np.array([float(k.split(",")[0]) for k in calibration_mesh.keys()])
-        servo_x_values = np.array([v[0] for v in calibration_mesh.values()])
+def map_video_to_servo(video_x, video_y):
+    """
+    Maps video coordinates to servo positions on both axes.
 
-        # Sort the x points and corresponding servo values in ascending order
-        sorted_indices = np.argsort(x_points)
-        x_points = x_points[sorted_indices]
-        servo_x_values = servo_x_values[sorted_indices]
+    Args:
+        video_x (float or array-like): x coordinate on the video stream (0 to 100).
+        video_y (float or array-like): y coordinate on the video stream (0 to 100).
 
-        # Perform linear interpolation on the x-axis
-        x = np.interp(servo_x, servo_x_values, x_points)
-    except Exception as e:
-        print(f"Error during interpolation: {e}")
-        return None
+    Returns:
+        tuple: (servo_x, servo_y) positions for the servo motors.
+    """
+    return calibration_model.to_servo_xy(video_x, video_y)
+
+
+def lookup_video_to_servo(video_x, video_y):
+    """
+    Maps video coordinates to servo positions through the precomputed lookup table.
+
+    Args:
+        video_x (float or array-like): x coordinate on the video stream (0 to 100).
+        video_y (float or array-like): y coordinate on the video stream (0 to 100).
 
-    return x
+    Returns:
+        tuple: (servo_x, servo_y) positions for the servo motors.
+    """
+    return calibration_lut.lookup(video_x, video_y)
 
 
 def calibrate_x_point(app):
@@ -104,17 +444,14 @@ def calibrate_x_point(app):
             app (VideoStreamApp): The instance of the VideoStreamApp to calibrate.
         """
         # Temporarily stop other processes
-        if app.calibrating or app.manual_control:
+        if app.modes.mode in ("calibrating", "manual"):
             print("Another process is running. Please wait until it finishes.")
             return
 
-        app.calibrating = True
-        app.manual_control = (
-            False  # Ensure manual control is disabled during calibration
-        )
-        app.settings_text.insert(
-            tk.END,
-            "Click on the video stream where the servo is pointing. This will calibrate the current servo_x position.\n",
+        # Leaves any other control mode, so nothing moves the servos during calibration
+        app.modes.set_mode("calibrating")
+        app.console.log(
+            "Click on the video stream where the servo is pointing. This will calibrate the current servo_x position."
         )
 
         def on_mouse_click(event):
@@ -127,14 +464,11 @@ def calibrate_x_point(app):
             servo_x = app.arduino_controller.x_pos
             # Save the calibration point
             app.calibration_mesh[f"{video_x}, 0"] = (servo_x, 30)
-            app.settings_text.insert(
-                tk.END, f"Calibrated video_x: {video_x} with servo_x: {servo_x}\n"
-            )
+            app.console.log(f"Calibrated video_x: {video_x} with servo_x: {servo_x}")
             # Optionally, save the calibration mesh to a file
-            with open("UI/calibration_mesh.json", "w") as f:
+            with open(CALIBRATION_MESH_PATH, "w") as f:
                 json.dump(app.calibration_mesh, f)
-            app.calibrating = False
-            app.manual_control = True  # Re-enable manual control after calibration
+            app.modes.set_mode("manual")  # Re-enable manual control after calibration
 
         app.video_canvas.bind("<Button-1>", on_mouse_click)
 
@@ -148,11 +482,10 @@ def calibrate_x_axis(app):
     Args:
         app (VideoStreamApp): The instance of the VideoStreamApp to calibrate.
     """
-    app.calibrating = True
+    app.modes.set_mode("calibrating")
     calibration_mesh = {}
-    app.settings_text.insert(
-        tk.END,
-        "Click on a target to start calibration. Complete all steps to finish.\n",
+    app.console.log(
+        "Click on a target to start calibration. Complete all steps to finish."
     )
 
     def on_mouse_click(event):
@@ -173,9 +506,7 @@ def calibrate_x_axis(app):
             ),
         ]
         app.root.update()
-        app.settings_text.insert(
-            tk.END, f"Align servo_x to ({x}, {y}) and press Enter...\n"
-        )
+        app.console.log(f"Align servo_x to ({x}, {y}) and press Enter...")
         app.enter_pressed.set(False)  # Reset the variable before waiting
         app.root.wait_variable(app.enter_pressed)
         servo_x, _ = app.get_servo_positions()
@@ -188,17 +519,17 @@ def calibrate_x_axis(app):
     # Run the calibration process 10 times
     for _ in range(app.calibration_steps):
         app.video_canvas.bind("<Button-1>", on_mouse_click)
-        app.settings_text.insert(tk.END, "Click on the next target...\n")
+        app.console.log("Click on the next target...")
         app.root.wait_variable(app.enter_pressed)
 
     # Save the calibration mesh to a file
     try:
-        with open("UI/calibration_mesh.json", "w") as f:
+        with open(CALIBRATION_MESH_PATH, "w") as f:
             json.dump(calibration_mesh, f)
-        app.settings_text.insert(tk.END, "Calibration complete and saved.\n")
+        app.console.log("Calibration complete and saved.")
     except Exception as e:
-        app.settings_text.insert(tk.END, f"Error saving calibration mesh: {e}\n")
-    app.calibrating = False
+        app.console.log(f"Error saving calibration mesh: {e}")
+    app.modes.set_mode("idle")
 
 
 def calibrate(app):
@@ -227,29 +558,28 @@ def calibrate(app):
                 app.video_canvas.create_line(x, y - 10, x, y + 10, fill="red", width=3),
             ]
             app.root.update()
-            app.settings_text.insert(
-                tk.END, f"Align laser to ({x}, {y}) and press Enter...\n"
-            )
+            app.console.log(f"Align laser to ({x}, {y}) and press Enter...")
             app.enter_pressed.set(False)  # Reset the variable before waiting
             app.root.wait_variable(app.enter_pressed)
             servo_x, servo_y = app.get_servo_positions()
-            calibration_mesh[f"{x},{y}"] = (servo_x, servo_y)
+            # Store the point on the same 0-100 scale the mapping functions use
+            video_x = round(x / width * 100, 2)
+            video_y = round(y / height * 100, 2)
+            calibration_mesh[f"{video_x},{video_y}"] = (servo_x, servo_y)
 
             # Remove the plus sign after calibration step
             for item in plus_sign:
                 app.video_canvas.delete(item)
 
     app.calibration_mesh = calibration_mesh
-    app.settings_text.insert(tk.END, "Calibration complete.\n")
+    app.console.log("Calibration complete.")
 
     try:
         # Save the calibration mesh to a file
-        with open("calibration_mesh.json", "w") as f:
+        with open(CALIBRATION_MESH_PATH, "w") as f:
             json.dump(calibration_mesh, f)
-        app.settings_text.insert(
-            tk.END, "Calibration data saved to calibration_mesh.json.\n"
-        )
+        app.console.log(f"Calibration data saved to {CALIBRATION_MESH_PATH}.")
     except IOError:
-        app.settings_text.insert(
-            tk.END, "Error: Failed to save calibration data to calibration_mesh.json.\n"
+        app.console.log(
+            f"Error: Failed to save calibration data to {CALIBRATION_MESH_PATH}."
         )
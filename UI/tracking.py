@@ -0,0 +1,180 @@
+import numpy as np
+from detection import TARGET_DTYPE
+from scipy.optimize import linear_sum_assignment
+
+# TARGET_DTYPE plus the stable ID of the track the row belongs to
+TRACK_DTYPE = np.dtype(TARGET_DTYPE.descr + [("track_id", np.int32)])
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Pairwise intersection-over-union of two sets of boxes.
+
+    Args:
+        boxes_a (np.ndarray): (N, 4) boxes as (startX, startY, endX, endY).
+        boxes_b (np.ndarray): (M, 4) boxes as (startX, startY, endX, endY).
+
+    Returns:
+        np.ndarray: (N, M) IoU values.
+    """
+    a = boxes_a.astype(np.float32)[:, None, :]
+    b = boxes_b.astype(np.float32)[None, :, :]
+    inter_w = np.maximum(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0)
+    inter_h = np.maximum(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+class KalmanBoxTrack:
+    """
+    Constant-velocity Kalman filter over a box's center and size.
+
+    State is (cx, cy, w, h, vx, vy, vw, vh) in pixels and pixels per frame.
+    """
+
+    # State transition and measurement matrices shared by every track
+    F = np.eye(8)
+    F[:4, 4:] = np.eye(4)
+    H = np.eye(4, 8)
+
+    def __init__(self, track_id, target, process_noise=1.0, measurement_noise=10.0):
+        self.track_id = track_id
+        self.class_id = int(target["class_id"])
+        self.confidence = float(target["confidence"])
+        self.hits = 1
+        self.age = 0
+        self.time_since_update = 0
+
+        self.x = np.zeros(8)
+        self.x[:4] = self._box_to_measurement(target["box"])
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 100.0, 100.0, 100.0, 100.0])
+        self.Q = np.eye(8) * process_noise
+        self.Q[4:, 4:] *= 0.01
+        self.R = np.eye(4) * measurement_noise
+
+    @staticmethod
+    def _box_to_measurement(box):
+        x1, y1, x2, y2 = (float(v) for v in box)
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+
+    @property
+    def box(self):
+        cx, cy, w, h = self.x[:4]
+        w, h = max(w, 1.0), max(h, 1.0)
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+    @property
+    def velocity(self):
+        """Center velocity (vx, vy) in pixels per frame."""
+        return self.x[4:6].copy()
+
+    def predict(self, confidence_decay):
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        self.age += 1
+        self.time_since_update += 1
+        self.confidence *= confidence_decay
+
+    def update(self, target):
+        z = self._box_to_measurement(target["box"])
+        y = z - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+        self.confidence = float(target["confidence"])
+        self.hits += 1
+        self.time_since_update = 0
+
+
+class MultiObjectTracker:
+    """
+    Associates detections across frames and carries stable target IDs between them.
+
+    Detections are matched to the predicted track boxes by IoU with the Hungarian
+    algorithm. Between detections every track coasts on its Kalman prediction while
+    its confidence decays, so the caller can decide when a fresh detection is needed.
+    """
+
+    def __init__(
+        self, min_iou=0.3, max_age=15, min_hits=1, confidence_decay=0.95
+    ):
+        """
+        Args:
+            min_iou (float): Minimum IoU for a detection to update a track.
+            max_age (int): Frames a track survives without a matching detection.
+            min_hits (int): Detections needed before a track is reported.
+            confidence_decay (float): Factor applied to a track's confidence per predicted frame.
+        """
+        self.min_iou = min_iou
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.confidence_decay = confidence_decay
+        self.tracks = []
+        self._next_id = 1
+
+    def predict(self):
+        """Advances every track by one frame."""
+        for track in self.tracks:
+            track.predict(self.confidence_decay)
+
+    def update(self, targets):
+        """
+        Matches a new set of detections to the tracks.
+
+        Args:
+            targets (np.ndarray): TARGET_DTYPE detections for the current frame.
+        """
+        unmatched = set(range(len(targets)))
+        if self.tracks and len(targets):
+            predicted = np.array([track.box for track in self.tracks])
+            iou = iou_matrix(predicted, targets["box"])
+            rows, cols = linear_sum_assignment(-iou)
+            for row, col in zip(rows, cols):
+                if iou[row, col] >= self.min_iou:
+                    self.tracks[row].update(targets[col])
+                    unmatched.discard(col)
+
+        for index in sorted(unmatched):
+            self.tracks.append(KalmanBoxTrack(self._next_id, targets[index]))
+            self._next_id += 1
+
+        self.tracks = [t for t in self.tracks if t.time_since_update <= self.max_age]
+
+    def get(self, track_id):
+        """Returns the track with the given ID, or None."""
+        for track in self.tracks:
+            if track.track_id == track_id:
+                return track
+        return None
+
+    def targets(self, frame_size):
+        """
+        Reports the current tracks.
+
+        Args:
+            frame_size (tuple): (width, height) to clamp the boxes to.
+
+        Returns:
+            np.ndarray: TRACK_DTYPE array, highest confidence first.
+        """
+        tracks = [t for t in self.tracks if t.hits >= self.min_hits]
+        out = np.empty(len(tracks), dtype=TRACK_DTYPE)
+        if not tracks:
+            return out
+        w, h = frame_size
+        boxes = np.array([t.box for t in tracks])
+        np.clip(boxes[:, 0::2], 0, w - 1, out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, h - 1, out=boxes[:, 1::2])
+        out["box"] = boxes.astype(np.int32)
+        out["center"] = np.array([t.x[:2] for t in tracks])
+        out["confidence"] = [t.confidence for t in tracks]
+        out["class_id"] = [t.class_id for t in tracks]
+        out["track_id"] = [t.track_id for t in tracks]
+        return out[np.argsort(-out["confidence"], kind="stable")]
+
+    def reset(self):
+        self.tracks = []
@@ -0,0 +1,396 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import turret_protocol
+from command_ui import ArduinoController
+
+BROKER_HOST = "127.0.0.1"
+BROKER_PORT = 8765
+BROKER_LOG = os.path.join(tempfile.gettempdir(), "turret_broker.log")
+
+# Broker-only text command, answered with the turret address the broker talks to
+INFO_REQUEST = "broker=info"
+INFO_REPLY = "broker turret="
+
+
+class TurretBroker:
+    """
+    Owns the single TCP connection to the turret and shares it between local clients.
+
+    The firmware serves one client at a time and runs its servo greeting on every new
+    connection, so the UI, the auto-targeter and the curses console all connect here
+    instead. The broker listens on a local port and speaks the same protocol as
+    turret.ino, so any ArduinoController pointed at it works unchanged. Each reply is
+    routed back to the client that sent the command. If the turret connection drops,
+    the broker reconnects with exponential backoff and replays the last position.
+
+    The broker runs as its own process, `python UI/turret_broker.py`, so it outlives
+    the consumers that use it. connect_controller() starts one detached if none is
+    running.
+    """
+
+    def __init__(
+        self,
+        turret_ip="192.168.50.30",
+        turret_port=80,
+        host=BROKER_HOST,
+        port=BROKER_PORT,
+        protocol="auto",
+        min_backoff=0.5,
+        max_backoff=10.0,
+    ):
+        """
+        Args:
+            turret_ip (str): Turret address.
+            turret_port (int): Turret port.
+            host (str): Local address to listen on.
+            port (int): Local port to listen on.
+            protocol (str): Protocol used towards the turret, see ArduinoController.
+            min_backoff (float): First reconnect delay in seconds.
+            max_backoff (float): Longest reconnect delay in seconds.
+        """
+        self.controller = ArduinoController(
+            ip=turret_ip, port=turret_port, protocol=protocol, verbose=False
+        )
+        self.host = host
+        self.port = port
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.last_position = None
+        self.reconnects = 0
+        self._server = None
+        self._running = False
+        self._clients = []
+        self._threads = []
+
+    def start(self):
+        """
+        Starts listening for clients and connecting to the turret.
+
+        Returns:
+            TurretBroker: self.
+
+        Raises:
+            OSError: If the local port is already in use, usually by another broker.
+        """
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen()
+        self.port = self._server.getsockname()[1]
+        self._running = True
+        for target, name in (
+            (self._accept_loop, "TurretBrokerAccept"),
+            (self._supervise, "TurretBrokerSupervisor"),
+        ):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"Turret broker listening on {self.host}:{self.port}")
+        return self
+
+    def _supervise(self):
+        backoff = self.min_backoff
+        first = True
+        while self._running:
+            if self.controller.connected:
+                time.sleep(0.2)
+                continue
+            if not first:
+                print(f"Turret connection lost, reconnecting in {backoff:.1f}s")
+                time.sleep(backoff)
+                if not self._running:
+                    return
+            if self.controller.connect():
+                if not first:
+                    self.reconnects += 1
+                first = False
+                backoff = self.min_backoff
+                print(
+                    f"Broker connected to turret at {self.controller.arduino_ip}:"
+                    f"{self.controller.arduino_port} ({self.controller.protocol} protocol)"
+                )
+                if self.last_position is not None:
+                    self.controller.send_command(self.last_position)
+            else:
+                first = False
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._clients.append(conn)
+            threading.Thread(
+                target=self._serve_client, args=(conn,), name="TurretBrokerClient", daemon=True
+            ).start()
+
+    def _serve_client(self, conn):
+        send_lock = threading.Lock()
+
+        def reply_line(text):
+            with send_lock:
+                try:
+                    conn.sendall((text + "\n").encode("utf-8"))
+                except OSError:
+                    pass
+
+        def reply_ack(opcode, seq, status):
+            with send_lock:
+                try:
+                    conn.sendall(turret_protocol.encode_ack(opcode, seq, status))
+                except OSError:
+                    pass
+
+        buffer = b""
+        while self._running:
+            try:
+                chunk = conn.recv(4096)
+            except OSError:
+                break
+            if not chunk:
+                break
+            buffer += chunk
+            while buffer:
+                if buffer[0] == turret_protocol.MAGIC:
+                    if len(buffer) < turret_protocol.FRAME_SIZE:
+                        break
+                    frame = buffer[: turret_protocol.FRAME_SIZE]
+                    buffer = buffer[turret_protocol.FRAME_SIZE :]
+                    self._handle_frame(frame, reply_ack)
+                else:
+                    line, newline, rest = buffer.partition(b"\n")
+                    if not newline:
+                        break
+                    buffer = rest
+                    command = line.decode("utf-8", "replace").strip()
+                    if command == turret_protocol.NEGOTIATE_REQUEST:
+                        reply_line(turret_protocol.NEGOTIATE_REPLY)
+                    elif command == INFO_REQUEST:
+                        reply_line(
+                            f"{INFO_REPLY}{self.controller.arduino_ip}:"
+                            f"{self.controller.arduino_port}"
+                        )
+                    else:
+                        self.forward(
+                            command,
+                            lambda reply, rejected: reply_line(
+                                _reply_text(reply, rejected)
+                            ),
+                        )
+        if conn in self._clients:
+            self._clients.remove(conn)
+        conn.close()
+
+    def _handle_frame(self, frame, reply_ack):
+        opcode, seq, x, y, status = turret_protocol.decode_frame(frame)
+        if status != turret_protocol.STATUS_OK:
+            reply_ack(opcode, seq, status)
+            return
+        if opcode == turret_protocol.OP_MOVE:
+            command = f"x={x}&y={y}"
+        else:
+            actions = {v: k for k, v in turret_protocol.SOLENOID_ACTIONS.items()}
+            command = f"solenoid={actions[x]}"
+        self.forward(
+            command,
+            lambda reply, rejected: reply_ack(
+                opcode,
+                seq,
+                turret_protocol.STATUS_BAD_OPCODE if rejected else turret_protocol.STATUS_OK,
+            ),
+        )
+
+    def forward(self, command, on_reply=None):
+        """
+        Sends a command to the turret on behalf of a client.
+
+        Args:
+            command (str): Text protocol command.
+            on_reply (callable): callback(reply, rejected) for the turret's answer.
+        """
+        parsed = turret_protocol.parse_text_command(command)
+        if parsed is not None and parsed[0] == turret_protocol.OP_MOVE:
+            # Remembered so it can be replayed after a reconnect
+            self.last_position = command
+        if not self.controller.connected or not self.controller.send_command(
+            command, on_reply
+        ):
+            if on_reply is not None:
+                on_reply("Invalid command: turret disconnected", True)
+
+    def stop(self):
+        self._running = False
+        if self._server is not None:
+            self._server.close()
+        for conn in list(self._clients):
+            conn.close()
+        self.controller.close()
+
+
+def _reply_text(reply, rejected):
+    # Binary acks from the turret are turned back into text lines for text clients
+    if isinstance(reply, str):
+        return reply
+    if rejected:
+        return f"Invalid command (status {reply[2]})"
+    return "OK"
+
+
+def broker_turret_address(host=BROKER_HOST, port=BROKER_PORT, timeout=1.0):
+    """
+    Asks a running broker which turret it is connected to.
+
+    Args:
+        host (str): Broker address.
+        port (int): Broker port.
+        timeout (float): Seconds to wait for the answer.
+
+    Returns:
+        tuple: (turret_ip, turret_port), or None if nothing answered like a broker.
+    """
+    reply = b""
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as conn:
+            conn.sendall((INFO_REQUEST + "\n").encode("utf-8"))
+            while not reply.endswith(b"\n"):
+                chunk = conn.recv(256)
+                if not chunk:
+                    break
+                reply += chunk
+    except OSError:
+        return None
+    reply = reply.decode("utf-8", "replace").strip()
+    if not reply.startswith(INFO_REPLY):
+        return None
+    turret_ip, _, turret_port = reply[len(INFO_REPLY) :].rpartition(":")
+    try:
+        return turret_ip, int(turret_port)
+    except ValueError:
+        return None
+
+
+def start_broker_process(
+    turret_ip="192.168.50.30",
+    turret_port=80,
+    host=BROKER_HOST,
+    port=BROKER_PORT,
+    timeout=5.0,
+    log_path=BROKER_LOG,
+):
+    """
+    Starts a broker as a detached process that keeps running after this one exits.
+
+    Args:
+        turret_ip (str): Turret address.
+        turret_port (int): Turret port.
+        host (str): Local address to listen on.
+        port (int): Local port to listen on.
+        timeout (float): Seconds to wait for the broker to accept connections.
+        log_path (str): File the broker's output is appended to.
+
+    Returns:
+        bool: True once the broker accepts connections.
+    """
+    command = [
+        sys.executable,
+        "-u",
+        os.path.abspath(__file__),
+        "--turret-ip",
+        turret_ip,
+        "--turret-port",
+        str(turret_port),
+        "--host",
+        host,
+        "--port",
+        str(port),
+    ]
+    if os.name == "nt":
+        detach = {
+            "creationflags": subprocess.DETACHED_PROCESS
+            | subprocess.CREATE_NEW_PROCESS_GROUP
+        }
+    else:
+        detach = {"start_new_session": True}
+    with open(log_path, "a") as log:
+        subprocess.Popen(
+            command, stdin=subprocess.DEVNULL, stdout=log, stderr=log, **detach
+        )
+    print(f"Started turret broker for {turret_ip}:{turret_port}, log in {log_path}")
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    print(f"Turret broker did not start within {timeout:.0f}s, see {log_path}")
+    return False
+
+
+def connect_controller(
+    turret_ip="192.168.50.30",
+    turret_port=80,
+    host=BROKER_HOST,
+    port=BROKER_PORT,
+    **controller_kwargs,
+):
+    """
+    Connects an ArduinoController through the broker, starting a broker process if
+    none is running yet. The controller reconnects with backoff if the broker goes
+    away, e.g. when it is restarted.
+
+    Args:
+        turret_ip (str): Turret address, used if a broker has to be started.
+        turret_port (int): Turret port, used if a broker has to be started.
+        host (str): Broker address.
+        port (int): Broker port.
+        **controller_kwargs: Passed to ArduinoController.
+
+    Returns:
+        command_ui.ArduinoController: The controller, connected to the broker.
+    """
+    address = broker_turret_address(host, port)
+    if address is None:
+        start_broker_process(turret_ip, turret_port, host, port)
+    elif address != (turret_ip, turret_port):
+        print(
+            f"Warning: the running turret broker is connected to {address[0]}:"
+            f"{address[1]}, not {turret_ip}:{turret_port}. Stop it to switch turrets."
+        )
+    controller_kwargs.setdefault("reconnect", True)
+    controller = ArduinoController(ip=host, port=port, **controller_kwargs)
+    controller.connect()
+    return controller
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Share the single turret connection between local clients"
+    )
+    parser.add_argument("--turret-ip", default="192.168.50.30")
+    parser.add_argument("--turret-port", type=int, default=80)
+    parser.add_argument("--host", default=BROKER_HOST)
+    parser.add_argument("--port", type=int, default=BROKER_PORT)
+    parser.add_argument("--protocol", choices=["auto", "text", "binary"], default="auto")
+    args = parser.parse_args()
+
+    broker = TurretBroker(
+        args.turret_ip, args.turret_port, args.host, args.port, args.protocol
+    ).start()
+    try:
+        while True:
+            time.sleep(5)
+            print(broker.controller.format_reply_stats())
+    except KeyboardInterrupt:
+        broker.stop()
@@ -0,0 +1,144 @@
+"""
+Binary wire protocol for turret commands, mirrored by arduino/turret/turret.ino.
+
+Command frame, 9 bytes, little-endian:
+
+    0     magic 0xA5
+    1     opcode
+    2-3   sequence number (uint16)
+    4-5   x (int16, degrees * 100) or solenoid action
+    6-7   y (int16, degrees * 100)
+    8     checksum, XOR of bytes 0-7
+
+Ack frame, 6 bytes: magic, opcode | 0x80, sequence number (uint16), status, checksum.
+
+A client asks for the binary protocol by sending the text line "proto=bin". Firmware
+that supports it answers "proto=bin ok", older firmware answers with an invalid
+command line and the client keeps using the text protocol.
+"""
+
+import struct
+
+MAGIC = 0xA5
+OP_MOVE = 0x01
+OP_SOLENOID = 0x02
+ACK_FLAG = 0x80
+
+SOLENOID_OFF = 0
+SOLENOID_ON = 1
+SOLENOID_TOGGLE = 2
+SOLENOID_ACTIONS = {"off": SOLENOID_OFF, "on": SOLENOID_ON, "toggle": SOLENOID_TOGGLE}
+
+STATUS_OK = 0
+STATUS_BAD_CHECKSUM = 1
+STATUS_BAD_OPCODE = 2
+
+FRAME_SIZE = 9
+ACK_SIZE = 6
+FIXED_POINT_SCALE = 100
+
+NEGOTIATE_REQUEST = "proto=bin"
+NEGOTIATE_REPLY = "proto=bin ok"
+
+_FRAME = struct.Struct("<BBHhh")
+_ACK = struct.Struct("<BBHB")
+
+
+def checksum(data):
+    value = 0
+    for byte in data:
+        value ^= byte
+    return value
+
+
+def encode_frame(opcode, seq, x=0, y=0):
+    """
+    Builds a command frame.
+
+    Args:
+        opcode (int): OP_MOVE or OP_SOLENOID.
+        seq (int): Sequence number, wrapped to 16 bits.
+        x (float): x position in degrees, or the solenoid action.
+        y (float): y position in degrees.
+
+    Returns:
+        bytes: The 9-byte frame.
+    """
+    if opcode == OP_MOVE:
+        x = int(round(x * FIXED_POINT_SCALE))
+        y = int(round(y * FIXED_POINT_SCALE))
+    body = _FRAME.pack(MAGIC, opcode, seq & 0xFFFF, x, y)
+    return body + bytes([checksum(body)])
+
+
+def decode_frame(frame):
+    """
+    Parses a command frame.
+
+    Returns:
+        tuple: (opcode, seq, x, y, status). Positions are in degrees; status is
+            STATUS_OK or the reason the frame was rejected.
+    """
+    magic, opcode, seq, x, y = _FRAME.unpack(frame[:8])
+    if magic != MAGIC or checksum(frame[:8]) != frame[8]:
+        return opcode, seq, x, y, STATUS_BAD_CHECKSUM
+    if opcode == OP_MOVE:
+        return opcode, seq, x / FIXED_POINT_SCALE, y / FIXED_POINT_SCALE, STATUS_OK
+    if opcode == OP_SOLENOID and x in SOLENOID_ACTIONS.values():
+        return opcode, seq, x, y, STATUS_OK
+    return opcode, seq, x, y, STATUS_BAD_OPCODE
+
+
+def encode_ack(opcode, seq, status=STATUS_OK):
+    body = _ACK.pack(MAGIC, opcode | ACK_FLAG, seq & 0xFFFF, status)
+    return body + bytes([checksum(body)])
+
+
+def decode_ack(ack):
+    """
+    Parses an ack frame.
+
+    Returns:
+        tuple: (opcode, seq, status), or None if the frame is corrupt.
+    """
+    magic, opcode, seq, status = _ACK.unpack(ack[:5])
+    if magic != MAGIC or not opcode & ACK_FLAG or checksum(ack[:5]) != ack[5]:
+        return None
+    return opcode & ~ACK_FLAG, seq, status
+
+
+def parse_text_command(command):
+    """
+    Parses a text protocol command the way turret.ino does.
+
+    Args:
+        command (str): e.g. "x=135.5&y=30" or "solenoid=toggle".
+
+    Returns:
+        tuple: (opcode, x, y), or None if the command is not a move or solenoid command.
+    """
+    command = command.strip()
+    if command.startswith("solenoid="):
+        action = SOLENOID_ACTIONS.get(command[len("solenoid=") :])
+        return None if action is None else (OP_SOLENOID, action, 0)
+    if command.startswith("x=") and "&y=" in command:
+        x, y = command[2:].split("&y=", 1)
+        try:
+            return OP_MOVE, float(x), float(y)
+        except ValueError:
+            return None
+    return None
+
+
+def encode_command(command, seq):
+    """
+    Converts a text protocol command to a binary frame.
+
+    Returns:
+        bytes: The frame, or None if the command has no binary form.
+    """
+    parsed = parse_text_command(command)
+    if parsed is None:
+        return None
+    opcode, x, y = parsed
+    return encode_frame(opcode, seq, x, y)
@@ -0,0 +1,384 @@
+import argparse
+import collections
+import json
+import random
+import re
+import socket
+import threading
+import time
+
+import turret_protocol
+
+# Same limits as turret.ino
+X_LIMITS = (0, 270)
+Y_LIMITS = (0, 90)
+
+
+def arduino_to_int(value):
+    """Parses a string the way Arduino's String.toInt() does, "135.73" -> 135."""
+    match = re.match(r"\s*([-+]?\d+)", value)
+    return int(match.group(1)) if match else 0
+
+
+class SimulatedServo:
+    """
+    Servo that slews towards its setpoint at a fixed rate and then settles.
+
+    Args:
+        position (float): Starting angle in degrees.
+        slew_rate (float): Degrees per second.
+        settle_time (float): Seconds after arriving before the servo is still.
+    """
+
+    def __init__(self, position, slew_rate=400.0, settle_time=0.05):
+        self.slew_rate = slew_rate
+        self.settle_time = settle_time
+        self._start = position
+        self._target = position
+        self._start_time = time.monotonic()
+
+    def position_at(self, now=None):
+        now = time.monotonic() if now is None else now
+        travel = abs(self._target - self._start)
+        moved = (now - self._start_time) * self.slew_rate
+        if moved >= travel:
+            return self._target
+        direction = 1 if self._target > self._start else -1
+        return self._start + direction * moved
+
+    def move_to(self, target, now=None):
+        """
+        Sets a new setpoint.
+
+        Returns:
+            float: Seconds until the servo has arrived and settled.
+        """
+        now = time.monotonic() if now is None else now
+        self._start = self.position_at(now)
+        self._start_time = now
+        self._target = target
+        return abs(target - self._start) / self.slew_rate + self.settle_time
+
+
+class DelayedReplies:
+    """
+    Sends a client's replies from a background thread, each at its own due time.
+
+    Replies to pipelined commands are in flight at the same time, like on a network
+    link, instead of each waiting for the previous one's delay. Due times never go
+    backwards, since a TCP stream keeps its order.
+
+    Args:
+        conn (socket.socket): Client connection.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._last_due = 0.0
+        self._open = True
+        self._thread = threading.Thread(
+            target=self._run, name="TurretSimulatorReplies", daemon=True
+        )
+        self._thread.start()
+
+    def send(self, data, due):
+        """Queues `data` to be sent at `due` (time.monotonic)."""
+        with self._condition:
+            self._last_due = max(due, self._last_due)
+            self._queue.append((self._last_due, data))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._open and not self._queue:
+                    self._condition.wait()
+                if not self._open:
+                    return
+                due, data = self._queue[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                self._queue.popleft()
+            try:
+                self.conn.sendall(data)
+            except OSError:
+                return
+
+    def close(self):
+        """Stops the sender, replies not yet due are dropped with the connection."""
+        with self._condition:
+            self._open = False
+            self._condition.notify()
+        self._thread.join(timeout=1.0)
+
+
+class TurretSimulator:
+    """
+    TCP server that behaves like arduino/turret/turret.ino.
+
+    It implements the text commands (x=..&y=.., solenoid=toggle/on/off) with the
+    same replies and clamping, the binary protocol from turret_protocol, and the
+    one-client-at-a-time behaviour of WiFiServer. Servo motion, network latency and
+    jitter are simulated, and every received command is recorded in `trace` with its
+    timestamp.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=8080,
+        latency=0.0,
+        jitter=0.0,
+        slew_rate=400.0,
+        settle_time=0.05,
+        greeting_time=0.0,
+        binary=True,
+    ):
+        """
+        Args:
+            host (str): Address to listen on.
+            port (int): Port to listen on, 0 picks a free one.
+            latency (float): Seconds from receiving a command to sending its reply.
+                Replies to pipelined commands overlap, this is not a processing time.
+            jitter (float): Maximum random seconds added to or removed from `latency`.
+            slew_rate (float): Servo speed in degrees per second.
+            settle_time (float): Servo settling time in seconds.
+            greeting_time (float): Seconds spent on the servo greeting for each new
+                client, the firmware takes about 1.4s.
+            binary (bool): Accept the binary protocol, False behaves like old firmware.
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.greeting_time = greeting_time
+        self.binary = binary
+        self.x_servo = SimulatedServo(135, slew_rate, settle_time)
+        self.y_servo = SimulatedServo(0, slew_rate, settle_time)
+        self.x_pos, self.y_pos = 135, 0
+        self.solenoid = False
+        self.trace = []
+        self._start_time = time.monotonic()
+        self._server = None
+        self._thread = None
+        self._running = False
+        self._client = None
+
+    def start(self):
+        """
+        Starts accepting clients on a background thread.
+
+        Returns:
+            TurretSimulator: self.
+        """
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen()
+        self.port = self._server.getsockname()[1]
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._serve, name="TurretSimulator", daemon=True
+        )
+        self._thread.start()
+        print(f"Turret simulator listening on {self.host}:{self.port}")
+        return self
+
+    def _serve(self):
+        # Like WiFiServer.available(), clients are served one at a time
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            # Replies are tiny writes sent at their due times, Nagle would hold them
+            # back until the client ACKs the previous one
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._client = conn
+            self._handle_client(conn)
+            self._client = None
+            conn.close()
+            # The firmware parks the servos when the client leaves
+            self._move(135, 0)
+
+    def _handle_client(self, conn):
+        if self.greeting_time:
+            time.sleep(self.greeting_time)
+        self._move(135, 45)
+
+        replies = DelayedReplies(conn)
+        try:
+            self._receive(conn, replies)
+        finally:
+            replies.close()
+
+    def _receive(self, conn, replies):
+        buffer = b""
+        while self._running:
+            try:
+                chunk = conn.recv(4096)
+            except OSError:
+                return
+            if not chunk:
+                return
+            received = time.monotonic()
+            buffer += chunk
+            while buffer:
+                if self.binary and buffer[0] == turret_protocol.MAGIC:
+                    if len(buffer) < turret_protocol.FRAME_SIZE:
+                        break
+                    frame = buffer[: turret_protocol.FRAME_SIZE]
+                    buffer = buffer[turret_protocol.FRAME_SIZE :]
+                    reply = self.handle_frame(frame)
+                else:
+                    line, newline, rest = buffer.partition(b"\n")
+                    if not newline:
+                        break
+                    buffer = rest
+                    reply = self.handle_command(line.decode("utf-8", "replace"))
+                    reply = (reply + "\r\n").encode("utf-8")
+                replies.send(reply, received + self._reply_delay())
+
+    def _reply_delay(self):
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def _move(self, x, y):
+        now = time.monotonic()
+        self.x_pos, self.y_pos = x, y
+        return max(self.x_servo.move_to(x, now), self.y_servo.move_to(y, now))
+
+    def _record(self, command, reply, settle=None):
+        self.trace.append(
+            {
+                "t": time.monotonic() - self._start_time,
+                "command": command,
+                "reply": reply,
+                "x": self.x_pos,
+                "y": self.y_pos,
+                "settle": settle,
+            }
+        )
+
+    def handle_command(self, request):
+        """
+        Handles one text protocol line exactly like turret.ino.
+
+        Returns:
+            str: The reply line, without the line ending.
+        """
+        request = request.strip()
+        settle = None
+        if request == turret_protocol.NEGOTIATE_REQUEST and self.binary:
+            reply = turret_protocol.NEGOTIATE_REPLY
+        elif request.startswith("x=") or request.startswith("y="):
+            x_index = request.find("x=")
+            y_index = request.find("y=")
+            if x_index != -1 and y_index != -1:
+                x_end = request.find("&", x_index)
+                x_value = arduino_to_int(
+                    request[x_index + 2 : x_end if x_end != -1 else len(request)]
+                )
+                y_value = arduino_to_int(request[y_index + 2 :])
+                x = min(max(x_value, X_LIMITS[0]), X_LIMITS[1])
+                y = min(max(y_value, Y_LIMITS[0]), Y_LIMITS[1])
+                settle = self._move(x, y)
+                reply = f"Servos moved to positions: x={x}, y={y}"
+            else:
+                reply = "Invalid command format. Expected: x=<value>&y=<value>"
+        elif request.startswith("solenoid="):
+            reply = self._solenoid(request[len("solenoid=") :])
+        else:
+            reply = "Invalid command format."
+        self._record(request, reply, settle)
+        return reply
+
+    def _solenoid(self, action):
+        if action == "toggle":
+            self.solenoid = not self.solenoid
+            return "Solenoid toggled " + ("ON" if self.solenoid else "OFF")
+        if action == "on":
+            self.solenoid = True
+            return "Solenoid turned ON"
+        if action == "off":
+            self.solenoid = False
+            return "Solenoid turned OFF"
+        return "Invalid solenoid command"
+
+    def handle_frame(self, frame):
+        """
+        Handles one binary frame like turret.ino.
+
+        Returns:
+            bytes: The ack frame.
+        """
+        opcode, seq, x, y, status = turret_protocol.decode_frame(frame)
+        settle = None
+        if status == turret_protocol.STATUS_OK:
+            if opcode == turret_protocol.OP_MOVE:
+                x = min(max(x, X_LIMITS[0]), X_LIMITS[1])
+                y = min(max(y, Y_LIMITS[0]), Y_LIMITS[1])
+                settle = self._move(x, y)
+                command = f"x={x}&y={y}"
+            else:
+                action = {v: k for k, v in turret_protocol.SOLENOID_ACTIONS.items()}[x]
+                self._solenoid(action)
+                command = f"solenoid={action}"
+        else:
+            command = frame.hex()
+        self._record(command, f"ack status={status}", settle)
+        return turret_protocol.encode_ack(opcode, seq, status)
+
+    def servo_positions(self):
+        """Current simulated servo angles (x, y), including motion in progress."""
+        now = time.monotonic()
+        return self.x_servo.position_at(now), self.y_servo.position_at(now)
+
+    def save_trace(self, path):
+        """Writes the trace as JSON lines."""
+        with open(path, "w") as f:
+            for entry in self.trace:
+                f.write(json.dumps(entry) + "\n")
+
+    def stop(self):
+        self._running = False
+        if self._server is not None:
+            self._server.close()
+        if self._client is not None:
+            self._client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the turret on this machine")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds from command to reply")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Seconds of jitter")
+    parser.add_argument("--slew-rate", type=float, default=400.0, help="Degrees/second")
+    parser.add_argument("--settle-time", type=float, default=0.05)
+    parser.add_argument("--greeting-time", type=float, default=1.4)
+    parser.add_argument("--text-only", action="store_true", help="Refuse binary")
+    parser.add_argument("--trace", help="Write the command trace to this JSONL file")
+    args = parser.parse_args()
+
+    simulator = TurretSimulator(
+        args.host,
+        args.port,
+        args.latency,
+        args.jitter,
+        args.slew_rate,
+        args.settle_time,
+        args.greeting_time,
+        binary=not args.text_only,
+    ).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
+        if args.trace:
+            simulator.save_trace(args.trace)
+            print(f"Saved {len(simulator.trace)} commands to {args.trace}")
@@ -1,13 +1,34 @@
 import json
+import time
 import tkinter as tk
 
+import functools
+
 import auto_targeting_ui
 import command_ui
 import cv2
+import model_registry
+import numpy as np
 import targeting  # Ensure this import is correct
+import turret_broker
+from control_modes import ControlModes
+from detection_worker import DetectionWorker
+from frame_grabber import FrameGrabber
+from frame_scheduler import FrameScheduler
+from log_console import LogConsole
+from metrics import metrics
 from PIL import Image, ImageTk
+from servo_control import ServoControlLoop
+from session_recorder import SessionRecorder
 from targeting import calibrate, calibrate_x_axis, calibrate_x_point
 
+MODE_LABELS = {
+    "manual": "Manual Control Mode",
+    "mouse": "Mouse Control Mode",
+    "auto": "Auto Targeting",
+    "calibrating": "Calibration",
+}
+
 
 class VideoStreamApp:
     def __init__(self, root):
@@ -15,14 +36,34 @@ class VideoStreamApp:
         self.recticle_color = "green"  # Set the color of the recticle
         # initialize the command ui
         self.spoof_arduino = False
+        # Load and warm up the detector in the background so auto targeting starts instantly
+        self.detector_model = "mobilenet_ssd"  # See model_registry for the backends
+        self.inference_threads = None  # Backend threads, None for the backend default
+        model_registry.register_ssd_models(
+            model_registry.registry, self.inference_threads
+        )
+        model_registry.registry.preload([self.detector_model])
         print("Initializing Arduino Controller")
-        self.arduino_controller = command_ui.ArduinoController(spoof=self.spoof_arduino)
-        self.arduino_controller.connect()
-
-        self.calibrating = False  # Add a flag to track calibration state
-        self.manual_control = False  # Add a flag to track manual control mode
-        self.mouse_control = False  # Add a flag to track mouse control mode
-        self.auto_targeting = False  # Initialize auto-targeting flag
+        # Aim updates are rate limited on a sender thread so mouse sweeps never block the UI
+        if self.spoof_arduino:
+            self.arduino_controller = command_ui.ArduinoController(
+                spoof=True, async_mode=True, max_rate=30
+            )
+            self.arduino_controller.connect()
+        else:
+            # Share the single turret connection with other tools through the broker
+            self.arduino_controller = turret_broker.connect_controller(
+                async_mode=True, max_rate=30
+            )
+        # Mouse, keyboard and auto targeting only move the setpoint, the control loop
+        # slews the turret there with limited velocity and acceleration
+        self.servo_loop = ServoControlLoop(self.arduino_controller).start()
+
+        self.detection_worker = None  # Runs the detector off the Tk thread
+        self.detection_mode = "thread"  # "thread" or "process"
+        self.detection_workers = 1  # Frames allowed in flight at once
+        self.last_result_seq = 0
+        self.recorder = None  # SessionRecorder while a session is being recorded
         self.root = root
         self.root.title("Video Stream with Mouse Tracking and Auto Targeting")
 
@@ -38,13 +79,33 @@ class VideoStreamApp:
         self.video_canvas = tk.Canvas(self.video_frame)
         self.video_canvas.pack(fill=tk.BOTH, expand=True)
 
-        # Center the video and have it fill the canvas
+        # Center the video and have it fill the canvas. The image item, its PhotoImage
+        # and the crosshair lines are created once and updated in place every frame
         self.video_canvas.update_idletasks()
         canvas_width = self.video_canvas.winfo_width()
         canvas_height = self.video_canvas.winfo_height()
-        self.video_canvas.create_image(
+        self.canvas_size = (canvas_width, canvas_height)
+        self.video_item = self.video_canvas.create_image(
             canvas_width // 2, canvas_height // 2, anchor=tk.CENTER
         )
+        self.photo = None
+        self.render_size = None
+        self.render_source_size = None
+        self.video_canvas.bind("<Configure>", self.on_canvas_resize)
+        self.crosshair_color = self.recticle_color
+        self.crosshair_items = [
+            self.video_canvas.create_line(
+                0,
+                0,
+                0,
+                0,
+                fill=self.recticle_color,
+                width=3,
+                tags="crosshair",
+                state=tk.HIDDEN,
+            )
+            for _ in range(4)
+        ]
 
         # Create a frame to hold the settings and readout on the right side
         self.settings_frame = tk.Frame(self.main_frame)
@@ -61,10 +122,22 @@ class VideoStreamApp:
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.settings_text.config(yscrollcommand=self.scrollbar.set)
 
+        # Messages reach settings_text in batches a few times a second, and only the
+        # newest lines are kept. Set log_file to also mirror them to a file
+        self.log_file = None
+        self.console = LogConsole(
+            root, self.settings_text, mirror_path=self.log_file
+        ).start()
+
         # Create labels to display the coordinates
         self.coord_label = tk.Label(self.settings_frame, text="Coordinates: (0, 0)")
         self.coord_label.pack()
 
+        # Turret command round-trip times, refreshed twice a second
+        self.rtt_label = tk.Label(self.settings_frame, text="RTT: n/a")
+        self.rtt_label.pack()
+        self.update_rtt_label()
+
         # Create buttons for settings
         self.button1 = tk.Button(
             self.settings_frame,
@@ -87,17 +160,86 @@ class VideoStreamApp:
         )
         self.auto_target_button.pack()
 
-        # Initialize video capture
-        self.cap = cv2.VideoCapture(0)
+        self.record_button = tk.Button(
+            self.settings_frame,
+            text="Toggle Session Recording",
+            command=self.toggle_recording,
+        )
+        self.record_button.pack()
+
+        # Stage timings, shown on the video and exported for Prometheus. Disabling
+        # them leaves only no-op timers in the hot paths
+        self.metrics_enabled = True
+        self.metrics_file = "UI/metrics.prom"
+        self.metrics_port = None  # e.g. 9108 to serve http://127.0.0.1:9108/metrics
+        metrics.enabled = self.metrics_enabled
+        self.metrics_item = self.video_canvas.create_text(
+            8,
+            8,
+            anchor=tk.NW,
+            fill="yellow",
+            font="TkFixedFont",
+            state=tk.NORMAL if self.metrics_enabled else tk.HIDDEN,
+        )
+        self.last_metrics_time = time.monotonic()
+        self.last_frames_handled = 0
+
+        # Memory-map the calibration lookup table, regenerating it if the mesh changed
+        targeting.calibration_lut.refresh()
+
+        # Initialize video capture on its own thread
+        self.frame_grabber = FrameGrabber(0).start()
+        self.last_frame_seq = 0
+
+        # The video loop runs at the camera's frame rate (or target_fps if set) and
+        # skips rendering when a tick overruns frame_budget seconds
+        self.target_fps = None
+        self.frame_budget = None
+        self.scheduler = FrameScheduler(
+            root,
+            self.update_video,
+            fps=self.target_fps or self.frame_grabber.fps,
+            budget=self.frame_budget,
+        )
 
-        # Bind mouse motion to the video canvas
-        self.video_canvas.bind("<Motion>", self.mouse_motion)
+        # Idle, manual, mouse, auto or calibrating. Each mode's keys and bindings are
+        # set up once here and only installed or removed on mode transitions
+        self.modes = ControlModes(on_change=self.on_mode_change)
+        manual_keys = {
+            keysym: functools.partial(self.run_key_action, keysym)
+            for keysym in command_ui.KEY_ACTIONS
+        }
+        manual_keys["space"] = self.fire
+        manual_keys["c"] = self.calibration_key
+        self.modes.register("manual", keys=manual_keys)
+        # The calibration routines ask the operator to jog the servo onto a point, so
+        # the jog keys stay live, but the solenoid and point recording do not
+        self.modes.register(
+            "calibrating",
+            keys={
+                keysym: handler
+                for keysym, handler in manual_keys.items()
+                if keysym not in ("space", "c")
+            },
+        )
+        self.modes.register(
+            "mouse", bindings=[(self.video_canvas, "<Motion>", self.mouse_motion)]
+        )
+        self.modes.register(
+            "auto",
+            keys={"space": self.fire},
+            on_enter=self.start_auto_targeting,
+            on_exit=self.stop_auto_targeting,
+        )
 
         # Bind mouse click to the video canvas
         self.video_canvas.bind("<Button-1>", self.mouse_click)
 
         # Start the video loop
-        self.update_video()
+        self.scheduler.start()
+        if self.metrics_enabled:
+            metrics.start_export(self.metrics_file, port=self.metrics_port)
+            self.update_metrics_overlay()
 
         # Variable to track Enter key press
         self.enter_pressed = tk.BooleanVar()
@@ -107,115 +249,154 @@ class VideoStreamApp:
         self.root.bind("<KeyRelease>", self.key_release)
 
     def toggle_manual_control(self):
-        self.manual_control = not self.manual_control
-        if self.manual_control:
-            self.settings_text.insert(tk.END, "Manual Control Mode: ON\n")
-        else:
-            self.settings_text.insert(tk.END, "Manual Control Mode: OFF\n")
-        self.settings_text.see(tk.END)  # Scroll to the end
+        self.modes.toggle("manual")
 
     def toggle_mouse_control(self):
-        self.mouse_control = not self.mouse_control
-        if self.mouse_control:
-            self.settings_text.insert(tk.END, "Mouse Control Mode: ON\n")
-        else:
-            self.settings_text.insert(tk.END, "Mouse Control Mode: OFF\n")
-        self.settings_text.see(tk.END)
+        self.modes.toggle("mouse")
+
+    def toggle_auto_targeting(self):
+        self.modes.toggle("auto")
+
+    def on_mode_change(self, old, new):
+        for mode, state in ((old, "OFF"), (new, "ON")):
+            if mode != "idle":
+                self.console.log(f"{MODE_LABELS[mode]}: {state}")
 
     def key_press(self, event):
-        if self.manual_control:
-            actions = {
-                "Up": lambda: self.arduino_controller.update_position(
-                    self.arduino_controller.x_pos,
-                    self.arduino_controller.y_pos + self.arduino_controller.step_size,
-                    "UP",
-                )
-                or self.settings_text.insert(tk.END, "Moved UP\n"),
-                "Down": lambda: self.arduino_controller.update_position(
-                    self.arduino_controller.x_pos,
-                    self.arduino_controller.y_pos - self.arduino_controller.step_size,
-                    "DOWN",
-                )
-                or self.settings_text.insert(tk.END, "Moved DOWN\n"),
-                "Left": lambda: self.arduino_controller.update_position(
-                    self.arduino_controller.x_pos + self.arduino_controller.step_size,
-                    self.arduino_controller.y_pos,
-                    "LEFT",
-                )
-                or self.settings_text.insert(tk.END, "Moved LEFT\n"),
-                "Right": lambda: self.arduino_controller.update_position(
-                    self.arduino_controller.x_pos - self.arduino_controller.step_size,
-                    self.arduino_controller.y_pos,
-                    "RIGHT",
-                )
-                or self.settings_text.insert(tk.END, "Moved RIGHT\n"),
-                "q": lambda: self.arduino_controller.update_position(225, 45, "UP-LEFT")
-                or self.settings_text.insert(tk.END, "Moved UP-LEFT\n"),
-                "e": lambda: self.arduino_controller.update_position(45, 45, "UP-RIGHT")
-                or self.settings_text.insert(tk.END, "Moved UP-RIGHT\n"),
-                "w": lambda: self.arduino_controller.update_position(
-                    135, 45, "UP-CENTER"
-                )
-                or self.settings_text.insert(tk.END, "Moved UP-CENTER\n"),
-                "a": lambda: self.arduino_controller.update_position(
-                    225, 0, "DOWN-LEFT"
-                )
-                or self.settings_text.insert(tk.END, "Moved DOWN-LEFT\n"),
-                "d": lambda: self.arduino_controller.update_position(
-                    45, 0, "DOWN-RIGHT"
-                )
-                or self.settings_text.insert(tk.END, "Moved DOWN-RIGHT\n"),
-                "s": lambda: self.arduino_controller.update_position(
-                    135, 0, "DOWN-CENTER"
-                )
-                or self.settings_text.insert(tk.END, "Moved DOWN-CENTER\n"),
-                "space": lambda: self.arduino_controller.toggle_solenoid()
-                or self.settings_text.insert(tk.END, "Toggled Solenoid\n"),
-                "c": lambda: self.record_calibration_point(event)
-                or self.settings_text.insert(tk.END, "Recorded Calibration Point\n"),
-            }
-
-            action = actions.get(event.keysym)
-            if action:
-                action()
-            else:
-                print(f"Unmapped key pressed: {event.keysym}")
-                self.settings_text.insert(
-                    tk.END, f"Unmapped key pressed: {event.keysym}\n"
-                )
+        if not self.modes.handle_key(event) and self.modes.mode == "manual":
+            print(f"Unmapped key pressed: {event.keysym}")
+            self.console.log(f"Unmapped key pressed: {event.keysym}")
+
+    def run_key_action(self, keysym, event):
+        description = self.arduino_controller.handle_key(keysym)
+        if description is not None:
+            self.console.log(description)
+
+    def fire(self, event):
+        self.arduino_controller.toggle_solenoid()
+        self.console.log("Toggled Solenoid")
+        self.toggle_recticle_color()
+
+    def calibration_key(self, event):
+        self.record_calibration_point(event)
+        self.console.log("Recorded Calibration Point")
 
     def mouse_motion(self, event):
-        if self.mouse_control:
-            # Get the size of the video canvas
-            width = self.video_canvas.winfo_width()
-            height = self.video_canvas.winfo_height()
-            # Calculate the coordinates as a scale of 0-100
-            x = int((event.x / width) * 100)
-            y = int((event.y / height) * 100)
-            # Print the coordinates to the settings_text
-            # self.settings_text.insert(tk.END, f"Mouse moved to: ({x}, {y})\n")
-            # target the servo to the mouse position
-            new_x = targeting.map_video_x_to_servo(x)
+        # Get the size of the video canvas
+        width = self.video_canvas.winfo_width()
+        height = self.video_canvas.winfo_height()
+        # Calculate the coordinates as a scale of 0-100
+        x = int((event.x / width) * 100)
+        y = int((event.y / height) * 100)
+        # Print the coordinates to the settings_text
+        # self.settings_text.insert(tk.END, f"Mouse moved to: ({x}, {y})\n")
+        # target the servo to the mouse position
+        new_x, new_y = targeting.lookup_video_to_servo(x, y)
+        if not targeting.calibration_model.is_2d:
             # new y will be a math function, mapping values from 50-30 to 0-30.
             new_y = 30 - (y - 50) * 0.6
-
-            self.arduino_controller.update_position(new_x, new_y, "Mouse Control")
-            self.settings_text.insert(
-                tk.END,
-                f"MOUSE CONTROL: Updated position to x={round(new_x,0)}, y={round(new_y,0)}\n",
+        if new_x is None:
+            return
+
+        self.arduino_controller.update_position(new_x, new_y, "Mouse Control")
+        if self.recorder is not None:
+            self.recorder.record_mapping(self.last_frame_seq, (x, y), (new_x, new_y))
+        self.console.log(
+            f"MOUSE CONTROL: Updated position to x={round(new_x,0)}, y={round(new_y,0)}",
+            key="mouse",
+        )
+        # update the coordinates label
+        self.coord_label.config(text=f"Coordinates: ({x}, {y})")
+
+    def start_auto_targeting(self):
+        # Lead targets by half the measured command round trip, once there is one
+        rtt = self.arduino_controller.rtt.percentiles()["p50"]
+        command_latency = rtt / 2000 if rtt is not None else 0.02
+        self.detection_worker = DetectionWorker(
+            functools.partial(
+                auto_targeting_ui.AutoTargeter,
+                model_name=self.detector_model,
+                command_latency=command_latency,
+                max_velocity=tuple(self.servo_loop.max_velocity),
+                max_acceleration=tuple(self.servo_loop.max_acceleration),
+                # The loop lives in this process, detection processes fall back to
+                # their last aim point
+                servo_position=(
+                    self.servo_loop.current_position
+                    if self.detection_mode == "thread"
+                    else None
+                ),
+                # Parallel worker threads each need their own network
+                shared_model=self.detection_workers == 1,
+            ),
+            mode=self.detection_mode,
+            workers=self.detection_workers,
+            method="process_image_with_targets",
+            on_result=self.record_detection_result,
+            pass_timestamp=True,
+        ).start()
+
+    def record_detection_result(self, seq, timestamp, result):
+        """
+        Records every published detection result, called from the detection worker.
+
+        The UI only sees the newest result each tick, recording here keeps the
+        complete list of frames the detector processed, which replays need.
+        """
+        recorder = self.recorder
+        if recorder is None:
+            return
+        _, targets, lead_inputs = result
+        decision_time, servo_from = lead_inputs or (None, None)
+        # Stamped with the capture time, like the frame they belong to
+        recorder.record_detections(seq, targets, timestamp, decision_time, servo_from)
+
+    def stop_auto_targeting(self):
+        self.hide_crosshair()
+        if self.detection_worker is not None:
+            self.detection_worker.stop()
+            self.detection_worker = None
+
+    def toggle_recording(self):
+        if self.recorder is None:
+            self.recorder = SessionRecorder(fps=self.frame_grabber.fps or 30.0).start()
+            self.arduino_controller.recorder = self.recorder
+            self.console.log(f"Recording to {self.recorder.path}")
+        else:
+            self.arduino_controller.recorder = None
+            self.recorder.stop()
+            self.console.log(
+                f"Recorded {self.recorder.frames_written} frames"
+                f" ({self.recorder.dropped_frames} dropped)"
             )
-            # update the coordinates label
-            self.coord_label.config(text=f"Coordinates: ({x}, {y})")
-            self.settings_text.see(tk.END)
+            self.recorder = None
+
+    def update_metrics_overlay(self):
+        now = time.monotonic()
+        frames = self.scheduler.frames_handled
+        fps = (frames - self.last_frames_handled) / (now - self.last_metrics_time)
+        self.last_metrics_time, self.last_frames_handled = now, frames
+
+        def ms(name):
+            p50, p95, _ = metrics.summary(name)
+            return "-" if p50 is None else f"{p50:.1f}/{p95:.1f}"
+
+        self.video_canvas.itemconfig(
+            self.metrics_item,
+            text=(
+                f"{fps:.1f}/{self.scheduler.fps:.0f} fps  (p50/p95 ms)\n"
+                f"frame {ms('tick')}  age {ms('capture_age')}\n"
+                f"forward {ms('forward')}  send {ms('send')}\n"
+                f"dropped {self.scheduler.frames_dropped}"
+                f"  skipped {self.scheduler.renders_skipped}"
+            ),
+        )
+        self.video_canvas.tag_raise(self.metrics_item)
+        self.root.after(500, self.update_metrics_overlay)
 
-    def toggle_auto_targeting(self):
-        self.auto_targeting = not self.auto_targeting
-        if self.auto_targeting:
-            self.settings_text.insert(tk.END, "Auto Targeting: ON\n")
-            self.auto_targeter = auto_targeting_ui.AutoTargeter()
-        else:
-            self.settings_text.insert(tk.END, "Auto Targeting: OFF\n")
-        self.settings_text.see(tk.END)
+    def update_rtt_label(self):
+        self.rtt_label.config(text=self.arduino_controller.format_reply_stats())
+        self.root.after(500, self.update_rtt_label)
 
     def key_release(self, event):
         pass  # Add any necessary key release handling here
@@ -229,11 +410,9 @@ class VideoStreamApp:
             self.calibration_points = {}
         self.calibration_points[f"{video_x}, 30"] = (servo_x, 30)
         # save the calibration point to UI/calibration_mesh.json
-        with open("UI/calibration_mesh.json", "w") as f:
+        with open(targeting.CALIBRATION_MESH_PATH, "w") as f:
             json.dump(self.calibration_points, f)
-        self.settings_text.insert(
-            tk.END, f"Calibrated video_x: {video_x} with servo_x: {servo_x}\n"
-        )
+        self.console.log(f"Calibrated video_x: {video_x} with servo_x: {servo_x}")
 
     def update_servo_position(self, delta_x, delta_y):
         # Update servo positions based on delta_x and delta_y
@@ -242,14 +421,11 @@ class VideoStreamApp:
         new_x = self.arduino_controller.x_pos + delta_x
         new_y = self.arduino_controller.y_pos + delta_y
         self.arduino_controller.update_position(new_x, new_y, "Manual Control")
-        self.settings_text.insert(
-            tk.END, f"Servo position updated by ({delta_x}, {delta_y})\n"
-        )
+        self.console.log(f"Servo position updated by ({delta_x}, {delta_y})")
         print(f"Servo position updated by ({delta_x}, {delta_y})")
         print(
             f"New servo position: ({self.arduino_controller.x_pos}, {self.arduino_controller.y_pos})"
         )
-        self.settings_text.see(tk.END)  # Scroll to the end
 
     def get_servo_positions(self):
         # Return the current servo positions
@@ -257,9 +433,8 @@ class VideoStreamApp:
 
     def print_servo_positions(self):
         x, y = self.get_servo_positions()
-        self.settings_text.insert(tk.END, f"Servo positions: x={x}, y={y}\n")
+        self.console.log(f"Servo positions: x={x}, y={y}")
         print(f"Servo positions: x={x}, y={y}")
-        self.settings_text.see(tk.END)  # Scroll to the end
 
     def on_enter_pressed(self, event):
         self.enter_pressed.set(True)
@@ -272,207 +447,142 @@ class VideoStreamApp:
             self.recticle_color = "green"
         # self.settings_text.insert(tk.END, "Toggled Recticle Color\n")
 
-    def update_video(self, verbose=True):
-        ret, frame = self.cap.read()
-        if ret:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame)
-
-            # Resize the image to fit the canvas while keeping the aspect ratio
-            canvas_width = self.video_canvas.winfo_width()
-            canvas_height = self.video_canvas.winfo_height()
-
-            if (
-                canvas_width > 0 and canvas_height > 0
-            ):  # Ensure width and height are > 0
-                img_ratio = img.width / img.height
-                canvas_ratio = canvas_width / canvas_height
-
-                if img_ratio > canvas_ratio:
-                    new_width = canvas_width
-                    new_height = int(canvas_width / img_ratio)
-                else:
-                    new_height = canvas_height
-                    new_width = int(canvas_height * img_ratio)
-
-                img = img.resize((new_width, new_height), Image.LANCZOS)
-
-                imgtk = ImageTk.PhotoImage(image=img)
-                self.video_canvas.imgtk = imgtk
-                self.video_canvas.update_idletasks()
-                self.video_canvas.create_image(
-                    canvas_width // 2,
-                    canvas_height // 2,
-                    anchor=tk.CENTER,
-                    image=imgtk,
-                )
-                if self.auto_targeting:
-                    self.root.bind(
-                        "<space>",
-                        lambda event: [
-                            self.arduino_controller.toggle_solenoid(),
-                            self.toggle_recticle_color(),
-                        ][1],
-                    )
-
-                    # Auto-targeting logic
-                    person_x, crosshair_x, crosshair_y = (
-                        self.auto_targeter.process_image(frame)
-                    )
-                    if (
-                        person_x is not None
-                        and crosshair_x is not None
-                        and crosshair_y is not None
-                    ):
-
-                        # translate crosshair_x and crosshair_y to video coordinates
-                        crosshair_x = int((crosshair_x / 100) * canvas_width)
-                        crosshair_y = int((crosshair_y / 100) * canvas_height)
-
-                        self.arduino_controller.update_position(
-                            person_x, self.arduino_controller.y_pos, "Auto Targeting"
-                        )
-                        if verbose:
-                            self.settings_text.insert(
-                                tk.END,
-                                f"Auto-targeting updated position to x={round(person_x,0)}\n",
-                            )
-                        self.settings_text.see(tk.END)
-                        # Draw crosshair on the video canvas
-                        self.video_canvas.delete("crosshair")
-                        self.video_canvas.create_line(
-                            crosshair_x - 15,
-                            crosshair_y,
-                            crosshair_x - 5,
-                            crosshair_y,
-                            fill=self.recticle_color,
-                            width=3,
-                            tags="crosshair",
-                        )
-                        self.video_canvas.create_line(
-                            crosshair_x + 5,
-                            crosshair_y,
-                            crosshair_x + 15,
-                            crosshair_y,
-                            fill=self.recticle_color,
-                            width=3,
-                            tags="crosshair",
-                        )
-                        self.video_canvas.create_line(
-                            crosshair_x,
-                            crosshair_y - 15,
-                            crosshair_x,
-                            crosshair_y - 5,
-                            fill=self.recticle_color,
-                            width=3,
-                            tags="crosshair",
-                        )
-                        self.video_canvas.create_line(
-                            crosshair_x,
-                            crosshair_y + 5,
-                            crosshair_x,
-                            crosshair_y + 15,
-                            fill=self.recticle_color,
-                            width=3,
-                            tags="crosshair",
-                        )
+    def on_canvas_resize(self, event):
+        self.canvas_size = (event.width, event.height)
+        self.render_size = None  # Recompute the scaled size on the next frame
+
+    def setup_render(self, frame_width, frame_height):
+        # Scale to fit the canvas while keeping the aspect ratio
+        canvas_width, canvas_height = self.canvas_size
+        img_ratio = frame_width / frame_height
+        canvas_ratio = canvas_width / canvas_height
+        if img_ratio > canvas_ratio:
+            new_width = canvas_width
+            new_height = max(1, int(canvas_width / img_ratio))
+        else:
+            new_height = canvas_height
+            new_width = max(1, int(canvas_height * img_ratio))
+
+        self.render_size = (new_width, new_height)
+        self.render_source_size = (frame_width, frame_height)
+        self.resize_buffer = np.empty((new_height, new_width, 3), dtype=np.uint8)
+        self.rgba_buffer = np.empty((new_height, new_width, 4), dtype=np.uint8)
+        # Shares memory with rgba_buffer, so converting into the buffer updates it
+        self.render_image = Image.frombuffer(
+            "RGBA", self.render_size, self.rgba_buffer, "raw", "RGBA", 0, 1
+        )
+        self.photo = ImageTk.PhotoImage("RGBA", self.render_size)
+        self.video_canvas.itemconfig(self.video_item, image=self.photo)
+        self.video_canvas.coords(self.video_item, canvas_width // 2, canvas_height // 2)
+
+    def render_frame(self, frame):
+        """
+        Shows a BGR frame on the canvas, scaled to fit.
+
+        The canvas image item, the PhotoImage and the conversion buffers are reused
+        every frame and only rebuilt when the canvas or frame size changes.
+
+        Args:
+            frame (np.ndarray): BGR frame from the FrameGrabber, left unmodified.
+        """
+        frame_height, frame_width = frame.shape[:2]
+        if self.render_size is None or self.render_source_size != (
+            frame_width,
+            frame_height,
+        ):
+            self.setup_render(frame_width, frame_height)
+        with metrics.timer("resize"):
+            cv2.resize(
+                frame,
+                self.render_size,
+                dst=self.resize_buffer,
+                interpolation=cv2.INTER_AREA,
+            )
+        # Convert after resizing, there are fewer pixels to touch
+        with metrics.timer("convert"):
+            cv2.cvtColor(self.resize_buffer, cv2.COLOR_BGR2RGBA, dst=self.rgba_buffer)
+        with metrics.timer("paste"):
+            self.photo.paste(self.render_image)
+
+    def draw_crosshair(self, x, y):
+        """Moves the persistent crosshair lines to (x, y) in canvas coordinates."""
+        for item, (x1, y1, x2, y2) in zip(
+            self.crosshair_items,
+            ((-15, 0, -5, 0), (5, 0, 15, 0), (0, -15, 0, -5), (0, 5, 0, 15)),
+        ):
+            self.video_canvas.coords(item, x + x1, y + y1, x + x2, y + y2)
+        if self.crosshair_color != self.recticle_color:
+            self.crosshair_color = self.recticle_color
+            self.video_canvas.itemconfig("crosshair", fill=self.recticle_color)
+        self.video_canvas.itemconfig("crosshair", state=tk.NORMAL)
+
+    def hide_crosshair(self):
+        self.video_canvas.itemconfig("crosshair", state=tk.HIDDEN)
 
-                elif self.manual_control:
-                    self.root.bind(
-                        "<Up>",
-                        lambda event: self.arduino_controller.update_position(
-                            self.arduino_controller.x_pos,
-                            self.arduino_controller.y_pos
-                            + self.arduino_controller.step_size,
-                            "UP",
-                        )
-                        or self.settings_text.insert(tk.END, "Moved UP\n"),
-                    )
-                    self.root.bind(
-                        "<Down>",
-                        lambda event: self.arduino_controller.update_position(
-                            self.arduino_controller.x_pos,
-                            self.arduino_controller.y_pos
-                            - self.arduino_controller.step_size,
-                            "DOWN",
-                        )
-                        or self.settings_text.insert(tk.END, "Moved DOWN\n"),
-                    )
-                    self.root.bind(
-                        "<Left>",
-                        lambda event: self.arduino_controller.update_position(
-                            self.arduino_controller.x_pos
-                            + self.arduino_controller.step_size,
-                            self.arduino_controller.y_pos,
-                            "LEFT",
-                        )
-                        or self.settings_text.insert(tk.END, "Moved LEFT\n"),
-                    )
-                    self.root.bind(
-                        "<Right>",
-                        lambda event: self.arduino_controller.update_position(
-                            self.arduino_controller.x_pos
-                            - self.arduino_controller.step_size,
-                            self.arduino_controller.y_pos,
-                            "RIGHT",
-                        )
-                        or self.settings_text.insert(tk.END, "Moved RIGHT\n"),
-                    )
-                    self.root.bind(
-                        "q",
-                        lambda event: self.arduino_controller.update_position(
-                            225, 45, "UP-LEFT"
-                        )
-                        or self.settings_text.insert(tk.END, "Moved UP-LEFT\n"),
-                    )
-                    self.root.bind(
-                        "e",
-                        lambda event: self.arduino_controller.update_position(
-                            45, 45, "UP-RIGHT"
-                        )
-                        or self.settings_text.insert(tk.END, "Moved UP-RIGHT\n"),
-                    )
-                    self.root.bind(
-                        "w",
-                        lambda event: self.arduino_controller.update_position(
-                            135, 45, "UP-CENTER"
-                        )
-                        or self.settings_text.insert(tk.END, "Moved UP-CENTER\n"),
-                    )
-                    self.root.bind(
-                        "a",
-                        lambda event: self.arduino_controller.update_position(
-                            225, 0, "DOWN-LEFT"
-                        )
-                        or self.settings_text.insert(tk.END, "Moved DOWN-LEFT\n"),
-                    )
-                    self.root.bind(
-                        "d",
-                        lambda event: self.arduino_controller.update_position(
-                            45, 0, "DOWN-RIGHT"
+    def update_video(self, verbose=True):
+        """
+        Handles the newest camera frame, called by the scheduler every tick.
+
+        Returns:
+            bool: True if there was a new frame.
+        """
+        frame_seq, frame_time, frame = self.frame_grabber.latest()
+        if frame is None or frame_seq == self.last_frame_seq:
+            return False
+        self.scheduler.frame_seen(frame_seq, frame_time)
+        metrics.observe("capture_age", time.monotonic() - frame_time)
+        self.last_frame_seq = frame_seq
+        if self.recorder is not None:
+            self.recorder.record_frame(frame_seq, frame, frame_time)
+
+        canvas_width, canvas_height = self.canvas_size
+        if canvas_width > 0 and canvas_height > 0:  # Ensure width and height are > 0
+            # Aiming runs every frame, drawing is dropped first when running behind
+            render = self.scheduler.should_render()
+            if render:
+                self.render_frame(frame)
+                metrics.increment("frames_displayed")
+            if self.detection_worker is not None:
+                # Auto-targeting logic, detections arrive at inference rate. The
+                # detector works on RGB, so only convert the full frame while it runs
+                with metrics.timer("detector_convert"):
+                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                self.detection_worker.submit(frame_seq, rgb_frame, frame_time)
+                result_seq, result_time, result = self.detection_worker.latest_result()
+                if result_seq > self.last_result_seq:
+                    self.last_result_seq = result_seq
+                    person_x, person_y, crosshair_x, crosshair_y = result[0]
+                    if self.recorder is not None:
+                        self.recorder.record_mapping(
+                            result_seq,
+                            (crosshair_x, crosshair_y),
+                            (person_x, person_y),
                         )
-                        or self.settings_text.insert(tk.END, "Moved DOWN-RIGHT\n"),
+                else:
+                    person_x = crosshair_x = crosshair_y = None
+                if (
+                    person_x is not None
+                    and crosshair_x is not None
+                    and crosshair_y is not None
+                ):
+
+                    # translate crosshair_x and crosshair_y to video coordinates
+                    crosshair_x = int((crosshair_x / 100) * canvas_width)
+                    crosshair_y = int((crosshair_y / 100) * canvas_height)
+
+                    if person_y is None:
+                        person_y = self.arduino_controller.y_pos
+                    self.arduino_controller.update_position(
+                        person_x, person_y, "Auto Targeting"
                     )
-                    self.root.bind(
-                        "s",
-                        lambda event: self.arduino_controller.update_position(
-                            135, 0, "DOWN-CENTER"
+                    if verbose:
+                        self.console.log(
+                            f"Auto-targeting updated position to x={round(person_x, 0)}",
+                            key="auto",
                         )
-                        or self.settings_text.insert(tk.END, "Moved DOWN-CENTER\n"),
-                    )
-                    self.root.bind(
-                        "<space>",
-                        lambda event: (
-                            self.arduino_controller.toggle_solenoid()
-                            or self.settings_text.insert(tk.END, "Toggled Solenoid\n"),
-                            setattr(
-                                self,
-                                "recticle_color",
-                                "red" if self.recticle_color == "green" else "green",
-                            ),
-                        ),
-                    )
-        self.root.after(50, self.update_video)
+                    if render:
+                        self.draw_crosshair(crosshair_x, crosshair_y)
+        return True
 
     def mouse_click(self, event):
         # Get the size of the video canvas
@@ -482,14 +592,19 @@ class VideoStreamApp:
         x = int((event.x / width) * 100)
         y = int((event.y / height) * 100)
         # Print the coordinates to the settings_text
-        self.settings_text.insert(tk.END, f"Mouse clicked at: ({x}, {y})\n")
+        self.console.log(f"Mouse clicked at: ({x}, {y})")
         print(f"Mouse clicked at ({x}, {y})")
-        self.settings_text.see(tk.END)  # Scroll to the end
 
     def __del__(self):
+        self.servo_loop.stop()
+        if self.detection_worker is not None:
+            self.detection_worker.stop()
+        if self.recorder is not None:
+            self.recorder.stop()
+        self.console.stop()
+        metrics.stop_export()
         # Release the video capture when the app is closed
-        if self.cap.isOpened():
-            self.cap.release()
+        self.frame_grabber.stop()
         # print("Video capture released")
 
 
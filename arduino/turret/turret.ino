@@ -19,6 +19,27 @@ int maxPulseWidth = 2500;
 
 // Set Solenoid Pin
 const int solenoidPin = 13;
+bool solenoidState = false;
+
+// Binary protocol, see UI/turret_protocol.py for the frame layout
+const uint8_t FRAME_MAGIC = 0xA5;
+const uint8_t OP_MOVE = 0x01;
+const uint8_t OP_SOLENOID = 0x02;
+const uint8_t ACK_FLAG = 0x80;
+const uint8_t STATUS_OK = 0;
+const uint8_t STATUS_BAD_CHECKSUM = 1;
+const uint8_t STATUS_BAD_OPCODE = 2;
+const int FRAME_SIZE = 9;
+const int ACK_SIZE = 6;
+// A frame that stops arriving for this long is abandoned
+const unsigned long FRAME_TIMEOUT_MS = 50;
+// Longest text command kept, longer lines are rejected when they end
+const unsigned int MAX_REQUEST_LENGTH = 64;
+// Fixed, statically allocated buffers so binary commands never touch the heap
+uint8_t frameBuffer[FRAME_SIZE];
+uint8_t ackBuffer[ACK_SIZE];
+// Bytes of the current binary frame received so far, 0 while reading text
+int frameLength = 0;
 
 void setup() {
   Serial.begin(115200);
@@ -68,17 +89,46 @@ void loop() {
 
 
     String request = "";
+    request.reserve(MAX_REQUEST_LENGTH);
+    bool requestTooLong = false;
+    unsigned long lastByteTime = millis();
+    frameLength = 0;
 
     while (client.connected()) {
       if (client.available()) {
         char c = client.read();
-        if (c == '\n') {
+        lastByteTime = millis();
+        if (frameLength > 0) {
+          frameBuffer[frameLength++] = (uint8_t)c;
+          if (frameLength == FRAME_SIZE) {
+            if (handleFrame(client)) {
+              frameLength = 0;
+            } else {
+              resyncFrame();
+            }
+          }
+        } else if ((uint8_t)c == FRAME_MAGIC) {
+          // Binary frame. Text commands are plain ASCII, so any partial text
+          // command in front of it is a leftover and is dropped.
+          if (request.length() > 0 || requestTooLong) {
+            Serial.println("Dropped partial text command");
+            request = "";
+            requestTooLong = false;
+          }
+          frameBuffer[0] = FRAME_MAGIC;
+          frameLength = 1;
+        } else if (c == '\n') {
           // End of request
           request.trim();  // Remove any leading/trailing whitespace
           Serial.print("Received: ");
           Serial.println(request);
 
-          if (request.startsWith("x=") || request.startsWith("y=")) {
+          if (requestTooLong) {
+            client.println("Invalid command format.");
+          } else if (request == "proto=bin") {
+            // Binary frames are always accepted, confirm so the client switches
+            client.println("proto=bin ok");
+          } else if (request.startsWith("x=") || request.startsWith("y=")) {
             // Parse positions from the request
             parseAndSetPositions(request, client);
           } else if (request.startsWith("solenoid=")) {
@@ -90,9 +140,16 @@ void loop() {
 
           // Clear the request string for the next message
           request = "";
-        } else {
+          requestTooLong = false;
+        } else if (request.length() < MAX_REQUEST_LENGTH) {
           request += c;
+        } else {
+          requestTooLong = true;
         }
+      } else if (frameLength > 0 && millis() - lastByteTime > FRAME_TIMEOUT_MS) {
+        // Short read, the rest of the frame is not coming
+        resyncFrame();
+        lastByteTime = millis();
       }
     }
 
@@ -112,6 +169,77 @@ int angleToPulseWidth(int angle) {
   return map(angle, 0, 270, minPulseWidth, maxPulseWidth);
 }
 
+// Same mapping for angles in hundredths of a degree, keeps the fractional part
+int centiAngleToPulseWidth(long centiAngle) {
+  return minPulseWidth + (centiAngle * (maxPulseWidth - minPulseWidth)) / 27000L;
+}
+
+uint8_t frameChecksum(const uint8_t* data, int length) {
+  uint8_t value = 0;
+  for (int i = 0; i < length; i++) {
+    value ^= data[i];
+  }
+  return value;
+}
+
+int16_t readInt16(const uint8_t* data) {
+  return (int16_t)(data[0] | (data[1] << 8));
+}
+
+void sendAck(WiFiClient& client, uint8_t opcode, uint8_t status) {
+  ackBuffer[0] = FRAME_MAGIC;
+  ackBuffer[1] = opcode | ACK_FLAG;
+  ackBuffer[2] = frameBuffer[2];  // Sequence number, echoed back
+  ackBuffer[3] = frameBuffer[3];
+  ackBuffer[4] = status;
+  ackBuffer[5] = frameChecksum(ackBuffer, ACK_SIZE - 1);
+  client.write(ackBuffer, ACK_SIZE);
+}
+
+// Drops a broken frame up to the next FRAME_MAGIC in it and keeps the bytes from
+// there on as the start of the next frame, so a lost or corrupted byte costs one
+// command instead of desynchronizing the stream
+void resyncFrame() {
+  int start = 1;
+  while (start < frameLength && frameBuffer[start] != FRAME_MAGIC) {
+    start++;
+  }
+  memmove(frameBuffer, frameBuffer + start, frameLength - start);
+  frameLength -= start;
+}
+
+// Returns false if the checksum does not match, the frame is then not trusted to
+// be aligned
+bool handleFrame(WiFiClient& client) {
+  uint8_t opcode = frameBuffer[1];
+  if (frameChecksum(frameBuffer, FRAME_SIZE - 1) != frameBuffer[FRAME_SIZE - 1]) {
+    sendAck(client, opcode, STATUS_BAD_CHECKSUM);
+    return false;
+  }
+
+  int16_t x = readInt16(frameBuffer + 4);
+  int16_t y = readInt16(frameBuffer + 6);
+
+  if (opcode == OP_MOVE) {
+    // Positions arrive in hundredths of a degree
+    long xCenti = constrain((long)x, 0L, 27000L);
+    long yCenti = constrain((long)y, 0L, 9000L);
+    xPos = xCenti / 100;
+    yPos = yCenti / 100;
+    xServo.writeMicroseconds(centiAngleToPulseWidth(xCenti));
+    yServo.writeMicroseconds(centiAngleToPulseWidth(yCenti));
+    sendAck(client, opcode, STATUS_OK);
+  } else if (opcode == OP_SOLENOID && x >= 0 && x <= 2) {
+    // 0 = off, 1 = on, 2 = toggle
+    solenoidState = (x == 2) ? !solenoidState : (x == 1);
+    digitalWrite(solenoidPin, solenoidState ? HIGH : LOW);
+    sendAck(client, opcode, STATUS_OK);
+  } else {
+    sendAck(client, opcode, STATUS_BAD_OPCODE);
+  }
+  return true;
+}
+
 void parseAndSetPositions(String request, WiFiClient& client) {
   // Expected format: "x=<value>&y=<value>"
   int xIndex = request.indexOf("x=");
@@ -153,16 +281,17 @@ void parseAndSetPositions(String request, WiFiClient& client) {
 
 void handleSolenoidCommand(String command, WiFiClient& client) {
   if (command == "solenoid=toggle") {
-    static bool solenoidState = false;
     solenoidState = !solenoidState;
     digitalWrite(solenoidPin, solenoidState ? HIGH : LOW);
     client.println("Solenoid toggled " + String(solenoidState ? "ON" : "OFF"));
     Serial.println("Solenoid toggled " + String(solenoidState ? "ON" : "OFF"));
   } else if (command == "solenoid=on") {
+    solenoidState = true;
     digitalWrite(solenoidPin, HIGH);
     client.println("Solenoid turned ON");
     Serial.println("Solenoid turned ON");
   } else if (command == "solenoid=off") {
+    solenoidState = false;
     digitalWrite(solenoidPin, LOW);
     client.println("Solenoid turned OFF");
     Serial.println("Solenoid turned OFF");
@@ -1,67 +1,62 @@
+import argparse
 import curses
-import socket
 
-import command_ui
+import turret_broker
 
 
-def main(stdscr):
-    # Initialize connection parameters
-    arduino_ip = "192.168.50.30"
-    arduino_port = 80
+def main(stdscr, arduino_ip="192.168.50.30", arduino_port=80):
+    # Connect through the turret broker so the UI can stay connected at the same
+    # time. The controller also reads replies and tracks round-trip times.
+    controller = turret_broker.connect_controller(
+        arduino_ip, arduino_port, verbose=False
+    )
+    controller.y_pos = 0
+    controller.step_size = 10
 
-    # Create a socket object
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-    # Connect to the Arduino
-    try:
-        client_socket.connect((arduino_ip, arduino_port))
+    if controller.connected:
         stdscr.addstr(
             0, 0, "Connected to Arduino at {}:{}".format(arduino_ip, arduino_port)
         )
-    except Exception as e:
-        stdscr.addstr(0, 0, f"Error connecting to Arduino: {e}")
+    else:
+        stdscr.addstr(0, 0, "Error connecting to Arduino")
         stdscr.refresh()
-        client_socket.close()
         return
 
-    # Function to send commands to Arduino
-    def send_command(command):
-        try:
-            # Add newline character as Arduino expects
-            client_socket.sendall((command + "\n").encode("utf-8"))
-        except Exception as e:
-            stdscr.addstr(1, 0, f"Error sending command: {e}")
-            stdscr.refresh()
-
     # Initialize curses window
     stdscr.nodelay(True)
     stdscr.timeout(100)
 
-    x_pos, x_min, x_max = 135, 0, 270
-    y_pos, y_min, y_max = 0, 0, 75
-
-    step_size = 10
+    step_size = controller.step_size
 
     # Function to update position and send command
     def update_position(new_x, new_y, action_name):
-        nonlocal x_pos, y_pos
-        x_pos = max(x_min, min(x_max, new_x))
-        y_pos = max(y_min, min(y_max, new_y))
-        send_command(f"x={x_pos}&y={y_pos}")
-        stdscr.addstr(2, 0, f"Sent command: {action_name} (x={x_pos}, y={y_pos})   ")
+        controller.update_position(new_x, new_y, action_name)
+        stdscr.addstr(
+            2,
+            0,
+            f"Sent command: {action_name} (x={controller.x_pos}, y={controller.y_pos})   ",
+        )
         stdscr.clrtoeol()
 
     def toggle_solenoid():
-        send_command("solenoid=toggle")
+        controller.toggle_solenoid()
         stdscr.addstr(2, 0, "Sent command: TOGGLE SOLENOID       ")
         stdscr.clrtoeol()
 
     # Action dictionary mapping keys to functions
     actions = {
-        curses.KEY_UP: lambda: update_position(x_pos, y_pos + step_size, "UP"),
-        curses.KEY_DOWN: lambda: update_position(x_pos, y_pos - step_size, "DOWN"),
-        curses.KEY_LEFT: lambda: update_position(x_pos + step_size, y_pos, "LEFT"),
-        curses.KEY_RIGHT: lambda: update_position(x_pos - step_size, y_pos, "RIGHT"),
+        curses.KEY_UP: lambda: update_position(
+            controller.x_pos, controller.y_pos + step_size, "UP"
+        ),
+        curses.KEY_DOWN: lambda: update_position(
+            controller.x_pos, controller.y_pos - step_size, "DOWN"
+        ),
+        curses.KEY_LEFT: lambda: update_position(
+            controller.x_pos + step_size, controller.y_pos, "LEFT"
+        ),
+        curses.KEY_RIGHT: lambda: update_position(
+            controller.x_pos - step_size, controller.y_pos, "RIGHT"
+        ),
         ord("q"): lambda: update_position(225, 45, "UP-LEFT"),
         ord("e"): lambda: update_position(45, 45, "UP-RIGHT"),
         ord("w"): lambda: update_position(135, 45, "UP-CENTER"),
@@ -86,8 +81,19 @@ def main(stdscr):
                 stdscr.addstr(3, 0, f"Unmapped key pressed: {key}   ")
                 stdscr.clrtoeol()
 
-            stdscr.refresh()
+        # Show the last reply and the rolling round-trip times
+        stdscr.addstr(4, 0, f"Reply: {controller.last_reply}")
+        stdscr.clrtoeol()
+        stdscr.addstr(5, 0, controller.format_reply_stats())
+        stdscr.clrtoeol()
+        stdscr.refresh()
+
+    controller.close()
 
 
 if __name__ == "__main__":
-    curses.wrapper(main)
+    parser = argparse.ArgumentParser(description="Drive the turret from the keyboard")
+    parser.add_argument("--ip", default="192.168.50.30", help="Turret or simulator address")
+    parser.add_argument("--port", type=int, default=80)
+    args = parser.parse_args()
+    curses.wrapper(main, args.ip, args.port)